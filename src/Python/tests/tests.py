@@ -14,11 +14,19 @@ import filecmp
 import glob
 import collections
 import shutil
+import pickle
+import weakref
+import gc
+import zipfile
+import numpy as np
+import pandas as pd
 from scipy.constants import pi
 
 sys.path.append('..')
-from wcon import WCONWorms, MeasurementUnit
+from wcon import WCONWorms, WCONWriter, MeasurementUnit
 from wcon.measurement_unit import MeasurementUnitAtom
+from wcon.wcon_data import convert_origin, reverse_backwards_worms, df_upsert
+from wcon.wcon_data import df_merge_many
 
 
 def setUpModule():
@@ -156,6 +164,59 @@ class TestMeasurementUnit(unittest.TestCase):
             mu_there_and_back = MU.create(suf).from_canon(mu_there)
             self.assertTrue(abs(mu_there_and_back - 10) < 1e-8)
 
+    def test_affine_coefficients(self):
+        MU = MeasurementUnit
+        for (unit_string, scale, offset, dimensions) in [
+                ('cm', 10, 0, (1, 0, 0, 0)),
+                ('m/min', 1000 / 60., 0, (1, -1, 0, 0)),
+                ('mm^2/s', 1, 0, (2, -1, 0, 0)),
+                ('F', 1 / 1.8, -32 / 1.8, (0, 0, 0, 1)),
+                ('mK', 1e-3, -273.15, (0, 0, 0, 1)),
+                ('kF', 1000 / 1.8, -32 / 1.8, (0, 0, 0, 1)),
+                ('degrees', pi / 180, 0, (0, 0, 1, 0)),
+                ('%', 0.01, 0, (0, 0, 0, 0)),
+                ('@counts', 1, 0, (0, 0, 0, 0))]:
+            mu = MU.create(unit_string)
+            self.assertAlmostEqual(mu.scale, scale)
+            self.assertAlmostEqual(mu.offset, offset)
+            self.assertEqual(mu.dimensions, dimensions)
+
+        # Conversions apply to whole arrays
+        values = np.array([[32, 212], [-40, 50]])
+        self.assertTrue(np.allclose(MU.create('F').to_canon(values),
+                                    [[0, 100], [-40, 10]]))
+        self.assertTrue(np.allclose(
+            MU.create('F').from_canon(MU.create('F').to_canon(values)),
+            values))
+        # A prefix scales a temperature, but doesn't change its offset
+        self.assertAlmostEqual(MU.create('mK').to_canon(1000), -272.15)
+        self.assertAlmostEqual(MU.create('kF').to_canon(0.212), 100)
+
+        # Units of different types are not equal, even with the same scale
+        self.assertTrue(MU.create('s') != MU.create('mm'))
+        self.assertTrue(MU.create('mm') == MU.create('0.001*m'))
+
+    def test_unit_cache(self):
+        MU = MeasurementUnit
+        mm = MU.create('mm')
+        self.assertIs(MU.create('mm'), mm)
+        self.assertEqual(hash(mm), hash(MU.create('0.001*m')))
+
+        # Shared units can't be changed
+        with self.assertRaises(AttributeError):
+            mm.scale = 2
+
+        # Unpickling gives back the shared unit
+        self.assertIs(pickle.loads(pickle.dumps(mm)), mm)
+
+        # The cache stays within its size
+        for i in range(MU.CACHE_SIZE + 10):
+            MU.create('%i*mm' % (i + 1))
+        self.assertEqual(len(MU._cache), MU.CACHE_SIZE)
+
+        # The longest prefix is used
+        self.assertEqual(MeasurementUnitAtom('milliseconds').prefix, 'milli')
+
     def test_bad_units(self):
         # Verify that combining the full name with an abbreviation causes
         # an error to be raised
@@ -222,6 +283,106 @@ class TestWCONParser(unittest.TestCase):
         w2.units['y'] = MeasurementUnit.create('mm')
         self.assertNotEqual(w2, w2c)
 
+    def test_data_difference(self):
+        JSON_path = '../../../tests/minimax.wcon'
+        w1 = WCONWorms.load_from_file(JSON_path)
+        w2 = WCONWorms.load_from_file(JSON_path)
+        self.assertIsNone(WCONWorms.data_difference(w1, w2))
+
+        w2._data['1'].loc[1.3, ('1', 'x', 0)] += 1e-6
+        difference = WCONWorms.data_difference(w1, w2)
+        self.assertIn("worm 1", difference)
+        self.assertIn("t=1.3", difference)
+        self.assertFalse(WCONWorms.is_data_equal(w1, w2))
+        self.assertTrue(WCONWorms.is_data_equal(w1, w2, atol=1e-5))
+        self.assertTrue(WCONWorms.is_data_equal(w1, w2, rtol=1e-6))
+
+        # atol is in canonical units, even if the units already match
+        for w in [w1, w2]:
+            w.units['x'] = MeasurementUnit.create('m')
+        self.assertFalse(WCONWorms.is_data_equal(w1, w2, atol=1e-5))
+        self.assertTrue(WCONWorms.is_data_equal(w1, w2, atol=1e-2))
+
+        # Units are converted when they differ
+        w1 = WCONWorms.load_from_file(JSON_path)
+        w2 = WCONWorms.load_from_file(JSON_path)
+        w2.units['x'] = MeasurementUnit.create('cm')
+        for df in w2._data.values():
+            x = df.xs('x', axis=1, level='key', drop_level=False)
+            df[x.columns] = x / 10
+        self.assertTrue(WCONWorms.is_data_equal(w1, w2, rtol=1e-12))
+
+    def test_fingerprint(self):
+        JSON_path = '../../../tests/minimax.wcon'
+        w1 = WCONWorms.load_from_file(JSON_path)
+        w2 = WCONWorms.load_from_file(JSON_path)
+        self.assertEqual(w1.fingerprint(), w2.fingerprint())
+        # The same data in other units has the same fingerprint
+        self.assertEqual(w1.fingerprint(), w1.to_canon.fingerprint())
+
+        # Only the changed block differs
+        w2._data['1'] = w2._data['1'].copy()
+        w2._data['1'].loc[2.5, ('1', 'x', 0)] += 1e-9
+        self.assertNotEqual(w1.fingerprint(), w2.fingerprint())
+        self.assertEqual(w1.fingerprint(decimals=6),
+                         w2.fingerprint(decimals=6))
+        blocks1 = w1.block_fingerprints()
+        blocks2 = w2.block_fingerprints()
+        self.assertEqual(blocks1['2'], blocks2['2'])
+        self.assertNotEqual(blocks1['1'], blocks2['1'])
+        self.assertNotEqual(w1, w2)
+
+        # The fingerprints kept don't keep a replaced DataFrame alive
+        df_ref = weakref.ref(w2._data['2'])
+        w2._data['2'] = w2._data['2'].copy()
+        gc.collect()
+        self.assertIsNone(df_ref())
+        self.assertEqual(w2.block_fingerprints()['2'], blocks2['2'])
+
+        # Merging in later data changes the fingerprint
+        w3 = WCONWorms.load_from_file(JSON_path)
+        fingerprint = w3.fingerprint()
+        w5 = WCONWorms.load_from_file(JSON_path)
+        w5._data['4'] = w5._data['4'].copy()
+        w5._data['4'].index += 100
+        w4 = w3 + w5
+        self.assertEqual(w3.fingerprint(), fingerprint)
+        self.assertNotEqual(w4.fingerprint(), fingerprint)
+        self.assertEqual(w4, w3 + w5)
+
+    def test_canonical_view(self):
+        JSON_path = '../../../tests/minimax.wcon'
+        w = WCONWorms.load_from_file(JSON_path).to_canon
+
+        # Already canonical, so the data is shared rather than copied
+        wc = w.to_canon
+        for worm_id in w.worm_ids:
+            self.assertIs(wc.data_as_odict[worm_id],
+                          w.data_as_odict[worm_id])
+
+        # Otherwise each worm is converted once, when it is asked for
+        w.units['x'] = MeasurementUnit.create('cm')
+        wc = w.to_canon
+        first_id = w.worm_ids[0]
+        self.assertIs(wc.data_as_odict[first_id],
+                      wc.data_as_odict[first_id])
+        # Only its converted DataFrame is kept
+        self.assertNotIn(first_id, wc._data._worms._data)
+
+        # Checking for a worm doesn't convert it
+        last_id = w.worm_ids[-1]
+        self.assertIn(last_id, wc.data_as_odict)
+        self.assertNotIn(last_id, wc._data._converted)
+
+        # Later changes to w don't change the view
+        w.units['x'] = MeasurementUnit.create('mm')
+        for worm_id in w.worm_ids:
+            x = w.data_as_odict[worm_id].xs('x', axis=1, level='key')
+            x_canon = wc.data_as_odict[worm_id].xs('x', axis=1, level='key')
+            self.assertTrue(np.allclose(x_canon.values, x.values * 10,
+                                        equal_nan=True))
+        self.assertNotEqual(wc, w)
+
     def test_save_and_load(self):
         """
         All .wcon files in the tests folder are loaded, saved, then loaded
@@ -384,6 +545,50 @@ class TestWCONParser(unittest.TestCase):
                     '"data":[{"id":"1", "t":[1.3], "x":[[3,4]],"y":[[5.4,3]]},'
                     '{"id":"1", "t":[1.3], "x":[[3,4]], "y":[[5.5,3]]}]}'))
 
+    def test_data_segment_shapes(self):
+        # Singleton time, with aspectless values broadcast across frames
+        w = WCONWorms.load(StringIO('{"units":{"t":"s","x":"mm","y":"mm",'
+                                    '"ox":"mm","oy":"mm"},'
+                                    '"data":[{"id":"1", "t":[1.3,1.4], '
+                                    '"x":[[3,4],[3]], "y":[[5,3],[5]], '
+                                    '"ox":2, "oy":[1,null]},'
+                                    '{"id":"2", "t":1.3, "x":3, "y":5}]}'),
+                           validate_against_schema=False)
+        df = w.data_as_odict['1']
+        self.assertEqual(list(df[('1', 'aspect_size', 0)]), [2, 1])
+        self.assertEqual(df[('1', 'x', 1)].isnull().tolist(), [False, True])
+        self.assertEqual(list(w.data_as_odict['2'][('2', 'x', 0)]), [3])
+
+        # A mismatch in the middle of a long segment is reported by time,
+        # without dumping the whole segment into the error message
+        n = 1000
+        x = [[1, 2]] * n
+        y = [[1, 2]] * n
+        y[600] = [1]
+        segment = json.dumps({"id": "big", "t": list(range(n)),
+                              "x": x, "y": y})
+        with self.assertRaises(AssertionError) as cm:
+            WCONWorms.load(StringIO('{"units":{"t":"s","x":"mm","y":"mm"},'
+                                    '"data":[%s]}' % segment))
+        self.assertIn('time index 600', str(cm.exception))
+        self.assertLess(len(str(cm.exception)), 200)
+
+        # An array of arrays for an aspectless element: error
+        with self.assertRaises(Exception):
+            WCONWorms.load(StringIO('{"units":{"t":"s","x":"mm","y":"mm"},'
+                                    '"data":[{"id":"3", "t":[1.3], '
+                                    '"x":[[3]], "y":[[5]], "ox":[[1]]}]}'),
+                           validate_against_schema=False)
+
+        # A segment without y is rejected clearly, even unvalidated
+        for level in [False, 'header']:
+            for incremental in [False, True]:
+                with self.assertRaises(AssertionError):
+                    WCONWorms.load(StringIO('{"units":{"t":"s","x":"mm",'
+                                            '"y":"mm"}, "data":[{"id":"3", '
+                                            '"t":[1.3], "x":[[3]]}]}'),
+                                   level, incremental)
+
     def test_origin_offset(self):
         # ox and oy
         w1 = WCONWorms.load(
@@ -508,6 +713,112 @@ class TestWCONParser(unittest.TestCase):
         self.assertNotEqual(worm1, worm2)
         self.assertEqual(merged, merged2)
 
+    def test_merge_many(self):
+        # x[0] is t, in mm, at every t, unless null
+        pieces = []
+        for (units, scale, t, x0) in [('mm', 1, 2, 2), ('mm', 1, 1, None),
+                                      ('mm', 1, 0, 0), ('m', 1e-3, 1, 1)]:
+            x = [[x0 if x0 is None else x0 * scale, 4 * scale],
+                 [(t + 1) * scale, 4 * scale]]
+            pieces.append(WCONWorms.load(StringIO(json.dumps(
+                {'units': {'t': 's', 'x': units, 'y': 'mm'},
+                 'data': [{'id': '3', 't': [t, t + 1], 'x': x,
+                           'y': [[5.4, 3], [5.4, 3]]}]}))))
+
+        merged = WCONWorms.merge_many(pieces)
+        df = merged.data_as_odict['3']
+        self.assertEqual(list(df.index), [0, 1, 2, 3])
+        self.assertEqual(list(df[('3', 'x', 0)]), [0, 1, 2, 3])
+        self.assertEqual(merged, pieces[0] + pieces[1] + pieces[2] +
+                         pieces[3])
+
+        # A clash is found, wherever it is
+        pieces[3] = WCONWorms.load(StringIO(
+            '{"units":{"t":"s","x":"mm","y":"mm"},'
+            '"data":[{"id":"3", "t":[3], "x":[[1, 2.5]], "y":[[1, 2]]}]}'))
+        with self.assertRaises(AssertionError):
+            WCONWorms.merge_many(pieces)
+
+        # As are units that can't be merged
+        pieces[3] = WCONWorms.load(StringIO(
+            '{"units":{"t":"s","x":"mm","y":"s"}, "data":[]}'))
+        with self.assertRaises(AssertionError):
+            WCONWorms.merge_many(pieces)
+
+        # And so is having nothing to merge
+        with self.assertRaises(AssertionError):
+            WCONWorms.merge_many([])
+
+    def test_df_upsert(self):
+        columns = pd.MultiIndex.from_tuples(
+            [('1', 'x', 0), ('1', 'x', 1)], names=['id', 'key', 'aspect'])
+
+        def worm(t, x):
+            return pd.DataFrame(np.array(x, dtype=float), columns=columns,
+                                index=pd.Index(t, dtype=float, name='t'))
+
+        dest = worm([1, 2, 3], [[1, 1], [2, np.nan], [3, 3]])
+
+        # Pieces before or after dest are just concatenated
+        for (t, expected) in [([4, 5], [1, 2, 3, 4, 5]),
+                              ([-1, 0], [-1, 0, 1, 2, 3])]:
+            merged = df_upsert(worm(t, [[9, 9], [9, 9]]), dest)
+            self.assertEqual(list(merged.index), expected)
+
+        # Shared times are merged, and new ones inserted in order
+        merged = df_upsert(worm([0, 2, 2.5], [[0, 0], [2, 2], [5, 5]]),
+                           dest)
+        self.assertEqual(list(merged.index), [0, 1, 2, 2.5, 3])
+        self.assertEqual(merged.loc[2.0, ('1', 'x', 1)], 2)
+        # dest itself is unchanged
+        self.assertTrue(np.isnan(dest.loc[2.0, ('1', 'x', 1)]))
+
+        for x in [[[3, 3]], [[np.nan, 2]]]:
+            with self.assertRaises(AssertionError):
+                df_upsert(worm([2], x), dest)
+
+        # A column only src has is kept, even at a time dest also has
+        src = worm([2, 4], [[2, 2], [4, 4]])
+        src[('1', 'head', 0)] = np.array(['L', 'R'], dtype=object)
+        merged = df_upsert(src, dest)
+        self.assertEqual(list(merged.index), [1, 2, 3, 4])
+        self.assertEqual(merged.loc[2.0, ('1', 'head', 0)], 'L')
+        self.assertEqual(merged.loc[4.0, ('1', 'head', 0)], 'R')
+        self.assertTrue(pd.isnull(merged.loc[1.0, ('1', 'head', 0)]))
+        self.assertTrue(merged.equals(df_merge_many([dest, src])))
+
+    def test_update(self):
+        def recording(worm_id, t, x_units='mm'):
+            return WCONWorms.load(StringIO(json.dumps(
+                {'units': {'t': 's', 'x': x_units, 'y': 'mm'},
+                 'data': [{'id': worm_id, 't': [t, t + 1],
+                           'x': [[1, 2], [3, 4]],
+                           'y': [[5, 6], [7, 8]]}]})))
+
+        w = recording('1', 0, x_units='cm')
+        w_id = id(w)
+        pieces = [recording('1', t) for t in [2, 4, 6]] + \
+            [recording('2', 0), recording('1', 6)]
+        for piece in pieces:
+            w += piece
+            self.assertEqual(id(w), w_id)
+
+        self.assertEqual(w.num_worms, 2)
+        self.assertEqual(w.worm_ids, ['1', '2'])
+        self.assertTrue(w.is_canon)
+        self.assertEqual(list(w.data_as_odict['1'].index),
+                         list(range(8)))
+        self.assertEqual(w, WCONWorms.merge_many(
+            [recording('1', 0, x_units='cm')] + pieces))
+
+        # A clash leaves w as it was
+        fingerprint = w.fingerprint()
+        clash = recording('2', 1)
+        clash += recording('1', 8)
+        with self.assertRaises(AssertionError):
+            w.update(clash)
+        self.assertEqual(w.fingerprint(), fingerprint)
+
     def test_merge_user_defined_constants(self):
         """ This example is pulled right from the specification"""
 
@@ -762,6 +1073,732 @@ class TestWCONParser(unittest.TestCase):
         for chunk_filename in chunk_filenames:
             os.remove(chunk_filename)
 
+    def test_parallel_chunks(self):
+        """
+        Test loading a chunk set in worker processes, with one merge
+
+        """
+        num_chunks = 5
+        chunks = []
+        for i in range(num_chunks):
+            # Only the first chunk lists all the others; the rest list
+            # just their neighbours, so the links must be followed
+            if i == 0:
+                next_chunks = ['%i.wcon' % j for j in range(1, num_chunks)]
+            elif i < num_chunks - 1:
+                next_chunks = ['%i.wcon' % (i + 1)]
+            else:
+                next_chunks = None
+            prev_chunks = ['%i.wcon' % (i - 1)] if i > 0 else None
+            chunks.append(json.dumps(
+                {'files': {'current': '%i.wcon' % i, 'prev': prev_chunks,
+                           'next': next_chunks},
+                 'units': {'t': 's', 'x': 'mm', 'y': 'mm'},
+                 'data': [{'id': '1', 't': [i, i + 0.5],
+                           'x': [[i, 1], [i, 2]], 'y': [[3, i], [4, i]]},
+                          {'id': '2', 't': [i + 1],
+                           'x': [[i, 5, 6]], 'y': [[7, 8, i]]}]}))
+
+        chunk_filenames = ['test_parallel_chunk_%i.wcon' % i
+                           for i in range(num_chunks)]
+        for (chunk_filename, chunk) in zip(chunk_filenames, chunks):
+            with open(chunk_filename, 'w') as outfile:
+                outfile.write(chunk)
+
+        w_manual = WCONWorms.load(StringIO(chunks[0]))
+        for chunk in chunks[1:]:
+            w_manual += WCONWorms.load(StringIO(chunk))
+
+        for processes in [1, 2, None]:
+            w = WCONWorms.load_from_file(chunk_filenames[2],
+                                         processes=processes)
+            self.assertEqual(w, w_manual)
+            self.assertEqual(w.worm_ids, ['1', '2'])
+            self.assertFalse(hasattr(w, 'files'))
+
+        # Only the chunks in the requested direction are loaded
+        w_next = WCONWorms.load_from_file(chunk_filenames[2],
+                                          load_prev_chunks=False,
+                                          processes=2)
+        self.assertEqual(list(w_next.data_as_odict['1'].index),
+                         [2, 2.5, 3, 3.5, 4, 4.5])
+
+        # WCONWorms objects survive the trip to a worker and back
+        import pickle
+        self.assertEqual(pickle.loads(pickle.dumps(w_manual)), w_manual)
+
+        # Chunks that disagree about a timeframe can't be merged
+        with open(chunk_filenames[3], 'w') as outfile:
+            outfile.write(chunks[3].replace('[3, 1]', '[3, 9]')
+                          .replace('"t": [3, 3.5]', '"t": [2.5, 3.5]'))
+        with self.assertRaises(AssertionError):
+            WCONWorms.load_from_file(chunk_filenames[0], processes=2)
+
+        for chunk_filename in chunk_filenames:
+            os.remove(chunk_filename)
+
+    def test_chunk_set(self):
+        """
+        Test that a WCONChunkSet loads only the chunks it needs
+
+        """
+        from wcon import WCONChunkSet
+
+        num_chunks = 4
+        chunk_filenames = ['test_chunk_set_%i.wcon' % i
+                           for i in range(num_chunks)]
+        for i in range(num_chunks):
+            # The last chunk measures time in milliseconds
+            t_scale = 1000 if i == num_chunks - 1 else 1
+            data = [{'id': '1',
+                     't': [10 * i * t_scale, (10 * i + 5) * t_scale],
+                     'x': [[i, 1], [i, 2]], 'y': [[3, i], [4, i]]}]
+            if i < 2:
+                data.append({'id': '2', 't': [(10 * i + 1) * t_scale],
+                             'x': [[i, 5, 6]], 'y': [[7, 8, i]]})
+            chunk = {'files': {'current': '%i.wcon' % i,
+                               'prev': ['%i.wcon' % j
+                                        for j in range(i - 1, -1, -1)],
+                               'next': ['%i.wcon' % j
+                                        for j in range(i + 1, num_chunks)]},
+                     'units': {'t': 'ms' if t_scale == 1000 else 's',
+                               'x': 'mm', 'y': 'mm'},
+                     'data': data}
+            with open(chunk_filenames[i], 'w') as outfile:
+                json.dump(chunk, outfile)
+
+        w_all = WCONWorms.load_from_file(chunk_filenames[0])
+
+        chunk_set = WCONChunkSet(chunk_filenames[2])
+        self.assertEqual(chunk_set.num_chunks, num_chunks)
+        self.assertEqual(chunk_set.worm_ids, ['1', '2'])
+        self.assertEqual(chunk_set.t_range['1'], (0, 35))
+        self.assertEqual(chunk_set.t_range['2'], (1, 11))
+        self.assertEqual(chunk_set.loaded_bytes, 0)
+
+        self.assertEqual(chunk_set.load(), w_all)
+        self.assertEqual(chunk_set.overlapping_chunks(['2']), [0, 1])
+        self.assertEqual(chunk_set.overlapping_chunks(t_range=(12, 30)),
+                         [1, 2, 3])
+
+        w = chunk_set.load(worm_ids='1', t_range=(12, 30))
+        self.assertEqual(w.worm_ids, ['1'])
+        self.assertEqual(list(w.data_as_odict['1'].index), [15, 20, 25, 30])
+
+        w = chunk_set.load(t_range=(100, None))
+        self.assertEqual(w.num_worms, 0)
+
+        # With no memory to spare, only the chunks of the last load are kept
+        small_chunk_set = WCONChunkSet(chunk_filenames[0], max_bytes=1)
+        small_chunk_set.load(t_range=(0, 12))
+        self.assertEqual(list(small_chunk_set._loaded.keys()), [0, 1])
+        small_chunk_set.load(t_range=(30, None))
+        self.assertEqual(list(small_chunk_set._loaded.keys()), [3])
+
+        # The loaded chunks are plain canonical data, not lazy views
+        self.assertIsInstance(small_chunk_set._loaded[3]._data,
+                              collections.OrderedDict)
+
+        # A worm with no time points in a chunk has no time range there
+        with open(chunk_filenames[0], 'w') as outfile:
+            json.dump({'units': {'t': 's', 'x': 'mm', 'y': 'mm'},
+                       'data': [{'id': '1', 't': [1], 'x': [[1]],
+                                 'y': [[2]]},
+                                {'id': '3', 't': [], 'x': [], 'y': []}]},
+                      outfile)
+        chunk_set = WCONChunkSet(chunk_filenames[0],
+                                 validate_against_schema=False)
+        self.assertEqual(chunk_set.worm_ids, ['1'])
+        self.assertEqual(chunk_set.overlapping_chunks(), [0])
+        self.assertEqual(list(chunk_set.load().data_as_odict['1'].index),
+                         [1])
+
+        for chunk_filename in chunk_filenames:
+            os.remove(chunk_filename)
+
+    def test_incremental_load(self):
+        """
+        Test that decoding the "data" array one segment at a time gives
+        the same result as loading the whole file at once
+
+        """
+        WCON_strings = [
+            '{"units":{"t":"s","x":"mm","y":"mm"},"data":[]}',
+            # A single data segment need not be wrapped in an array
+            ('{"units":{"t":"s","x":"mm","y":"mm"},'
+             '"data":{"id":"3", "t":[1.3], "x":[[3,4]], "y":[[5.4,3]]}}'),
+            # "data" may come before "units"
+            ('{"data":[{"id":"2", "t":[1.3, 1.4], "x":[[3,4],[5,6.5]],'
+             '"y":[[5.4,3],[1e3,-2]]},'
+             '{"id":"1", "t":[1.3], "x":[[3,4,5]], "y":[[5.4,3,7]]},'
+             '{"id":"2", "t":[1.5], "x":[[3,4]], "y":[[5.4,3]]}],'
+             '"metadata":{"who":"me"},'
+             '"units":{"t":"s","x":"mm","y":"mm"}}')]
+
+        import wcon.wcon_stream
+        original_chunk_size = wcon.wcon_stream.CHUNK_SIZE
+        try:
+            for chunk_size in [original_chunk_size, 1, 7]:
+                # Exercise values straddling the edge of the read buffer
+                wcon.wcon_stream.CHUNK_SIZE = chunk_size
+                for WCON_string in WCON_strings:
+                    w = WCONWorms.load(StringIO(WCON_string))
+                    w_incremental = WCONWorms.load(StringIO(WCON_string),
+                                                   incremental=True)
+                    self.assertEqual(w, w_incremental)
+                    self.assertEqual(w.worm_ids, w_incremental.worm_ids)
+                    self.assertEqual(w.metadata, w_incremental.metadata)
+        finally:
+            wcon.wcon_stream.CHUNK_SIZE = original_chunk_size
+
+        # Byte streams are decoded as UTF-8
+        from io import BytesIO
+        w_bytes = WCONWorms.load(BytesIO(WCON_strings[2].encode('utf-8')),
+                                 incremental=True)
+        self.assertEqual(w_bytes, WCONWorms.load(StringIO(WCON_strings[2])))
+
+        # Duplicate keys are still rejected, at the root and within segments
+        with self.assertRaises(KeyError):
+            WCONWorms.load(StringIO('{"units":{"t":"s","x":"mm","y":"mm"},'
+                                    '"data":[], "data":[]}'),
+                           incremental=True)
+        with self.assertRaises(KeyError):
+            WCONWorms.load(StringIO('{"units":{"t":"s","x":"mm","y":"mm"},'
+                                    '"data":[{"id":"1", "id":"2", "t":[1.3],'
+                                    '"x":[[3]], "y":[[4]]}]}'),
+                           incremental=True)
+
+        with self.assertRaises(ValueError):
+            WCONWorms.load(StringIO('{"lalala":blahblah}'), incremental=True)
+
+        # Data segments are validated against the schema one at a time
+        with self.assertRaises(jsonschema.exceptions.ValidationError):
+            WCONWorms.load(StringIO('{"units":{"t":"s","x":"mm","y":"mm"},'
+                                    '"data":[{"id":3, "t":[1.3],'
+                                    '"x":[[3,4]], "y":[[5.4,3]]}]}'),
+                           incremental=True)
+
+        # load_from_file reads plain files as byte streams
+        JSON_path = '../../../tests/minimax.wcon'
+        self.assertEqual(WCONWorms.load_from_file(JSON_path),
+                         WCONWorms.load_from_file(JSON_path,
+                                                  incremental=True))
+
+    def test_validation_levels(self):
+        header = '{"units":{"t":"s","x":"mm","y":"mm"},"data":[%s]}'
+        good_segment = '{"id":"1", "t":[1.3], "x":[[3,4]], "y":[[5.4,3]]}'
+        # Bad shape: caught by jsonschema, but also by the loader itself
+        bad_shape = '{"id":"2", "t":[1.3], "x":[[3,"a"]], "y":[[5.4,3]]}'
+        # Bad id: only caught by jsonschema
+        bad_id = '{"id":2, "t":[1.3], "x":[[3,4]], "y":[[5.4,3]]}'
+
+        levels = [True, 'full', 'structural', 'sampled', 'header', False]
+        for incremental in [False, True]:
+            for level in levels:
+                # A valid file loads the same at every level
+                self.assertEqual(
+                    WCONWorms.load(StringIO(header % good_segment), level,
+                                   incremental),
+                    WCONWorms.load(StringIO(header % good_segment)))
+
+                # The bad shape is rejected whatever the level
+                with self.assertRaises(Exception):
+                    WCONWorms.load(StringIO(header % bad_shape), level,
+                                   incremental)
+
+            # Strings, booleans and bad enums are rejected at full and
+            # structural levels, and the first two by the loader itself
+            for (segment, levels_rejecting) in [
+                    ('{"id":"2", "t":[1.3], "x":[["1.5"]], "y":[[3]]}',
+                     levels),
+                    ('{"id":"2", "t":[1.3], "x":[[true]], "y":[[3]]}',
+                     levels),
+                    ('{"id":"2", "t":[true], "x":[[1]], "y":[[3]]}',
+                     levels),
+                    ('{"id":"2", "t":[1.3], "x":[[1]], "y":[[3]], '
+                     '"head":"Q"}', [True, 'full', 'structural'])]:
+                for level in levels_rejecting:
+                    with self.assertRaises(Exception):
+                        WCONWorms.load(StringIO(header % (good_segment + ',' +
+                                                          segment)),
+                                       level, incremental)
+
+            # Only full and structural validation check every id
+            for level in [True, 'full', 'structural']:
+                with self.assertRaises(
+                        jsonschema.exceptions.ValidationError):
+                    WCONWorms.load(StringIO(header % (good_segment + ',' +
+                                                      bad_id)),
+                                   level, incremental)
+            WCONWorms.load(StringIO(header % (good_segment + ',' + bad_id)),
+                           'sampled', incremental)
+
+            # The header is validated at every level but False
+            for level in levels[:-1]:
+                with self.assertRaises(
+                        jsonschema.exceptions.ValidationError):
+                    WCONWorms.load(StringIO('{"units":{"t":"s"},"data":[]}'),
+                                   level, incremental)
+
+        with self.assertRaises(ValueError):
+            WCONWorms.load(StringIO(header % good_segment), 'quick')
+
+        WCONWorms.validate_from_schema(header % good_segment)
+        WCONWorms.validate_from_schema(header % bad_id, 'header')
+        with self.assertRaises(jsonschema.exceptions.ValidationError):
+            WCONWorms.validate_from_schema(header % bad_id)
+
+    def test_json_backends(self):
+        from wcon import json_backend
+
+        WCON_strings = [
+            ('{"units":{"t":"s","x":"mm","y":"mm"},"metadata":{"lab":'
+             '{"location":"CA", "name":"a:{b}"}},'
+             '"data":[{"id":"1", "t":[1.3], "x":[[3,4]], "y":[[5.4,3]]},'
+             '{"id" : "2", "t":[1.4], "x":[[3]], "y":[[4]], "@a":{"b":1},'
+             '"walk":[{"px":[1, 2, 3], "n":4, "4":"abc"}]}]}'),
+            ('{"units":{"t":"s","x":"mm","y":"mm"},'
+             '"data":{"id":"1", "t":[1.3], "x":[[3,4]], "y":[[5.4,3]]}}')]
+        duplicated_strings = [
+            '{"units":{}, "units":{}}',
+            '{"units":{"t":"s", "t" : "s"}}',
+            '{"data":[{"id":"1", "t":[1.3]}, {"id":"2", "id":"2"}]}',
+            '{"data":[{"id":"1", "@a":[{"b":1, "b":2}]}]}',
+            '{"metadata":{"a":":", "b":{}, "c":{"d":1, "d":2}}}']
+
+        original_backend = json_backend.backend
+        try:
+            for backend in ['json', 'orjson']:
+                if backend == 'orjson' and json_backend.orjson is None:
+                    continue
+                json_backend.backend = backend
+
+                for WCON_string in WCON_strings:
+                    self.assertEqual(
+                        json_backend.loads(WCON_string),
+                        json.loads(WCON_string,
+                                   object_pairs_hook=collections.OrderedDict))
+                    WCONWorms.load(StringIO(WCON_string))
+
+                if backend == 'orjson':
+                    # Objects nested in records don't defeat the fast path
+                    self.assertIsNotNone(json_backend._loads_with_orjson(
+                        WCON_strings[0].replace('a:{b}', 'a')))
+
+                for duplicated_string in duplicated_strings:
+                    with self.assertRaises(KeyError):
+                        json_backend.loads(duplicated_string)
+
+                with self.assertRaises(ValueError):
+                    json_backend.loads('{"t":NaN,}')
+        finally:
+            json_backend.backend = original_backend
+
+        # Saving gives the same text as json.dump
+        w = WCONWorms.load(StringIO(WCON_strings[0]))
+        for pretty_print in [False, True]:
+            self.assertEqual(json_backend.dumps(w.as_ordered_dict,
+                                                pretty_print),
+                             json.dumps(w.as_ordered_dict,
+                                        indent=4 if pretty_print else None))
+
+    def test_load_filters(self):
+        WCON_string = \
+            """
+            {
+                "units":{"t":"s", "x":"mm", "y":"mm", "ox":"mm", "oy":"mm"},
+                "data":[{ "id":"1", "t":[1.3, 1.4, 1.5],
+                          "x":[[3, 4], [5, 6, 7], [8]],
+                          "y":[[3, 4], [5, 6, 7], [8]],
+                          "ox":[1, 2, 3], "oy":0 },
+                        { "id":"2", "t":1.4, "x":[1, 2], "y":[3, 4] },
+                        { "id":"3", "t":[1.6], "x":[[1]], "y":[[2]] },
+                        { "id":"1", "t":[1.8], "x":[[1, 2]], "y":[[3, 4]] }
+                ]
+            }
+            """
+        w_all = WCONWorms.load(StringIO(WCON_string),
+                               validate_against_schema=False)
+
+        for incremental in [False, True]:
+            w = WCONWorms.load(StringIO(WCON_string), False, incremental,
+                               worm_ids=['1', '3'])
+            self.assertEqual(w.worm_ids, ['1', '3'])
+            self.assertEqual(w.data_as_odict['1'].shape,
+                             w_all.data_as_odict['1'].shape)
+
+            w = WCONWorms.load(StringIO(WCON_string), False, incremental,
+                               t_range=(1.4, 1.6))
+            self.assertEqual(w.worm_ids, ['1', '2', '3'])
+            df = w.data_as_odict['1']
+            self.assertEqual(list(df.index), [1.4, 1.5])
+            self.assertEqual(list(df[('1', 'x', 0)]), [7, 11])
+            self.assertEqual(list(df[('1', 'aspect_size', 0)]), [3, 1])
+
+            w = WCONWorms.load(StringIO(WCON_string), False, incremental,
+                               worm_ids='1', t_range=(1.5, None))
+            self.assertEqual(w.worm_ids, ['1'])
+            self.assertEqual(list(w.data_as_odict['1'].index), [1.5, 1.8])
+
+            w = WCONWorms.load(StringIO(WCON_string), False, incremental,
+                               worm_ids=['4'])
+            self.assertEqual(w.num_worms, 0)
+
+        # Segments outside the selection are not even validated
+        WCONWorms.load(StringIO('{"units":{"t":"s","x":"mm","y":"mm"},'
+                                '"data":[{"id":"1", "t":[1.3], '
+                                '"x":[[3,4]], "y":[[5.4,3,1,-3]]},'
+                                '{"id":"2", "t":[1.3], '
+                                '"x":[[3,4]], "y":[[5.4,3]]}]}'),
+                       worm_ids=['2'])
+
+        # But times that aren't numbers are rejected as usual, even when
+        # filtering by them
+        for t in ['"1.3"', '["a"]', '[{"b":1}]']:
+            with self.assertRaises(AssertionError):
+                WCONWorms.load(StringIO('{"units":{"t":"s","x":"mm",'
+                                        '"y":"mm"}, "data":[{"id":"1", '
+                                        '"t":%s, "x":[[3,4]], '
+                                        '"y":[[5,3]]}]}' % t),
+                               validate_against_schema=False,
+                               t_range=(1, 2))
+
+    def test_zip_archives(self):
+        """
+        Test that zip archives are loaded without extracting them
+
+        """
+        w_files = WCONWorms.load_from_file('../../../tests/maximal_0.wcon')
+
+        zip_path = 'test_zip_archives.wcon.zip'
+        with zipfile.ZipFile(zip_path, 'w') as zf:
+            for i in [1, 0, 2]:
+                zf.write('../../../tests/maximal_%i.wcon' % i,
+                         'maximal_%i.wcon' % i)
+
+        # A folder in the way of extraction mustn't matter
+        os.makedirs('_zip_archive')
+        try:
+            for incremental in [False, True]:
+                w_zip = WCONWorms.load_from_file(zip_path,
+                                                 incremental=incremental)
+                self.assertEqual(w_zip, w_files)
+                self.assertFalse(hasattr(w_zip, 'files'))
+        finally:
+            os.rmdir('_zip_archive')
+
+        # WCON files in the archive must all be linked together
+        with zipfile.ZipFile(zip_path, 'a') as zf:
+            zf.write('../../../tests/minimax.wcon', 'minimax.wcon')
+        with self.assertRaises(AssertionError):
+            WCONWorms.load_from_file(zip_path)
+
+        # An archive with one file
+        with zipfile.ZipFile(zip_path, 'w') as zf:
+            zf.write('../../../tests/minimax.wcon', 'minimax.wcon')
+        for incremental in [False, True]:
+            self.assertEqual(
+                WCONWorms.load_from_file(zip_path, incremental=incremental),
+                WCONWorms.load_from_file('../../../tests/minimax.wcon'))
+
+        os.remove(zip_path)
+
+    def test_streaming_save(self):
+        """
+        Test that saving a worm at a time gives exactly the same text as
+        serializing the whole object at once
+
+        """
+        for JSON_path in ['../../../tests/minimax.wcon',
+                          '../../../tests/multiworm.wcon',
+                          '../../../tests/offset_and_centroid.wcon']:
+            w = WCONWorms.load_from_file(JSON_path)
+            for pretty_print in [False, True]:
+                stream = StringIO()
+                w.save(stream, pretty_print)
+                self.assertEqual(
+                    stream.getvalue(),
+                    json.dumps(w.as_ordered_dict,
+                               indent=4 if pretty_print else None))
+
+        # Times are converted to canonical units only once
+        w = WCONWorms.load(StringIO('{"units":{"t":"ms","x":"cm","y":"cm"},'
+                                    '"data":[{"id":"1", "t":[1000, 2000],'
+                                    '"x":[[1, 2], [3, 4]],'
+                                    '"y":[[5, 6], [7, 8]]}]}'))
+        stream = StringIO()
+        w.save(stream)
+        data_segment = json.loads(stream.getvalue())['data'][0]
+        self.assertEqual(data_segment['t'], [1, 2])
+        self.assertEqual(data_segment['x'], [[10, 20], [30, 40]])
+
+    def test_compressed_save(self):
+        w = WCONWorms.load_from_file('../../../tests/minimax.wcon')
+        zip_path = 'test_compressed_save.wcon.zip'
+
+        sizes = []
+        for compression_level in [0, None, 9]:
+            w.save_to_file(zip_path, compress_file=True,
+                           compression_level=compression_level)
+            sizes.append(os.path.getsize(zip_path))
+
+            with zipfile.ZipFile(zip_path, 'r') as zf:
+                self.assertEqual(zf.namelist(), ['test_compressed_save.wcon'])
+            self.assertEqual(WCONWorms.load_from_file(zip_path), w)
+            self.assertFalse(os.path.exists(zip_path + '.TEMP'))
+
+        self.assertTrue(sizes[0] > sizes[1] >= sizes[2])
+
+        # The member holds exactly what an uncompressed save would
+        w.save_to_file('test_compressed_save.wcon')
+        with zipfile.ZipFile(zip_path, 'r') as zf:
+            with open('test_compressed_save.wcon', 'rb') as f:
+                self.assertEqual(zf.read('test_compressed_save.wcon'),
+                                 f.read())
+
+        os.remove(zip_path)
+        os.remove('test_compressed_save.wcon')
+
+    def test_chunked_save(self):
+        w = WCONWorms.load_from_file('../../../tests/minimax.wcon')
+        chunk_paths = ['test_chunked_save_%i.wcon' % i for i in range(3)]
+
+        for processes in [1, 2]:
+            w.save_to_file('test_chunked_save.wcon', num_chunks=3,
+                           processes=processes)
+
+            for (i, chunk_path) in enumerate(chunk_paths):
+                with open(chunk_path, 'r') as f:
+                    files = json.load(f)['files']
+                self.assertEqual(files['current'], chunk_path)
+                self.assertEqual(files['prev'], chunk_paths[:i][::-1])
+                self.assertEqual(files['next'], chunk_paths[i + 1:])
+
+            # Loading any chunk loads the whole set back
+            for chunk_path in chunk_paths:
+                self.assertEqual(WCONWorms.load_from_file(chunk_path), w)
+        self.assertFalse(os.path.exists('test_chunked_save_3.wcon'))
+
+        # Or all the chunks can go in one archive
+        zip_path = 'test_chunked_save.wcon.zip'
+        w.save_to_file(zip_path, compress_file=True, num_chunks=3)
+        with zipfile.ZipFile(zip_path, 'r') as zf:
+            self.assertEqual(zf.namelist(), chunk_paths)
+        self.assertEqual(WCONWorms.load_from_file(zip_path), w)
+
+        os.remove(zip_path)
+        for chunk_path in glob.glob('test_chunked_save_*.wcon'):
+            os.remove(chunk_path)
+
+        # Chunks of a target size
+        num_frames = 500
+        w = WCONWorms.load(StringIO(json.dumps(
+            {'units': {'t': 's', 'x': 'mm', 'y': 'mm'},
+             'data': [{'id': '1', 't': [i * 0.1 for i in range(num_frames)],
+                       'x': [[i, i + 1.5, i + 2.25]
+                             for i in range(num_frames)],
+                       'y': [[i * 2, i - 1, i + 3]
+                             for i in range(num_frames)]}]})))
+        w.save_to_file('test_chunked_save.wcon')
+        total_size = os.path.getsize('test_chunked_save.wcon')
+        os.remove('test_chunked_save.wcon')
+
+        chunk_bytes = 5000
+        w.save_to_file('test_chunked_save.wcon', chunk_bytes=chunk_bytes)
+        chunk_paths = sorted(glob.glob('test_chunked_save_*.wcon'))
+        self.assertEqual(len(chunk_paths),
+                         int(np.ceil(total_size / float(chunk_bytes))))
+        for chunk_path in chunk_paths:
+            self.assertTrue(0.8 * chunk_bytes <
+                            os.path.getsize(chunk_path) <
+                            1.2 * chunk_bytes)
+        self.assertEqual(WCONWorms.load_from_file(chunk_paths[0]), w)
+
+        for chunk_path in chunk_paths:
+            os.remove(chunk_path)
+
+    def test_writer(self):
+        units = {'t': 's', 'x': 'mm', 'y': 'mm'}
+        metadata = {'who': 'me'}
+
+        def record(writer):
+            for i in range(10):
+                writer.add_frame('1', i * 0.5, x=[i, i + 1], y=[i, i + 2],
+                                 head='L')
+                if i % 2 == 0:
+                    writer.add_frame('2', i * 0.5, x=[i], y=[-i])
+            writer.add_frames('3', [1, 2], x=[[1], [2, 3]],
+                              y=[[5], [6, 7]])
+
+        with WCONWriter('test_writer.wcon', units, metadata,
+                        frames_per_segment=3) as writer:
+            record(writer)
+            # The file is valid WCON whenever a segment has been written
+            w = WCONWorms.load_from_file('test_writer.wcon')
+            self.assertEqual(w.worm_ids, ['1', '2'])
+            # And holds everything added so far after a checkpoint
+            writer.checkpoint()
+            self.assertEqual(
+                WCONWorms.load_from_file('test_writer.wcon').worm_ids,
+                ['1', '2', '3'])
+        w = WCONWorms.load_from_file('test_writer.wcon')
+        self.assertEqual(w.metadata, metadata)
+        self.assertEqual(len(w.data_as_odict['1']), 10)
+        self.assertEqual(w.data_as_odict['3'].loc[2.0, ('3', 'x', 1)], 3)
+
+        # Rolling over to new chunks gives the same data
+        for (max_chunk_bytes, max_chunk_duration) in [(500, None),
+                                                      (None, 1.5)]:
+            with WCONWriter('test_writer_chunked.wcon', units, metadata,
+                            pretty_print=True, frames_per_segment=2,
+                            max_chunk_bytes=max_chunk_bytes,
+                            max_chunk_duration=max_chunk_duration) as writer:
+                record(writer)
+            self.assertTrue(len(writer.paths) > 1)
+            for chunk_path in writer.paths:
+                self.assertEqual(WCONWorms.load_from_file(chunk_path), w)
+                # No chunk is left empty
+                self.assertTrue(WCONWorms.load_from_file(
+                    chunk_path, load_prev_chunks=False,
+                    load_next_chunks=False).num_worms > 0)
+            if max_chunk_duration is not None:
+                for chunk_path in writer.paths:
+                    chunk = WCONWorms.load_from_file(
+                        chunk_path, load_prev_chunks=False,
+                        load_next_chunks=False)
+                    t = [df.index for df in chunk.data_as_odict.values()]
+                    self.assertTrue(max(t_i.max() for t_i in t) -
+                                    min(t_i.min() for t_i in t) <
+                                    max_chunk_duration)
+            for chunk_path in writer.paths:
+                os.remove(chunk_path)
+
+        # A full chunk is only followed by another once there is more data
+        for num_frames in [3, 4]:
+            with WCONWriter('test_writer_chunked.wcon', units,
+                            frames_per_segment=1,
+                            max_chunk_bytes=150) as writer:
+                for i in range(num_frames):
+                    writer.add_frame('1', i, x=[i], y=[i])
+            self.assertEqual(len(writer.paths), num_frames - 2)
+            with open(writer.paths[-1], 'r') as f:
+                self.assertEqual(json.load(f)['files']['next'], [])
+            self.assertEqual(len(WCONWorms.load_from_file(
+                writer.paths[0]).data_as_odict['1']), num_frames)
+            for chunk_path in writer.paths:
+                os.remove(chunk_path)
+
+        os.remove('test_writer.wcon')
+
+    def test_probe(self):
+        WCON_string = \
+            """
+            {
+                "units":{"t":"s", "x":"mm", "y":"mm"},
+                "metadata":{"who":"me", "lab":{"name":"[{\\"}]"}},
+                "data":[{ "id":"2", "t":[1.3, 1.4], "x":[[3, 4], [5]],
+                          "y":[[3, 4], [5]], "@a":{"b":["]}"]} },
+                        { "@a":"no id or t" },
+                        { "x":[[1, 2]], "y":[[3, 4]], "t":[0.5],
+                          "id":"1" },
+                        { "id":"2", "t":1.8, "x":[1, 2], "y":[3, 4] }
+                ],
+                "files":{"current":"probe.wcon", "prev":null, "next":null}
+            }
+            """
+        test_path = 'test_probe.wcon'
+        with open(test_path, 'w') as f:
+            f.write(WCON_string)
+        zip_path = test_path + '.zip'
+        with zipfile.ZipFile(zip_path, 'w') as zf:
+            zf.write(test_path)
+
+        import wcon.wcon_stream
+        original_chunk_size = wcon.wcon_stream.CHUNK_SIZE
+        try:
+            for chunk_size in [original_chunk_size, 1, 5]:
+                wcon.wcon_stream.CHUNK_SIZE = chunk_size
+                for path in [test_path, zip_path]:
+                    probe = WCONWorms.probe(path)
+
+                    self.assertEqual(probe['units']['x'],
+                                     MeasurementUnit.create('mm'))
+                    self.assertEqual(probe['metadata'],
+                                     {"who": "me",
+                                      "lab": {"name": "[{\"}]"}})
+                    self.assertEqual(probe['files']['current'],
+                                     'probe.wcon')
+                    self.assertEqual(probe['num_segments'], 3)
+                    self.assertEqual(probe['worm_ids'], ['1', '2'])
+                    self.assertEqual(probe['t_range'],
+                                     {'1': (0.5, 0.5), '2': (1.3, 1.8)})
+        finally:
+            wcon.wcon_stream.CHUNK_SIZE = original_chunk_size
+
+        os.remove(test_path)
+        os.remove(zip_path)
+
+    def test_sidecar_cache(self):
+        from wcon.wcon_cache import SidecarCache
+
+        cache_dir = 'test_cache'
+        cache = SidecarCache(cache_dir)
+        cache.clear()
+        JSON_path = '../../../tests/minimax.wcon'
+        w = WCONWorms.load_from_file(JSON_path)
+
+        # The first load fills the cache, and the second uses it
+        for i in range(2):
+            w_cached = WCONWorms.load_from_file(JSON_path, cache=cache)
+            self.assertEqual(w, w_cached)
+            self.assertEqual(w.metadata, w_cached.metadata)
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+        for worm_id in w.worm_ids:
+            self.assertTrue(w.data_as_odict[worm_id].equals(
+                w_cached.data_as_odict[worm_id]))
+
+        # The float columns are still backed by the memory-mapped file
+        df = w_cached.data_as_odict[w.worm_ids[0]]
+        base = df.loc[:, (df.dtypes == float).values].values
+        while not isinstance(base, np.memmap) and base is not None:
+            base = base.base
+        self.assertIsInstance(base, np.memmap)
+
+        # Different load options get their own entry
+        w_filtered = WCONWorms.load_from_file(JSON_path, cache=cache,
+                                              worm_ids=[w.worm_ids[0]])
+        self.assertEqual(w_filtered.worm_ids, [w.worm_ids[0]])
+        self.assertEqual(len(os.listdir(cache_dir)), 2)
+
+        # An entry only validated at a lower level isn't used for a
+        # higher one
+        test_path = 'test_cache.wcon'
+        with open(test_path, 'w') as f:
+            f.write('{"units":{"t":"s","x":"mm","y":"mm"},'
+                    '"data":[{"id":3, "t":[1.3], "x":[[3,4]], '
+                    '"y":[[5.4,3]]}]}')
+        WCONWorms.load_from_file(test_path, validate_against_schema=False,
+                                 cache=cache)
+        with self.assertRaises(jsonschema.exceptions.ValidationError):
+            WCONWorms.load_from_file(test_path, cache=cache)
+
+        # Changing the file invalidates its entry
+        with open(test_path, 'w') as f:
+            f.write('{"units":{"t":"s","x":"mm","y":"mm"},'
+                    '"data":[{"id":"3", "t":[1.3, 1.4], "x":[[3,4],[5,6]], '
+                    '"y":[[5.4,3],[1,2]]}]}')
+        w_changed = WCONWorms.load_from_file(test_path, cache=cache)
+        self.assertEqual(len(w_changed.data_as_odict['3']), 2)
+
+        # Entries are evicted once the cache is full
+        self.assertEqual(len(os.listdir(cache_dir)), 4)
+        SidecarCache(cache_dir, max_bytes=1).evict()
+        self.assertEqual(len(os.listdir(cache_dir)), 0)
+
+        cache.clear()
+        self.assertFalse(os.path.exists(cache_dir))
+        os.remove(test_path)
+
     @unittest.skip("Skip this for now")
     def test_offset_example_files(self):
         """
@@ -780,6 +1817,103 @@ class TestWCONParser(unittest.TestCase):
         for worm_pair in [(wA, wB) for wA in worm_list for wB in worm_list]:
             self.assertEqual(worm_pair[0], worm_pair[1])
 
+    def test_convert_origin(self):
+        WCON_string = \
+            """
+            {
+                "units":{"t":"s", "x":"mm", "y":"mm", "ox":"mm", "oy":"mm",
+                         "cx":"mm", "cy":"mm"},
+                "data":[{ "id":"1", "t":[0, 1], "ox":[10, 30], "oy":[20, 0],
+                          "cx":[1, 2], "cy":[2, 3],
+                          "x":[[1, 2], [3, 4]], "y":[[3, 4], [5, 6]] },
+                        { "id":"2", "t":[0, 1], "ox":[100, 200], "oy":[0, 1],
+                          "x":[[1], [2]], "y":[[1], [2]] }]
+            }
+            """
+        w = WCONWorms.load(StringIO(WCON_string))
+
+        # The offsets are applied, and then dropped, as the data is loaded
+        expected = {('1', 'x'): [[0, 1], [1, 2]],
+                    ('1', 'y'): [[1, 2], [2, 3]],
+                    ('1', 'cx'): [[11], [32]],
+                    ('1', 'cy'): [[22], [3]],
+                    ('2', 'x'): [[101], [202]],
+                    ('2', 'y'): [[1], [3]]}
+        for ((worm_id, key), values) in expected.items():
+            df = w.data_as_odict[worm_id]
+            self.assertEqual(df.loc[:, (worm_id, key)].values.tolist(),
+                             values)
+        for df in w.data_as_odict.values():
+            self.assertFalse(
+                set(df.columns.get_level_values('key')) & {'ox', 'oy'})
+            self.assertFalse(set(df.columns.levels[1]) & {'ox', 'oy'})
+
+        # convert_origin does the same to a DataFrame of several worms
+        columns = [(worm_id, key, 0) for worm_id in ['1', '2']
+                   for key in ['cx', 'cy', 'ox', 'oy', 'x', 'y']
+                   if key[0] != 'c' or worm_id == '1']
+        rows = [[1, 2, 10, 20, 1, 3, 100, 0, 1, 1],
+                [2, 3, 30, 0, 3, 5, 200, 1, 2, 2]]
+        df = pd.DataFrame(rows, index=pd.Index([0., 1.], name='t'),
+                          dtype=float)
+        df.columns = pd.MultiIndex.from_tuples(
+            columns, names=['id', 'key', 'aspect'])
+        convert_origin(df)
+        self.assertEqual(df.loc[:, ('1', 'x', 0)].tolist(), [0, 1])
+        self.assertEqual(df.loc[:, ('1', 'cy', 0)].tolist(), [22, 3])
+        self.assertEqual(df.loc[:, ('2', 'x', 0)].tolist(), [101, 202])
+        self.assertEqual(df.loc[:, ('2', 'y', 0)].tolist(), [1, 3])
+        self.assertFalse(set(df.columns.levels[1]) & {'ox', 'oy'})
+
+    def test_reverse_backwards_worms(self):
+        WCON_string = \
+            """
+            {
+                "units":{"t":"s", "x":"mm", "y":"mm"},
+                "data":[{ "id":"1", "t":[0, 1, 2],
+                          "head":["R", "L", "R"], "ventral":["CW", "CW", "?"],
+                          "x":[[1, 2, 3], [4, 5, 6], [7, 8]],
+                          "y":[[1, 2, 3], [4, 5, 6], [7, 8]] },
+                        { "id":"1", "t":[3], "x":[[9, 10]], "y":[[9, 10]] }]
+            }
+            """
+        w = WCONWorms.load(StringIO(WCON_string))
+        df = w.data_as_odict['1']
+
+        # Only the first aspect_size points of 'R' frames are reversed
+        x = df.loc[:, ('1', 'x')].values.tolist()
+        self.assertEqual(x[:3], [[3, 2, 1], [4, 5, 6], [8, 7, x[2][2]]])
+        self.assertTrue(x[2][2] != x[2][2])  # NaN
+        self.assertEqual(x[3][:2], [9, 10])
+        self.assertEqual(df.loc[:, ('1', 'y')].values.tolist()[0], [3, 2, 1])
+        self.assertEqual(df.loc[:2, ('1', 'head', 0)].tolist(),
+                         ['L', 'L', 'L'])
+        self.assertEqual(df.loc[:2, ('1', 'ventral', 0)].tolist(),
+                         ['CCW', 'CW', '?'])
+
+        # reverse_backwards_worms does the same to a DataFrame
+        rows = [[3, 'R', 'CCW', 1, 2, 3],
+                [2, 'L', 'CW', 4, 5, None],
+                [2, 'R', None, 7, 8, None]]
+        columns = [('1', 'aspect_size', 0), ('1', 'head', 0),
+                   ('1', 'ventral', 0), ('1', 'x', 0), ('1', 'x', 1),
+                   ('1', 'x', 2)]
+        df = pd.DataFrame(rows, index=pd.Index([0., 1., 2.], name='t'))
+        df.columns = pd.MultiIndex.from_tuples(
+            columns, names=['id', 'key', 'aspect'])
+        df = df.astype({c: float for c in columns
+                        if c[1] in ['aspect_size', 'x']})
+        df = df.astype({c: object for c in columns
+                        if c[1] in ['head', 'ventral']})
+        reverse_backwards_worms(df)
+        x = df.loc[:, ('1', 'x')].values.tolist()
+        self.assertEqual([x[0], x[1][:2], x[2][:2]],
+                         [[3, 2, 1], [4, 5], [8, 7]])
+        self.assertEqual(df.loc[:, ('1', 'head', 0)].tolist(),
+                         ['L', 'L', 'L'])
+        self.assertEqual(df.loc[:1, ('1', 'ventral', 0)].tolist(),
+                         ['CW', 'CW'])
+
     # @unittest.skip("DEBUG: to see if tests pass if we skip these")
     def test_data3(self):
         pass
@@ -8,7 +8,10 @@ https://github.com/openworm/tracker-commons
 
 
 from .wcon_parser import WCONWorms
+from .wcon_chunk_set import WCONChunkSet
+from .wcon_writer import WCONWriter
 from .measurement_unit import MeasurementUnit
 from .version import __version__
 
-__all__ = ['WCONWorms', 'MeasurementUnit', '__version__']
+__all__ = ['WCONWorms', 'WCONChunkSet', 'WCONWriter', 'MeasurementUnit',
+           '__version__']
@@ -0,0 +1,214 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+The JSON decoder and encoder used to load and save WCON text.
+
+The standard library's json module is always available.  If the optional
+orjson package is installed, it is used to decode instead.  WCON forbids
+duplicate keys, which orjson has no way to reject as it decodes, so its
+result is checked afterwards by counting keys in the raw text, rather
+than by calling back into Python for every object as the standard
+library must.  Anything the fast path can't vouch for is decoded again
+with the standard library, so the result and any error raised are the
+same whichever backend is used.
+
+Methods
+------------
+reject_duplicates
+loads
+dumps
+iterdumps
+
+"""
+import re
+import json
+import six
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# The backend used to decode WCON text: 'orjson' if it's installed,
+# otherwise 'json'.  Set this to 'json' to use only the standard library.
+backend = 'json' if orjson is None else 'orjson'
+
+# A key's closing quote, then whitespace, then its colon
+_QUOTE_SPACE_COLON = re.compile(r'"\s+:')
+
+# Data record elements that hold only numbers or strings in valid WCON, so
+# that their (possibly huge) contents needn't be searched for objects
+_PLAIN_ELEMENTS = frozenset(['id', 't', 'x', 'y', 'ox', 'oy', 'cx', 'cy',
+                             'px', 'py', 'ptail', 'head', 'ventral'])
+
+
+def reject_duplicates(ordered_pairs):
+    """Reject duplicate keys."""
+    unique_dict = {}
+    for key, val in ordered_pairs:
+        if key in unique_dict:
+            raise KeyError("Duplicate key: %r" % (key,))
+        else:
+            unique_dict[key] = val
+
+    return unique_dict
+
+
+def loads(serialized_data):
+    """
+    Decode a WCON JSON string into a nested dict.
+
+    Raises a KeyError if any object contains the same key twice.
+
+    """
+    if backend == 'orjson':
+        root = _loads_with_orjson(serialized_data)
+        if root is not None:
+            return root
+
+    return json.loads(serialized_data, object_pairs_hook=reject_duplicates)
+
+
+def dumps(obj, pretty_print=False):
+    """
+    Encode obj as JSON text, indented by 4 spaces if pretty_print.
+
+    json.dumps, unlike json.dump, can use the standard library's C encoder
+    when not pretty-printing.  The output is the same either way.
+
+    """
+    return json.dumps(obj, indent=4 if pretty_print else None)
+
+
+def iterdumps(obj, pretty_print=False, lazy_key='data'):
+    """
+    Encode the dict obj as JSON text, a piece at a time.
+
+    obj[lazy_key] may be any iterable, such as a generator.  Its elements
+    are encoded one at a time as the iterable produces them, so they need
+    never all be in memory at once.  The pieces joined together are the
+    same text dumps would give for obj with that iterable as a list.
+
+    """
+    item_separator = _item_separator(pretty_print)
+
+    def newline(level):
+        return _newline(level, pretty_print)
+
+    def encode(value, level):
+        return _encode(value, level, pretty_print)
+
+    if len(obj) == 0:
+        yield '{}'
+        return
+
+    yield '{'
+    for (i, (key, value)) in enumerate(obj.items()):
+        if i > 0:
+            yield item_separator
+        yield newline(1) + json.dumps(key) + ': '
+
+        if key != lazy_key:
+            yield encode(value, 1)
+            continue
+
+        is_empty = True
+        for element in value:
+            if is_empty:
+                yield '[' + newline(2)
+                is_empty = False
+            else:
+                yield item_separator + newline(2)
+            yield encode(element, 2)
+
+        yield '[]' if is_empty else newline(1) + ']'
+
+    yield newline(0) + '}'
+
+
+def _item_separator(pretty_print=False):
+    # json uses ', ' between items unless indenting in Python 3, where
+    # the line breaks make the space redundant
+    return ',' if (pretty_print and six.PY3) else ', '
+
+
+def _newline(level, pretty_print=False):
+    return '\n' + ' ' * (4 * level) if pretty_print else ''
+
+
+def _encode(value, level, pretty_print=False):
+    """
+    Encode value as dumps would at a depth of level within an object.
+
+    """
+    # Nested values are indented by their depth.  (Strings can't contain
+    # raw line breaks, so every one is indentation.)
+    if not pretty_print:
+        return dumps(value)
+    return dumps(value, pretty_print).replace('\n', _newline(level, True))
+
+
+def _loads_with_orjson(serialized_data):
+    """
+    Decode with orjson, then check the result for duplicate keys.
+
+    Every key in the text is a string followed by a colon, and every
+    object starts with a brace, so the text has at least as many of each
+    as the decoded objects do.  If there are exactly as many, no key was
+    duplicated.  Strings containing these characters only make the counts
+    in the text larger, so at worst the check fails without need.
+
+    Returns None if orjson rejects the text or the check fails.
+
+    """
+    try:
+        root = orjson.loads(serialized_data)
+    except orjson.JSONDecodeError:
+        return None
+
+    if isinstance(serialized_data, six.binary_type):
+        serialized_data = serialized_data.decode('utf-8')
+    num_keys = (serialized_data.count('":') +
+                len(_QUOTE_SPACE_COLON.findall(serialized_data)))
+    num_objects = serialized_data.count('{')
+
+    # The header's objects are few and small, so search all of them.  In
+    # the data records, search only the elements that may hold objects
+    # (e.g. walk, or custom features), not the arrays of numbers: if there
+    # were any objects inside those, the number of objects wouldn't match.
+    header = root
+    records = []
+    if isinstance(root, dict) and isinstance(root.get('data'), list):
+        header = dict(root)
+        header['data'] = None
+        records = [r for r in root['data'] if isinstance(r, dict)]
+    decoded_objects = list(_iter_objects(header))
+    for record in records:
+        decoded_objects.append(record)
+        for (key, value) in six.iteritems(record):
+            if key not in _PLAIN_ELEMENTS:
+                decoded_objects.extend(_iter_objects(value))
+
+    if (sum(len(obj) for obj in decoded_objects) != num_keys or
+            len(decoded_objects) != num_objects):
+        return None
+
+    return root
+
+
+def _iter_objects(value):
+    """
+    Iterate over all the dicts nested within value, including itself.
+
+    """
+    if isinstance(value, dict):
+        yield value
+        children = six.itervalues(value)
+    elif isinstance(value, list):
+        children = value
+    else:
+        return
+
+    for child in children:
+        for obj in _iter_objects(child):
+            yield obj
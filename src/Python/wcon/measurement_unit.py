@@ -9,9 +9,13 @@ Two classes:  (only the second of which is generally public-facing)
 - MeasurementUnit, which can handle the composite units as well
   e.g. mm^2, m/s, etc.
 
+  Every conversion to the canonical unit is affine:
+      canonical value = value * scale + offset
+  so it can be applied to a whole NumPy array in one multiply-add.
+
   Note that it cannot handle composite units involving Fahrenheit or Kelvin,
   since they require an affine transformation to the canonical unit expression
-  e.g. F^2, K/s will not have to_canon and from_canon attributes that
+  e.g. F^2, K/s will not have to_canon and from_canon methods that
   work properly.
 
   Single units involving Fahrenheit and Kelvin will work fine:
@@ -20,16 +24,14 @@ Two classes:  (only the second of which is generally public-facing)
 """
 import six
 import ast
+import threading
 import operator as op
-from scipy.constants import F2C, K2C, C2F, C2K, pi
-
+from collections import OrderedDict
+from scipy.constants import pi, zero_Celsius
 
-def C2C(x):
-    """
-    An identity function, to convert Celsius to Celsius
-
-    """
-    return x
+# The canonical units of the base dimensions, in the order of the
+# exponents in a unit's dimensions
+BASE_UNITS = ['mm', 's', 'r', 'C']
 
 
 class MeasurementUnitAtom():
@@ -78,6 +80,10 @@ class MeasurementUnitAtom():
         All available suffixes
     all_prefixes: list
         All available prefixes
+    scale, offset: float
+        to_canon(v) is v * scale + offset
+    dimensions: tuple of float
+        The exponent of each of the BASE_UNITS
 
     Methods
     ------------
@@ -132,19 +138,36 @@ class MeasurementUnitAtom():
     # Converting between temperature units requires an affine function rather
     # than just a linear (scalar) multiple in the case of the temporal,
     # spatial, and dimensionless units.  So here we store in the dictionary
-    # a duple of functions:
-    #    (to the canonical form, from the canonical form)
-    temperature_units = {'F': (F2C, C2F),
-                         'fahrenheit': (F2C, C2F),
-                         'K': (K2C, C2K),
-                         'kelvin': (K2C, C2K),
-                         'C': (C2C, C2C),
-                         'celsius': (C2C, C2C),
-                         'centigrade': (C2C, C2C)}
+    # a duple:
+    #    (scale, offset) such that Celsius = value * scale + offset
+    temperature_units = {'F': (1 / 1.8, -32 / 1.8),
+                         'fahrenheit': (1 / 1.8, -32 / 1.8),
+                         'K': (1, -zero_Celsius),
+                         'kelvin': (1, -zero_Celsius),
+                         'C': (1, 0),
+                         'celsius': (1, 0),
+                         'centigrade': (1, 0)}
 
     unit_types = {'m': 'spatial', 's': 'temporal', 'C': 'temperature',
                   '': 'dimensionless', 'r': 'angular'}
 
+    # Lookup tables built once, rather than on every parse
+    all_suffixes = (list(temporal_units.keys()) +
+                    list(spatial_units.keys()) +
+                    list(angular_units.keys()) +
+                    list(temperature_units.keys()) +
+                    list(dimensionless_units.keys()))
+    all_prefixes = list(SI_prefixes.keys())
+
+    # We can't have any ambiguous unit names or SI prefixes, so we
+    # confirm that there are no duplicate unit names
+    assert(len(all_suffixes) == len(set(all_suffixes)))
+    assert(len(all_prefixes) == len(set(all_prefixes)))
+
+    _suffix_set = frozenset(all_suffixes)
+    # Longest first, so the first match is the longest
+    _prefixes_by_length = sorted(SI_prefixes.keys(), key=len, reverse=True)
+
     def __init__(self, unit_string):
         """
         Canonical units:
@@ -166,8 +189,9 @@ class MeasurementUnitAtom():
             # This will just yield a d
             self.canonical_prefix = ''
             self.canonical_suffix = self.unit_string
-            self.to_canon = lambda x: x
-            self.from_canon = lambda x: x
+            self.scale = 1
+            self.offset = 0
+            self.dimensions = (0,) * len(BASE_UNITS)
 
         else:
             # Parse the string into a valid prefix and suffix
@@ -184,6 +208,24 @@ class MeasurementUnitAtom():
     def unit_type(self):
         return self.unit_types[self.canonical_suffix]
 
+    def to_canon(self, v):
+        """
+        Convert v, a number or NumPy array, to the canonical unit.
+
+        """
+        if self.offset == 0:
+            return v * self.scale
+        return v * self.scale + self.offset
+
+    def from_canon(self, v):
+        """
+        Convert v, a number or NumPy array, from the canonical unit.
+
+        """
+        if self.offset == 0:
+            return v / self.scale
+        return (v - self.offset) / self.scale
+
     def __repr__(self):
         """
         Pretty-print a nice summary of this unit.
@@ -219,95 +261,68 @@ class MeasurementUnitAtom():
 
     def _obtain_canonical_representation(self):
         """
-        Define the functions self.to_canon and self.from_canon, to convert
-        values back and forth between the canonical representation.
+        Find the affine conversion to the canonical representation, used
+        by self.to_canon and self.from_canon.
 
         Depending on the unit:
         If time, use 's' (seconds)
         If length, use 'mm' (millimetres)
+        If angle, use 'r' (radians)
         If temperature, use 'C' (celsius)
         If dimensionless, just convert the value to have no multiplier
             (e.g. if %, divide by 100)
-        If dimensionless, return the value again
-
-        Parameters
-        ------------
-        value: float
-            The value to be converted
 
         Returns
         ------------
         None.  But it creates the member attributes:
             canonical_prefix: str
             canonical_suffix: str
-            to_canon: function
-            from_canon: function
+            scale: float
+            offset: float
+            dimensions: tuple of float
 
         """
-
         # Now obtain the standard form of the prefix & suffix, and
-        # the conversion factor needed.
-        if self.suffix in list(self.temporal_units.keys()):
+        # the conversion needed.
+        offset = 0
+        if self.suffix in self.temporal_units:
             self.canonical_prefix = ''
             self.canonical_suffix = 's'
+            scale = self.temporal_units[self.suffix]
 
-            def to_canon_func(x):
-                return x * self.temporal_units[self.suffix]
-
-            def from_canon_func(x):
-                return x / self.temporal_units[self.suffix]
-
-        elif self.suffix in list(self.spatial_units.keys()):
+        elif self.suffix in self.spatial_units:
             self.canonical_prefix = 'm'
             self.canonical_suffix = 'm'
+            scale = self.spatial_units[self.suffix]
 
-            def to_canon_func(x):
-                return x * self.spatial_units[self.suffix]
-
-            def from_canon_func(x):
-                return x / self.spatial_units[self.suffix]
-
-        elif self.suffix in list(self.angular_units.keys()):
+        elif self.suffix in self.angular_units:
             self.canonical_prefix = ''
             self.canonical_suffix = 'r'
+            scale = self.angular_units[self.suffix]
 
-            def to_canon_func(x):
-                return x * self.angular_units[self.suffix]
-
-            def from_canon_func(x):
-                return x / self.angular_units[self.suffix]
-
-        elif self.suffix in list(self.temperature_units.keys()):
+        elif self.suffix in self.temperature_units:
             self.canonical_prefix = ''
             self.canonical_suffix = 'C'
-
-            def to_canon_func(x):
-                return self.temperature_units[self.suffix][0](x)
-
-            def from_canon_func(x):
-                return self.temperature_units[self.suffix][1](x)
+            scale, offset = self.temperature_units[self.suffix]
 
         else:
             # Dimensionless units (other than custom units)
             self.canonical_prefix = ''
             self.canonical_suffix = ''
-
-            def to_canon_func(x):
-                return x * self.dimensionless_units[self.suffix]
-
-            def from_canon_func(x):
-                return x / self.dimensionless_units[self.suffix]
+            scale = self.dimensionless_units[self.suffix]
 
         # Obtain the conversion it will take to make the units standard
         prefix_conversion_constant = \
             self._SI_prefix_conversion_constant(self.prefix,
                                                 self.canonical_prefix)
 
-        self.to_canon = \
-            lambda x: to_canon_func(x) * prefix_conversion_constant
+        # The prefix only scales the value; the offset is the suffix's own
+        self.scale = scale * prefix_conversion_constant
+        self.offset = offset
 
-        self.from_canon = \
-            lambda x: from_canon_func(x) / prefix_conversion_constant
+        canonical_unit_string = self.canonical_unit_string
+        self.dimensions = tuple(int(canonical_unit_string == base_unit)
+                                for base_unit in BASE_UNITS)
 
     def _parse_unit_string(self, unit_string):
         """
@@ -326,45 +341,27 @@ class MeasurementUnitAtom():
         (prefix, suffix): A duple of strings
 
         """
-        # We can't have any ambiguous unit names or SI prefixes, so first we
-        # confirm that there are no duplicate unit names
-        assert(len(self.all_suffixes) == len(set(self.all_suffixes)))
-        assert(len(self.all_prefixes) == len(set(self.all_prefixes)))
-
         # CASE 1: unit_string is just a suffix
-        if unit_string in self.all_suffixes:
+        if unit_string in self._suffix_set:
             # e.g. Careful to avoid ripping off the 'm' of 'metre'
             #      thinking it's the SI prefix milli, leaving us with
             #      a suffix of 'etre', which will not be found.
-            prefix = ''
-            suffix = unit_string
-        else:
-            # CASE 2: unit_string starts with an SI prefix
-            # We must have a prefix, otherwise the unit_string is invalid
-            candidate_prefixes = list(self.SI_prefixes.keys())
-            # This prefix will always be found so remove it from consideration
-            candidate_prefixes.remove('')
-            # We wish to find the LONGEST prefix at start of unit_string
-            longest_prefix_len = -1
-
-            for candidate_prefix in candidate_prefixes:
-                # If this prefix isn't at least longer than the current
-                # longest, there is no point in even considering it.
-                if len(candidate_prefix) <= longest_prefix_len:
-                    continue
-
-                # If we find the candidate prefix at the start of unit_string,
-                # this is our new prefix.
-                if unit_string.find(candidate_prefix) == 0:
-                    prefix = candidate_prefix
-                    suffix = unit_string[len(prefix):]
-                    longest_prefix_len = len(prefix)
-
-            # CASE 3: unit_string is invalid.
-            # (It not a valid suffix, nor does it start with a valid prefix)
-            if longest_prefix_len == -1 or suffix not in self.all_suffixes:
-                raise AssertionError("Error: '" + unit_string + "' is not a "
-                                     "valid unit")
+            return '', unit_string
+
+        # CASE 2: unit_string starts with an SI prefix
+        # We wish to find the LONGEST prefix at start of unit_string.
+        # (The prefix '' comes last, and always matches, but then
+        # unit_string would have been a suffix.)
+        for prefix in self._prefixes_by_length:
+            if unit_string.startswith(prefix):
+                break
+        suffix = unit_string[len(prefix):]
+
+        # CASE 3: unit_string is invalid.
+        # (It not a valid suffix, nor does it start with a valid prefix)
+        if prefix == '' or suffix not in self._suffix_set:
+            raise AssertionError("Error: '" + unit_string + "' is not a "
+                                 "valid unit")
 
         return prefix, suffix
 
@@ -383,28 +380,6 @@ class MeasurementUnitAtom():
 
         return self.SI_prefixes[from_prefix] / self.SI_prefixes[to_prefix]
 
-    @property
-    def all_suffixes(self):
-        try:
-            return self._all_suffixes
-        except AttributeError:
-            self._all_suffixes = (list(self.temporal_units.keys()) +
-                                  list(self.spatial_units.keys()) +
-                                  list(self.angular_units.keys()) +
-                                  list(self.temperature_units.keys()) +
-                                  list(self.dimensionless_units.keys()))
-
-            return self._all_suffixes
-
-    @property
-    def all_prefixes(self):
-        try:
-            return self._all_prefixes
-        except AttributeError:
-            self._all_prefixes = list(self.SI_prefixes.keys())
-
-            return self._all_prefixes
-
     @property
     def canonical_unit_string(self):
         """
@@ -450,11 +425,19 @@ class MeasurementUnit():
         The original string
     canonical_unit_string: str
         The canonical form for all units within the original string
+    scale, offset: float
+        The conversion to the canonical unit: to_canon(v) is
+        v * scale + offset, so it can be applied to whole arrays at once
+    dimensions: tuple of float
+        The exponent of each of the BASE_UNITS, e.g. (1, -1, 0, 0) for
+        'mm/s'
 
     Methods (public-facing)
     ------------
     create
-        The only public-facing factory method for this class
+        The only public-facing factory method for this class.  Units are
+        interned: creating the same unit string again returns the same
+        instance, which therefore can't be changed.
     to_canon
         transforms v from original units to canonical units
     from_canon
@@ -481,6 +464,12 @@ class MeasurementUnit():
                         op.pow: '**',
                         op.pos: '', op.neg: '-'}
 
+    # The units most recently returned by create, shared by the whole
+    # process, least recently used first
+    CACHE_SIZE = 1024
+    _cache = OrderedDict()
+    _cache_lock = threading.Lock()
+
     def __repr__(self):
         """
         Pretty-print a nice summary of this unit.
@@ -501,6 +490,21 @@ class MeasurementUnit():
 
         return repr_str
 
+    def __setattr__(self, name, value):
+        if self.__dict__.get('_frozen', False):
+            raise AttributeError("MeasurementUnit objects can't be changed, "
+                                 "since create shares them")
+        self.__dict__[name] = value
+
+    def __reduce__(self):
+        # Unpickle through create, so the unit is shared again
+        return (_create_unit, (self.__class__,
+                               getattr(self, '_create_string',
+                                       self.unit_string)))
+
+    def __hash__(self):
+        return hash((self.dimensions, self.scale, self.offset))
+
     @property
     def unit_string(self):
         # The convention is to use '^' for exponentiation, but in Python
@@ -519,20 +523,30 @@ class MeasurementUnit():
         """
         return self.create(self.canonical_unit_string)
 
+    def to_canon(self, v):
+        """
+        Convert v, a number or NumPy array, to the canonical unit.
+
+        """
+        if self.offset == 0:
+            return v * self.scale
+        return v * self.scale + self.offset
+
+    def from_canon(self, v):
+        """
+        Convert v, a number or NumPy array, from the canonical unit.
+
+        """
+        if self.offset == 0:
+            return v / self.scale
+        return (v - self.offset) / self.scale
+
     def __eq__(self, other):
-        # TODO: figure out if the units are measuring the same type of thing
-        #       i.e. time vs distance.  Right now this doesn't care about that
-
-        # Because the function might be nonlinear e.g. 'm**2', we should
-        # sample the function at two points to validate that they are the same
-        # this technically won't work for functions of odd degree but let's
-        # call that a known bug and leave it for now since the robust way
-        # of doing this check would require traversing the syntax tree again
-        # via ast and that seems complicated
-        return (
-            self.to_canon(10) == other.to_canon(10) and
-            self.to_canon(100) == other.to_canon(100)
-        )
+        # Units are the same if they measure the same type of thing
+        # (i.e. time vs distance), and convert to it in the same way
+        return (self.dimensions == other.dimensions and
+                self.scale == other.scale and
+                self.offset == other.offset)
 
     def __ne__(self, other):
         return not self.__eq__(other)
@@ -542,6 +556,10 @@ class MeasurementUnit():
         """
         The public-facing factory method for this class
 
+        The same instance is returned for the same unit_string, from a
+        cache of the CACHE_SIZE most recently used units, so that it is
+        only parsed once.  The instance can't be changed.
+
         unit_string: str
             The unit expression, e.g. 'mm^2' or 'cm/s' or 'C'
 
@@ -553,6 +571,31 @@ class MeasurementUnit():
         # Ensure that unit_string is str in Python 3 or unicode in Python 2.
         assert(isinstance(unit_string, six.text_type))
 
+        key = (cls, unit_string)
+        with cls._cache_lock:
+            u = cls._cache.pop(key, None)
+            if u is not None:
+                # Mark it as the most recently used
+                cls._cache[key] = u
+                return u
+
+        u = cls._parse(unit_string)
+        u._create_string = unit_string
+        u._frozen = True
+
+        with cls._cache_lock:
+            cls._cache[key] = u
+            while len(cls._cache) > cls.CACHE_SIZE:
+                cls._cache.popitem(last=False)
+
+        return u
+
+    @classmethod
+    def _parse(cls, unit_string):
+        """
+        Create a new MeasurementUnit from unit_string (see create).
+
+        """
         # ast can't handle parsing '', so just create the end product
         # ourselves
         if unit_string == '':
@@ -615,8 +658,9 @@ class MeasurementUnit():
 
         # Copy over the necessary attributes from our atomic (irreducible)
         # unit representation
-        u.to_canon = u_atom.to_canon
-        u.from_canon = u_atom.from_canon
+        u.scale = u_atom.scale
+        u.offset = u_atom.offset
+        u.dimensions = u_atom.dimensions
         u._unit_string = u_atom.unit_string
         u._canonical_unit_string = u_atom.canonical_unit_string
 
@@ -636,8 +680,9 @@ class MeasurementUnit():
             u = cls()
             u._unit_string = str(n)
             u._canonical_unit_string = '1'
-            u.to_canon = lambda x: x * n
-            u.from_canon = lambda x: x / n
+            u.scale = n
+            u.offset = 0
+            u.dimensions = (0,) * len(BASE_UNITS)
 
             return u
 
@@ -702,10 +747,21 @@ class MeasurementUnit():
 
         # NOTE: This won't work with affine functions.  We should probably
         # raise an Assertion if there is a temperature somewhere in the mix.
-        new_scalar = oper(l.to_canon(1), r.to_canon(1))
-
-        u.to_canon = lambda x: x * new_scalar
-        u.from_canon = lambda x: x / new_scalar
+        u.scale = oper(l.to_canon(1), r.to_canon(1))
+        u.offset = 0
+
+        if oper == op.mul:
+            u.dimensions = tuple(a + b for (a, b) in zip(l.dimensions,
+                                                         r.dimensions))
+        elif oper == op.truediv:
+            u.dimensions = tuple(a - b for (a, b) in zip(l.dimensions,
+                                                         r.dimensions))
+        elif oper == op.pow:
+            # e.g. 'mm^2'; the exponent should be a plain number
+            u.dimensions = tuple(a * r.scale for a in l.dimensions)
+        else:
+            # e.g. 'mm+mm'; the dimensions should be the same
+            u.dimensions = l.dimensions
 
         # Combine the left and right nodes together
         u._unit_string = l._unit_string + \
@@ -731,12 +787,15 @@ class MeasurementUnit():
 
         u = MeasurementUnit()
 
-        u.to_canon = lambda x: u.operators[oper](u.to_canon(x))
-        u.from_canon = lambda x: u.inverse_operators[oper](u.from_canon(x))
+        u.scale = oper(r.scale)
+        u.offset = oper(r.offset)
+        u.dimensions = r.dimensions
 
-        u._unit_string = u.operator_symbols[oper] + u._unit_string
+        u._unit_string = u.operator_symbols[oper] + r._unit_string
         u._canonical_unit_string = u.operator_symbols[
-            oper] + u._canonical_unit_string
+            oper] + r._canonical_unit_string
+
+        return u
 
     # Overloaded operators
     def __mul__(self, other):
@@ -763,3 +822,11 @@ class MeasurementUnit():
 
     def __neg__(self):
         return self.__class__._create_with_unary_operator(self, op.neg)
+
+
+def _create_unit(cls, unit_string):
+    """
+    Unpickle a unit of class cls (see MeasurementUnit.__reduce__).
+
+    """
+    return cls.create(unit_string)
@@ -0,0 +1,289 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+An on-disk cache of loaded WCON files, so repeated loads of the same file
+can skip parsing the JSON.
+
+Each cached file is stored as a "sidecar" folder holding one NumPy .npy
+array per worm, which is memory-mapped when read back, plus a small JSON
+header with the units, metadata, files object and DataFrame layout.
+
+Classes
+------------
+SidecarCache
+
+"""
+import os
+import six
+import json
+import shutil
+import hashlib
+import tempfile
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
+
+from .version import __version__
+from .measurement_unit import MeasurementUnit
+
+# Bump this if the layout of the sidecar files changes
+CACHE_FORMAT = 1
+
+# The validation levels, from least to most thorough
+# (see wcon_validation.SchemaValidator)
+VALIDATION_ORDER = [False, 'header', 'sampled', 'structural', 'full']
+
+
+def default_cache_dir():
+    """
+    The folder named by the WCON_CACHE_DIR environment variable, or else
+    ~/.cache/wcon
+
+    """
+    cache_dir = os.environ.get('WCON_CACHE_DIR')
+    if cache_dir:
+        return cache_dir
+
+    return os.path.join(os.path.expanduser('~'), '.cache', 'wcon')
+
+
+class SidecarCache():
+    """
+    A size-bounded cache of loaded WCON files.
+
+    An entry is keyed by the absolute path, size and modification time of
+    the source file, the options it was loaded with, and the version of
+    this library, so it is invalidated whenever any of those change.
+    Optionally a SHA-1 hash of the file's contents is part of the key too,
+    for file systems whose modification times can't be trusted.
+
+    When the cache grows beyond max_bytes, the least recently used
+    entries are evicted.
+
+    Usage
+    -------------
+    cache = SidecarCache()
+    w = WCONWorms.load_from_file('file.wcon', cache=cache)
+
+    """
+    DEFAULT_MAX_BYTES = 2 ** 30
+
+    def __init__(self, cache_dir=None, max_bytes=None, use_hash=False):
+        """
+        Parameters
+        -------------
+        cache_dir: str
+            The folder to keep the sidecars in.  Defaults to
+            default_cache_dir().
+        max_bytes: int
+            The most disk space the sidecars may take up together.
+        use_hash: bool
+            If True, include a hash of each file's contents in its key.
+
+        """
+        self.cache_dir = default_cache_dir() if cache_dir is None \
+            else cache_dir
+        self.max_bytes = self.DEFAULT_MAX_BYTES if max_bytes is None \
+            else max_bytes
+        self.use_hash = use_hash
+
+    def entry_path(self, JSON_path, load_options):
+        """
+        The folder for the sidecar of JSON_path, loaded with load_options,
+        a dict of whichever load_from_file arguments affect the result.
+
+        """
+        JSON_path = os.path.abspath(JSON_path)
+        stat = os.stat(JSON_path)
+
+        key = OrderedDict([('path', JSON_path),
+                           ('size', stat.st_size),
+                           ('mtime', repr(stat.st_mtime)),
+                           ('options', repr(sorted(load_options.items()))),
+                           ('version', __version__),
+                           ('format', CACHE_FORMAT)])
+
+        if self.use_hash:
+            content_hash = hashlib.sha1()
+            with open(JSON_path, 'rb') as f:
+                for block in iter(lambda: f.read(2 ** 20), b''):
+                    content_hash.update(block)
+            key['sha1'] = content_hash.hexdigest()
+
+        name = hashlib.sha1(json.dumps(key).encode('utf-8')).hexdigest()
+
+        return os.path.join(self.cache_dir, name)
+
+    def get(self, cls, JSON_path, load_options, validate_against_schema):
+        """
+        Return the cached WCONWorms (of class cls) for JSON_path, or None
+        if there is no valid entry for it.
+
+        An entry is only used if it was validated at least as thoroughly
+        as validate_against_schema asks for.
+
+        """
+        entry_path = self.entry_path(JSON_path, load_options)
+        header_path = os.path.join(entry_path, 'header.json')
+
+        try:
+            with open(header_path, 'r') as f:
+                header = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+
+        if (_validation_rank(header['validated']) <
+                _validation_rank(validate_against_schema)):
+            return None
+
+        try:
+            w = _from_sidecar(cls, header, entry_path)
+        except (IOError, OSError, ValueError, KeyError):
+            return None
+
+        # Mark the entry as recently used
+        os.utime(header_path, None)
+
+        return w
+
+    def put(self, w, JSON_path, load_options, validate_against_schema):
+        """
+        Store the WCONWorms w, loaded from JSON_path, in the cache, then
+        evict old entries if the cache has grown too large.
+
+        """
+        entry_path = self.entry_path(JSON_path, load_options)
+
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir)
+
+        # Write to a temporary folder first, so other processes never
+        # see a partly written entry
+        temp_path = tempfile.mkdtemp(dir=self.cache_dir, prefix='.tmp')
+        try:
+            _to_sidecar(w, temp_path, validate_against_schema)
+            if os.path.exists(entry_path):
+                shutil.rmtree(entry_path, ignore_errors=True)
+            os.rename(temp_path, entry_path)
+        except (IOError, OSError):
+            # Another process may have just written the same entry
+            shutil.rmtree(temp_path, ignore_errors=True)
+            return
+
+        self.evict()
+
+    def evict(self):
+        """
+        Delete the least recently used entries until the cache takes up
+        no more than max_bytes.
+
+        """
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            entry_path = os.path.join(self.cache_dir, name)
+            header_path = os.path.join(entry_path, 'header.json')
+            if name.startswith('.') or not os.path.exists(header_path):
+                continue
+            size = sum(os.path.getsize(os.path.join(entry_path, f))
+                       for f in os.listdir(entry_path))
+            entries.append((os.path.getmtime(header_path), size, entry_path))
+
+        total_size = sum(size for (_, size, _) in entries)
+        for (_, size, entry_path) in sorted(entries):
+            if total_size <= self.max_bytes:
+                break
+            shutil.rmtree(entry_path, ignore_errors=True)
+            total_size -= size
+
+    def clear(self):
+        """
+        Delete every entry in the cache.
+
+        """
+        if os.path.exists(self.cache_dir):
+            shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+
+def _validation_rank(level):
+    if not isinstance(level, six.string_types):
+        level = 'full' if level else False
+    return VALIDATION_ORDER.index(level)
+
+
+def _to_sidecar(w, entry_path, validate_against_schema):
+    """
+    Write the WCONWorms w to the folder entry_path.
+
+    The float columns of each worm's DataFrame are saved as one 2-D
+    array, alongside its time index; the object columns (head and
+    ventral) are few and short, so they go in the header.
+
+    """
+    worms = []
+    for (i, (worm_id, df)) in enumerate(w.data_as_odict.items()):
+        worm = {'id': worm_id, 'columns': [list(c) for c in df.columns],
+                'object_columns': {}}
+
+        is_float = (df.dtypes == float).values
+        float_values = df.loc[:, is_float].values
+        np.save(os.path.join(entry_path, '%i.npy' % i),
+                np.column_stack([df.index.values, float_values]))
+
+        for j in np.flatnonzero(~is_float):
+            values = df.iloc[:, j].values
+            worm['object_columns'][str(j)] = \
+                [None if pd.isnull(v) else v for v in values]
+
+        worms.append(worm)
+
+    header = {'units': OrderedDict((k, u.unit_string)
+                                   for (k, u) in w.units.items()),
+              'metadata': w.metadata,
+              'files': getattr(w, 'files', None),
+              'worms': worms,
+              'validated': VALIDATION_ORDER[
+                  _validation_rank(validate_against_schema)]}
+
+    with open(os.path.join(entry_path, 'header.json'), 'w') as f:
+        json.dump(header, f)
+
+
+def _from_sidecar(cls, header, entry_path):
+    """
+    Rebuild a WCONWorms of class cls from the sidecar in entry_path.
+
+    """
+    w = cls()
+    w.units = OrderedDict((k, MeasurementUnit.create(v))
+                          for (k, v) in header['units'].items())
+    w.metadata = header['metadata']
+    w.files = header['files']
+
+    w._data = OrderedDict()
+    for (i, worm) in enumerate(header['worms']):
+        # Copy-on-write, so the DataFrame can be modified without
+        # changing the file
+        values = np.load(os.path.join(entry_path, '%i.npy' % i),
+                         mmap_mode='c')
+        index = pd.Index(values[:, 0], name='t')
+
+        # Build the float columns from the mapped block in one piece, so
+        # pandas keeps a view of it rather than copying each column
+        object_columns = sorted(int(j) for j in worm['object_columns'])
+        float_columns = [j for j in range(len(worm['columns']))
+                         if j not in object_columns]
+        df = pd.DataFrame(values[:, 1:], index=index,
+                          columns=float_columns, copy=False)
+
+        for j in object_columns:
+            column = np.array(worm['object_columns'][str(j)], dtype=object)
+            column[pd.isnull(column)] = np.nan
+            df.insert(j, j, pd.Series(column, index=index, dtype=object))
+
+        df.columns = pd.MultiIndex.from_tuples(
+            [tuple(c) for c in worm['columns']],
+            names=['id', 'key', 'aspect'])
+
+        w._data[worm['id']] = df
+
+    return w
@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Lazy access to a set of WCON chunks, linked together by their "files"
+objects, for recordings too long to hold in memory all at once.
+
+Classes
+------------
+WCONChunkSet
+
+"""
+import six
+from collections import OrderedDict
+
+from .wcon_parser import WCONWorms, _follow_chunk_links
+from .wcon_data import sort_odict
+
+
+class WCONChunkSet():
+    """
+    A set of linked WCON chunks, of which only those needed are loaded.
+
+    When the set is opened, each chunk is only probed (see
+    WCONWorms.probe) to record which worms it contains, and over what
+    times.  Asking for a worm or a time window then loads only the
+    chunks that overlap it.  Loaded chunks are kept in a least recently
+    used cache, which is kept within a memory budget.
+
+    All times are in canonical units (seconds), since the chunks need not
+    all use the same units.
+
+    Usage
+    -------------
+    chunk_set = WCONChunkSet('filename_0.wcon', max_bytes=2 ** 28)
+    w = chunk_set.load(worm_ids=['1'], t_range=(3600, 7200))
+
+    """
+    DEFAULT_MAX_BYTES = 2 ** 30
+
+    def __init__(self, JSON_path, max_bytes=None,
+                 validate_against_schema=True):
+        """
+        Parameters
+        -------------
+        JSON_path: str
+            The path of any one of the chunks
+        max_bytes: int
+            The most memory the loaded chunks may take up together.  The
+            chunks needed for a single load are always kept, even if they
+            exceed it.
+        validate_against_schema: bool or str
+            The validation level chunks are loaded with
+            (see WCONWorms.load_from_file)
+
+        """
+        self.max_bytes = self.DEFAULT_MAX_BYTES if max_bytes is None \
+            else max_bytes
+        self.validate_against_schema = validate_against_schema
+
+        current = WCONWorms.probe(JSON_path)
+        if current['files'] is None:
+            chunks = [(JSON_path, current)]
+        else:
+            chunks = _follow_chunk_links(
+                JSON_path, current, lambda p: p['files'],
+                lambda JSON_paths: [WCONWorms.probe(p) for p in JSON_paths])
+
+        self.paths = [JSON_path for (JSON_path, _) in chunks]
+        self.metadata = current['metadata']
+        self.units = OrderedDict((k, mu.canonical_unit)
+                                 for (k, mu) in current['units'].items())
+
+        # The canonical time range of each worm, in each chunk.  Worms
+        # with no time points in a chunk have no data there, so are left
+        # out.
+        self.t_ranges = []
+        for (_, probe) in chunks:
+            t_unit = probe['units']['t']
+            self.t_ranges.append(OrderedDict(
+                (worm_id, (t_unit.to_canon(t_range[0]),
+                           t_unit.to_canon(t_range[1])))
+                for (worm_id, t_range) in probe['t_range'].items()
+                if t_range is not None))
+
+        self._loaded = OrderedDict()
+        self._loaded_bytes = OrderedDict()
+
+    @property
+    def num_chunks(self):
+        return len(self.paths)
+
+    @property
+    def worm_ids(self):
+        try:
+            return self._worm_ids
+        except AttributeError:
+            worm_ids = OrderedDict()
+            for t_range in self.t_ranges:
+                worm_ids.update((worm_id, None) for worm_id in t_range)
+            self._worm_ids = list(sort_odict(worm_ids).keys())
+            return self._worm_ids
+
+    @property
+    def t_range(self):
+        """
+        The canonical time range of each worm over all the chunks, as an
+        OrderedDict of (float, float), keyed by worm id.
+
+        """
+        t_range = OrderedDict((worm_id, (float('inf'), float('-inf')))
+                              for worm_id in self.worm_ids)
+        for chunk_t_range in self.t_ranges:
+            for (worm_id, (t_min, t_max)) in chunk_t_range.items():
+                t_range[worm_id] = (min(t_range[worm_id][0], t_min),
+                                    max(t_range[worm_id][1], t_max))
+
+        return t_range
+
+    @property
+    def loaded_bytes(self):
+        """
+        The memory taken up by the chunks currently loaded.
+
+        """
+        return sum(self._loaded_bytes.values())
+
+    def overlapping_chunks(self, worm_ids=None, t_range=None):
+        """
+        The indices of the chunks with data for any of worm_ids (all
+        worms, if None) within t_range (all times, if None).
+
+        """
+        t_min, t_max = _bounds(t_range)
+
+        return [i for (i, chunk_t_range) in enumerate(self.t_ranges)
+                if any(chunk_t_range[worm_id][0] <= t_max and
+                       chunk_t_range[worm_id][1] >= t_min
+                       for worm_id in chunk_t_range
+                       if worm_ids is None or worm_id in worm_ids)]
+
+    def load(self, worm_ids=None, t_range=None):
+        """
+        Return a WCONWorms with the data of the worms worm_ids (all
+        worms, if None) within t_range (all times, if None), in
+        canonical units.
+
+        Parameters
+        -------------
+        worm_ids: list of str
+        t_range: (float, float)
+            A canonical time range; either bound may be None.  The
+            range is inclusive.
+
+        """
+        if isinstance(worm_ids, six.string_types):
+            worm_ids = [worm_ids]
+        t_min, t_max = _bounds(t_range)
+
+        chunk_indices = self.overlapping_chunks(worm_ids, t_range)
+
+        pieces = []
+        for i in chunk_indices:
+            w_chunk = self._chunk(i, keep=chunk_indices)
+
+            w = WCONWorms()
+            w.units = w_chunk.units
+            w.metadata = w_chunk.metadata
+            w._data = OrderedDict()
+            for (worm_id, df) in w_chunk.data_as_odict.items():
+                if worm_ids is None or worm_id in worm_ids:
+                    df = df.loc[t_min:t_max]
+                    if len(df) > 0:
+                        w._data[worm_id] = df
+            pieces.append(w)
+
+        if len(pieces) == 0:
+            w = WCONWorms()
+            w.units = self.units
+            w.metadata = self.metadata
+            w._data = OrderedDict()
+            return w
+
+        return WCONWorms.merge_many(pieces)
+
+    def _chunk(self, i, keep=()):
+        """
+        Return chunk i, in canonical units, loading it if necessary.
+
+        Then evict the least recently used chunks, other than those in
+        keep, until the loaded chunks fit in max_bytes.
+
+        """
+        try:
+            w = self._loaded.pop(i)
+        except KeyError:
+            w = WCONWorms.load_from_file(
+                self.paths[i], load_prev_chunks=False,
+                load_next_chunks=False,
+                validate_against_schema=self.validate_against_schema)
+            w = w.to_canon
+            # Convert every worm now, so no source DataFrames are kept
+            # alive beyond those counted below
+            w._data = OrderedDict((worm_id, w._data[worm_id])
+                                  for worm_id in w.worm_ids)
+            self._loaded_bytes[i] = sum(
+                df.memory_usage(deep=True).sum()
+                for df in w.data_as_odict.values())
+
+        # Mark it as the most recently used
+        self._loaded[i] = w
+
+        for j in list(self._loaded.keys()):
+            if self.loaded_bytes <= self.max_bytes:
+                break
+            if j != i and j not in keep:
+                del self._loaded[j]
+                del self._loaded_bytes[j]
+
+        return w
+
+
+def _bounds(t_range):
+    """
+    Replace any None bounds of t_range with infinities.
+
+    """
+    t_min, t_max = (None, None) if t_range is None else t_range
+
+    return (float('-inf') if t_min is None else t_min,
+            float('inf') if t_max is None else t_max)
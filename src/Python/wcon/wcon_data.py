@@ -7,14 +7,9 @@ array.
 """
 import six
 import gc
-import os
-import warnings
 import numpy as np
 import pandas as pd
 import itertools
-from multiprocessing import Queue, Process
-import multiprocessing
-import psutil
 import time
 if six.PY3:
     from functools import reduce
@@ -28,9 +23,9 @@ idx = pd.IndexSlice
 elements_with_aspect = ['x', 'y']
 elements_without_aspect = ['ox', 'oy', 'cx', 'cy', 'head', 'ventral']
 basic_data_keys = elements_with_aspect + elements_without_aspect
+# The elements whose values are all numbers (or null)
+numeric_elements = elements_with_aspect + ['ox', 'oy', 'cx', 'cy']
 supported_data_keys = basic_data_keys + ['id', 't']
-MIN_FRAMES_FOR_MULTIPROCESSING = 3000  # This is somewhat arbitrary
-USE_MULTIPROCESSING = False    # If False, multiprocessing is never used
 
 
 def get_mask(arr, desired_key):
@@ -74,73 +69,159 @@ def df_upsert(src, dest):
         In this last case if any of the revisions are changes, error.
         If not, do not insert any duplicate rows, but any new rows, UNION.
 
+    This is df_merge_many([dest, src]), so the two always agree.
+
     Parameters
     -----------
     src, dest: pandas DataFrames
         src is the one to be added to dest
-        dest is the one that is modified in place
-
-    # TODO: concatenate using a list comprehension as calling it
-    # iteratively like this causes a performance hit (see
-    # http://pandas.pydata.org/pandas-docs/stable/merging.html#concatenating-objects
-    # "Note It is worth noting however, that concat (and therefore append)
-    # makes a full copy of the data, and that constantly reusing this
-    # function can create a signifcant performance hit. If you need
-    # to use the operation over several datasets, use a list comprehension."
-
-    """
-    # Add all columns for worms that don't currently exist in dest
-    # but have entries on the same timeframes
-    if not any(src.columns.isin(dest.columns)):
-        # Scenario 1: src is a new worm.  So OUTER JOIN
-        dest = pd.merge(dest, src, left_index=True,
-                        right_index=True, how='outer')
-    else:
-        # Scenario 2: src is worm already in dest.
+        dest is left unchanged; a new DataFrame is returned
 
-        # Handle the timepoints NOT shared with dest
-        if any(~src.index.isin(dest.index)):
-            # Add all rows that don't currently exist in dest
-            dest = pd.concat([dest, src[~src.index.isin(dest.index)]], axis=0)
+    """
+    return df_merge_many([dest, src])
 
-        # Handle the timepoints are shared with dest
-        if any(src.index.isin(dest.index)):
-            # Obtain a sliced version of dest, showing only
-            # the columns and rows shared with the src
-            dest_sliced = \
-                dest.loc[dest.index.isin(src.index),
-                         dest.columns.isin(src.columns)]
 
-            src_sliced = \
-                src.loc[src.index.isin(dest.index),
-                        src.columns.isin(dest.columns)]
+def df_merge_many(dfs):
+    """
+    Merge a list of DataFrames for the same worm, in order, with one
+    concatenation and one sort rather than one of each per DataFrame.
+    This is the engine behind every merge: WCONWorms.merge, merge_many,
+    update and df_upsert.
+
+    The result has the union of the DataFrames' columns, so a column
+    only a later DataFrame has is kept, even at times an earlier one
+    also has.
+
+    Timeframes found in more than one DataFrame are merged, and an
+    AssertionError is raised if they conflict.  For each value, the
+    earlier DataFrame's value is compared with the later one's, if the
+    later DataFrame has that column:
+    NaN NaN = fine
+    NaN 2   = fine, 2 is kept
+    2   2   = fine
+    2   3   = conflict
+    2   NaN = conflict
 
-            # Sort our slices so they will be lined up for comparison
-            dest_sliced.sort_index(inplace=True)
-            src_sliced.sort_index(inplace=True)
+    Parameters
+    -----------
+    dfs: list of pandas DataFrames
+        Each with t as index and (id, key, aspect) columns
 
-            # Obtain a mask of the conflicts in the current segment
-            # as compared with all previously loaded data.  That is:
-            # NaN NaN = False
-            # NaN 2   = False
-            # 2   2   = False
-            # 2   3   = True
-            # 2   NaN = True
-            data_conflicts = (pd.notnull(dest_sliced) &
-                              (dest_sliced != src_sliced))
+    Returns
+    -----------
+    pandas DataFrame
+        Sorted by time, with its columns sorted too
+
+    """
+    columns = dfs[0].columns
+    for df in dfs[1:]:
+        if not df.columns.equals(columns):
+            columns = columns.union(df.columns)
 
-            if data_conflicts.any().any():
-                raise AssertionError("Data from this segment conflicted "
-                                     "with previously loaded data:\n",
-                                     data_conflicts)
+    merged = pd.concat([df if df.columns.equals(columns) else
+                        df.reindex(columns=columns) for df in dfs], axis=0)
 
-            # Replace any rows that do exist with the src version
-            dest.update(src_sliced)
+    if merged.index.is_monotonic_increasing:
+        # e.g. consecutive chunks, which need no sorting
+        order = np.arange(len(merged))
+    else:
+        # A stable sort keeps duplicated timeframes in the order of dfs
+        order = np.argsort(merged.index.values, kind='mergesort')
+        merged = merged.take(order)
+
+    t = merged.index.values
+    is_duplicate = np.zeros(len(t), dtype=bool)
+    is_duplicate[1:] = t[1:] == t[:-1]
+
+    if not is_duplicate.any():
+        return merged
+
+    # Only the rows of duplicated timeframes need to be compared.  Each
+    # group of rows with the same time is merged into its first row.
+    in_group = is_duplicate.copy()
+    in_group[:-1] |= is_duplicate[1:]
+    rows = np.flatnonzero(in_group)
+    group_starts = np.flatnonzero(~is_duplicate[rows])
+    group = np.cumsum(~is_duplicate[rows]) - 1
+
+    # Whether the DataFrame each row came from has each column
+    piece = np.repeat(np.arange(len(dfs)), [len(df) for df in dfs])[order]
+    present = np.array([columns.isin(df.columns) for df in dfs])[piece[rows]]
+
+    is_float = np.array([dtype.kind == 'f' for dtype in merged.dtypes],
+                        dtype=bool)
+    merged_values = []
+    for columns_j in [np.flatnonzero(is_float), np.flatnonzero(~is_float)]:
+        if len(columns_j) == 0:
+            continue
+        values = merged.iloc[rows, columns_j].values.astype(
+            float if is_float[columns_j[0]] else object)
+        merged_values.append((columns_j,
+                              _merge_groups(values, present[:, columns_j],
+                                            group, group_starts, t[rows],
+                                            columns[0][0])))
 
-    # Sort the time series indices
-    dest.sort_index(axis=0, inplace=True)
+    # Write the merged rows back over the first row of each timeframe
+    positions = np.cumsum(~is_duplicate)[rows[group_starts]] - 1
+    merged = merged[~is_duplicate]
+    for (columns_j, values) in merged_values:
+        for (k, j) in enumerate(columns_j):
+            merged.iloc[positions, j] = \
+                values[:, k].astype(merged.dtypes.iloc[j])
 
-    return dest
+    return merged
+
+
+def _merge_groups(values, present, group, group_starts, t, worm_id):
+    """
+    Merge groups of rows of values, for df_merge_many, checking for
+    conflicts all at once.
+
+    Within each group, the first value present and not null is kept.  Any
+    value present in a later row must equal it.
+
+    Parameters
+    -----------
+    values: 2D NumPy array
+        The rows, sorted by group
+    present: 2D NumPy array of bool
+        Whether each row's DataFrame had each column
+    group: NumPy array of int
+        The group of each row
+    group_starts: NumPy array of int
+        The first row of each group
+    t: NumPy array
+        The time of each row, for the error message
+    worm_id: str
+        For the error message
+
+    Returns
+    -----------
+    2D NumPy array
+        The merged row of each group
+
+    """
+    notnull = present & pd.notnull(values)
+
+    # The first row of each group with a value in each column, if any
+    row = np.arange(len(values))[:, np.newaxis]
+    first = np.minimum.reduceat(np.where(notnull, row, len(values)),
+                                group_starts, axis=0)
+    has_value = first < len(values)
+    # A value present after the kept one must be equal, even if null
+    after_first = row > first[group]
+    first = np.where(has_value, first, group_starts[:, np.newaxis])
+    kept = np.take_along_axis(values, first, axis=0)
+    conflicts = present & after_first & ~(values == kept[group])
+    if conflicts.any():
+        i = np.flatnonzero(conflicts.any(axis=1))[0]
+        raise AssertionError("Data from this segment conflicted with "
+                             "previously loaded data, for worm %s at "
+                             "time %s" % (str(worm_id), str(t[i])))
+
+    if values.dtype.kind == 'f':
+        return np.where(has_value, kept, np.nan)
+    return np.where(has_value, kept, None)
 
 
 def convert_origin(df):
@@ -173,74 +254,103 @@ def convert_origin(df):
     ------------
     None.  Modifies `df` in place.
 
+    Note that the DataFrames built when loading WCON have already had
+    this done to them, more cheaply, before they were built.
+
     """
     offset_keys = ['ox', 'oy']
     centroid_keys = ['cx', 'cy']
     coord_keys = ['x', 'y']
 
-    for worm_id in df.columns.get_level_values(0).unique():
-        cur_worm = df.loc[:, (worm_id)]
+    keys = df.columns.get_level_values('key')
+    worm_ids = df.columns.get_level_values('id')
 
-        for offset, centroid, coord in zip(offset_keys,
-                                           centroid_keys, coord_keys):
-
-            # Note: This code block uses `x` as the stylized example for
-            # variable naming purposes, but be assured that the enclosing
-            # `for` loop loops through both `x` and `y`.
-
-            if offset in cur_worm.columns.get_level_values(0):
-                # Consider offset as 0 if not available in a certain frame
-                ox_column = cur_worm.loc[:, (offset)].fillna(0)
-
-                # Shift our 'x' values by offset
-                all_x_columns = cur_worm.loc[:, (coord)]
-                ox_affine_change = (np.array(ox_column) *
-                                    np.ones(all_x_columns.shape))
-                all_x_columns += ox_affine_change
+    if not keys.isin(offset_keys).any():
+        return
 
-                if centroid in cur_worm.columns.get_level_values(0):
-                    cx_column = cur_worm.loc[:, (centroid)]
-                    # Shift the centroid by the offset
-                    cx_column += ox_column
+    # Rather than loop over worms, each worm's 'x' columns are matched up
+    # with its 'ox' column (and its 'cx' column) by position, so each
+    # block of coordinates is shifted by a single NumPy operation.
+    for offset, centroid, coord in zip(offset_keys,
+                                       centroid_keys, coord_keys):
 
-                    # Now make the centroid our new offset, since the rule
-                    # is that if the offset exists, the centroid is not
-                    # the offset, but we want it to be.
-                    cx_affine_change = (np.array(cx_column) *
-                                        np.ones(all_x_columns.shape))
-                    all_x_columns -= cx_affine_change
+        # Note: This code block uses `x` as the stylized example for
+        # variable naming purposes, but be assured that the enclosing
+        # `for` loop loops through both `x` and `y`.
 
-                    # Now assign these values back to the passed dataframe df
-                    df.loc[:, (worm_id, centroid)] = cx_column.values
+        offset_positions = np.flatnonzero(keys == offset)
+        if len(offset_positions) == 0:
+            continue
 
-                # Now assign these values back to the passed dataframe df
-                df.loc[:, (worm_id, coord)] = all_x_columns.values
+        # Consider offset as 0 if not available in a certain frame
+        ox = np.array(df.iloc[:, offset_positions], dtype=float)
+        ox[np.isnan(ox)] = 0
+
+        # For each column, the index in ox of its worm's offset, or -1
+        offset_of_column = pd.Index(
+            worm_ids[offset_positions]).get_indexer(worm_ids)
+
+        # Shift our 'x' values by offset
+        x_positions = np.flatnonzero((keys == coord) &
+                                     (offset_of_column >= 0))
+        all_x = np.array(df.iloc[:, x_positions], dtype=float)
+        all_x += _columns_of(ox, offset_of_column[x_positions])
+
+        centroid_positions = np.flatnonzero((keys == centroid) &
+                                            (offset_of_column >= 0))
+        if len(centroid_positions) > 0:
+            # Shift the centroid by the offset
+            cx = np.array(df.iloc[:, centroid_positions], dtype=float)
+            cx += _columns_of(ox, offset_of_column[centroid_positions])
+            df.iloc[:, centroid_positions] = cx
+
+            # Now make the centroid our new offset, since the rule
+            # is that if the offset exists, the centroid is not
+            # the offset, but we want it to be.
+            centroid_of_x = pd.Index(
+                worm_ids[centroid_positions]).get_indexer(
+                    worm_ids[x_positions])
+            has_centroid = centroid_of_x >= 0
+            if has_centroid.all():
+                all_x -= _columns_of(cx, centroid_of_x)
+            else:
+                all_x[:, has_centroid] -= \
+                    _columns_of(cx, centroid_of_x[has_centroid])
 
-                # Now reset our 'ox' values to zero.
-                if offset in cur_worm.columns.get_level_values(0):
-                    df.loc[:, (worm_id, offset)] = np.zeros(ox_column.shape)
+        # Now assign these values back to the passed dataframe df
+        df.iloc[:, x_positions] = all_x
 
     # Drop the offset columns entirely from the dataframe.
     # This is so DataFrames with and without offsets
     # will show as comparing identically.
-    for offset_key in offset_keys:
-        df.drop(offset_key, axis=1, level='key', inplace=True)
+    df.drop(columns=df.columns[keys.isin(offset_keys)], inplace=True)
 
     # Because of a known issue in Pandas
     # (https://github.com/pydata/pandas/issues/2770), the dropped columns
     # remain in the "levels" attribute of MultiIndex, even if they don't
     # appear in the "labels" and are thus not 'observed'.
-    # The workaround is to reconstitute the MultiIndex from tuples:
-    df.columns = pd.MultiIndex.from_tuples(df.columns.values,
-                                           names=df.columns.names)
+    df.columns = df.columns.remove_unused_levels()
+
+
+def _columns_of(values, indices):
+    """
+    The columns indices of the 2-D array values, as an array that
+    broadcasts against them.  For a single column, no copy is made.
+
+    """
+    if values.shape[1] == 1:
+        return values
+    return values[:, indices]
 
 
 def reverse_backwards_worms(df, coord_keys=['x', 'y']):
     """
     Reverse all worms in all time frames with head == 'R':
 
-    - Reverse the coordinates
+    - Reverse the coordinates, i.e. the first aspect_size of them
     - Change head to 'L'
+    - Swap ventral 'CW' and 'CCW', since they are relative to the
+      first point
 
     Parameters
     ------------
@@ -252,562 +362,814 @@ def reverse_backwards_worms(df, coord_keys=['x', 'y']):
     ------------
     None.  Modifies `df` in place.
 
-    """
-    # TODO: this method is not fully implemented
-    return
+    Note that the DataFrames built when loading WCON have already had
+    this done to them, more cheaply, before they were built.
 
-    if 'head' not in df.columns.get_level_values(level='key'):
-        return
-
-    mask_of_times_to_reverse = df.loc[:, idx[:, 'head', :]] == 'R'
-
-    for worm_id in df.columns.get_level_values(level='id').unique():
-        cur_worm = df.loc[:, idx[worm_id, :, :]]
-        cur_keys = cur_worm.columns.get_level_values(level='key')
-
-        if 'head' not in cur_keys:
-            # Nothing to do
+    """
+    keys = df.columns.get_level_values('key')
+    worm_ids = df.columns.get_level_values('id')
+
+    for worm_id in worm_ids[keys == 'head'].unique():
+        is_worm = worm_ids == worm_id
+        head_position = np.flatnonzero(is_worm & (keys == 'head'))[0]
+        rows = np.flatnonzero(df.iloc[:, head_position].values == 'R')
+        if len(rows) == 0:
             continue
 
-        cur_mask = mask_of_times_to_reverse.loc[:, idx[worm_id, 'head', 0]]
+        aspect_size = df.iloc[rows, np.flatnonzero(
+            is_worm & (keys == 'aspect_size'))[0]].values
 
         for key in coord_keys:
-            if key not in cur_keys:
+            positions = np.flatnonzero(is_worm & (keys == key))
+            if len(positions) == 0:
                 continue
+            # In order of aspect
+            positions = positions[np.argsort(
+                df.columns.get_level_values('aspect')[positions])]
 
-            thing_to_reverse = df.loc[cur_mask, idx[worm_id, 'x', :]]
+            df.iloc[rows, positions] = _reversed_rows(
+                np.array(df.iloc[rows, positions], dtype=float),
+                aspect_size)
 
-            # TODO: I need to reverse "thing_to_reverse", accounting for
-            # aspect size.  [::-1] just reverses the row order.
-            pass
+        df.iloc[rows, head_position] = 'L'
 
-    pass
+        ventral_positions = np.flatnonzero(is_worm & (keys == 'ventral'))
+        if len(ventral_positions) > 0:
+            df.iloc[rows, ventral_positions[0]] = _swapped_ventral(
+                df.iloc[rows, ventral_positions[0]].values)
 
 
-def parse_data(data):
+def _reverse_backwards_blocks(blocks, aspect_size):
     """
-    Parse the array of entries conforming to the WCON schema definition
-    for "_data" in the root object.  The canonical example is
-    that of worm "skeleton" (midline) information over time.
+    The equivalent of reverse_backwards_worms, applied in place to the
+    blocks of a WormDataBuffer, before its DataFrame is built.
 
-    This could be the standard "data" array from the root object, or
-    some custom array that needs to be processed
+    """
+    if 'head' not in blocks:
+        return
 
-    Note that all elements are required to have "id", "t", and "x" and "y"
-    entries.
+    rows = np.flatnonzero(blocks['head'] == 'R')
+    if len(rows) == 0:
+        return
 
-    Returns
-    --------
-    An ordered dict of DataFrames, one DataFrame per worm id.
+    for key in elements_with_aspect:
+        if key in blocks:
+            blocks[key][rows] = _reversed_rows(blocks[key][rows],
+                                               aspect_size[rows])
+
+    blocks['head'][rows] = 'L'
+
+    if 'ventral' in blocks:
+        blocks['ventral'][rows] = _swapped_ventral(blocks['ventral'][rows])
 
+
+def _reversed_rows(values, aspect_size):
     """
-    # If data is single-valued, wrap it in a list so it will be just
-    # a special case of the array case.
-    if isinstance(data, dict):
-        data = [data]
+    Reverse the first aspect_size[i] entries of each row i of the 2-D
+    array values, all in one fancy indexing operation.  The padding
+    after them stays where it is.
 
-    data = np.array(data)
+    """
+    aspect_size = np.nan_to_num(aspect_size).astype(int)[:, np.newaxis]
+    aspect = np.arange(values.shape[1])
+    source = np.where(aspect < aspect_size, aspect_size - 1 - aspect, aspect)
 
-    # We only care about data that have all the mandatory fields.
-    # the Custom Feature Type 2 objects are suppresed by this filter:
-    is_time_series_mask = get_mask(data, 't')
-    has_id_mask = get_mask(data, 'id')
-    data = data[is_time_series_mask & has_id_mask]
+    return np.take_along_axis(values, source, axis=1)
 
-    # Clean up and validate all time-series data segments
-    _validate_time_series_data(data)
 
-    df_odict = _obtain_time_series_data_frame(data)
+def _swapped_ventral(ventral):
+    """
+    'CW' for 'CCW' and vice versa, in an object array of ventral values.
+
+    """
+    swapped = ventral.copy()
+    swapped[ventral == 'CW'] = 'CCW'
+    swapped[ventral == 'CCW'] = 'CW'
 
-    return df_odict
+    return swapped
 
 
-def _obtain_time_series_data_frame(time_series_data):
+class TimeSeriesDataBuilder():
     """
-    Obtain a time-series pandas DataFrame
+    Builds the per-worm DataFrames for a "data" array one data segment at a
+    time, so that each raw data segment can be discarded as soon as it has
+    been added.
 
-    Parameters
-    ------------
-    time_series_data: list
-        All entries must be lists of dicts, all of which
-        must have 'id' and 't'
+    The values of each worm are collected column-wise into preallocated
+    NumPy buffers (see WormDataBuffer), and a single, typed DataFrame is
+    created per worm only at the end.
 
-    Returns
-    ----------
-    ordered dictionary of pandas DataFrames
-        - keys are the worm_ids
-        - Time-series data goes into this Pandas DataFrame
-        The dataframe will have t as index, and multilevel columns
-        with id at the first level and all other keys at second level.
+    This lets WCONWorms.load consume the "data" array of a stream
+    incrementally, without first holding the entire array in memory.
+
+    Data segments for worms other than worm_ids, and timeframes outside
+    t_range, are dropped as they are added, before any arrays are built
+    for them.
+
+    Usage
+    -------------
+    builder = TimeSeriesDataBuilder(worm_ids, t_range)
+    for data_segment in data:
+        builder.add_segment(data_segment)
+    df_odict = builder.to_odict()
 
     """
 
-    # Convert each segment into a dataframe
-    data_segment_dfs = []
+    def __init__(self, worm_ids=None, t_range=None):
+        """
+        Parameters
+        -------------
+        worm_ids: list of str
+            If not None, keep only the worms with these ids
+        t_range: (float, float)
+            If not None, keep only the timeframes with t_range[0] <= t <=
+            t_range[1], where t is in the units of the "data" array.
+            Either bound may be None, for no bound on that side.
+
+        """
+        self.num_segments = 0
+        self._worm_buffers = OrderedDict()
+
+        if isinstance(worm_ids, six.string_types):
+            worm_ids = [worm_ids]
+        self.worm_ids = None if worm_ids is None else set(worm_ids)
+
+        if t_range is None:
+            self.t_range = None
+        else:
+            t_min, t_max = t_range
+            self.t_range = (-np.inf if t_min is None else t_min,
+                            np.inf if t_max is None else t_max)
+
+    def _in_t_range(self, t):
+        t = np.array(t, dtype=float)
+        return (t >= self.t_range[0]) & (t <= self.t_range[1])
+
+    def add_segment(self, data_segment):
+        """
+        Validate a single element of the "data" array and add it to the
+        data being built.
+
+        """
+        # We only care about data that have all the mandatory fields.
+        # the Custom Feature Type 2 objects are suppresed by this filter:
+        if 't' not in data_segment or 'id' not in data_segment:
+            return
+
+        # Skip the data segments we weren't asked for, without even
+        # validating them
+        if (self.worm_ids is not None and
+                data_segment['id'] not in self.worm_ids):
+            self.num_segments += 1
+            return
+        if self.t_range is not None:
+            # The times are needed to filter by, so are checked first
+            _check_numbers(data_segment['t'], 't', "%i (id %s)" %
+                           (self.num_segments, str(data_segment['id'])))
+            if not np.any(self._in_t_range(data_segment['t'])):
+                self.num_segments += 1
+                return
+
+        # Clean up and validate the time-series data segment
+        data_segment = _validate_data_segment(data_segment,
+                                              self.num_segments)
+        self.num_segments += 1
+
+        if self.t_range is not None:
+            data_segment = _select_timeframes(
+                data_segment, self._in_t_range(data_segment['t']))
 
-    # Consider only time-series data stamped with an id:
-    for data_segment in time_series_data:
-        # Add this data_segment to a Pandas dataframe
         worm_id = data_segment['id']
-        segment_keys = np.array([k for k in data_segment.keys()
-                                 if k not in ['t', 'id']])
-
-        cur_timeframes = np.array(data_segment['t']).astype(float)
-
-        # Create our column names as the cartesian product of
-        # the segment's keys and the id of the segment
-        # Only elements articulated across the skeleton, etc, of the worm
-        # have the "aspect" key though
-        cur_elements_with_aspect = \
-            [k for k in elements_with_aspect if k in segment_keys]
-        cur_elements_without_aspect = ['aspect_size'] + \
-            [k for k in elements_without_aspect if k in segment_keys]
-
-        # We want to be able to fit the largest aspect size in our
-        # DataFrame
-        max_aspect_size = int(max([k[0] for k in data_segment['aspect_size']]))
-
-        key_combos = list(itertools.product([worm_id],
-                                            cur_elements_with_aspect,
-                                            range(max_aspect_size)))
-        key_combos.extend(list(itertools.product([worm_id],
-                                                 cur_elements_without_aspect,
-                                                 [0])))
-
-        column_type_names = ['id', 'key', 'aspect']
-        cur_columns = pd.MultiIndex.from_tuples(key_combos,
-                                                names=column_type_names)
-
-        # e.g. if this segment has only 'x', 'y', that's what we'll be
-        # looking to add to our dataframe data staging in the next step
-        cur_data_keys = cur_elements_with_aspect + \
-            cur_elements_without_aspect
-
-        # We must pad the timeframes where the data doesn't have maximal
-        # aspect or else the concatenation step below will fail.
-        for k in cur_elements_with_aspect:
-            for i in range(len(cur_timeframes)):
-                data_segment[k][i] = (
-                    data_segment[k][i] +
-                    [np.NaN] * (max_aspect_size - len(data_segment[k][i])))
-
-        num_timeframes = len(cur_timeframes)
-
-        # Stage the data for addition to our DataFrame.
-        # Shape KxI where K is the number of keys and
-        #                 I is the number of "aspects"
-        cur_data = _stage_dataframe_data(num_timeframes,
-                                         data_segment, cur_data_keys)
-
-        cur_df = pd.DataFrame(cur_data, columns=cur_columns)
-
-        cur_df.index = cur_timeframes
-        cur_df.index.names = 't'
-
-        # We want the index (time) to be in order.
-        cur_df.sort_index(axis=0, inplace=True)
-
-        # Apparently multiindex must be sorted to work properly:
-        cur_df.sort_index(axis=1, inplace=True)
-
-        # If we don't do this, for very large files (>50 MB) the memory
-        # footprint grows until the program crashes
-        # gc.collect()
-
-        data_segment_dfs.append(cur_df)
-
-    # Our DataFrame to return
-    df_odict = OrderedDict()
-
-    # Obtain a list of lists of the worm ids
-    worm_ids = [cur_df.columns.levels[0].values for cur_df in data_segment_dfs]
-
-    # To see if any worms appear more than once, flatten the list and
-    # check for duplicates
-    worm_ids_flat = [item for sublist in worm_ids for item in sublist]
-
-    # If worm_ids are mutually distinct in each dataframe, then
-    if len(set(worm_ids_flat)) == len(worm_ids):
-        df_odict = OrderedDict(zip(worm_ids_flat, data_segment_dfs))
-        # l = data_segment_dfs[0]
-        # memory_use_log = [l.memory_usage().sum()]
-        # memory_use_indiv = [l.memory_usage().sum()]
-        # for r in data_segment_dfs[1:]:
-        #   l = pd.merge(l, r, left_index=True, right_index=True, how='outer')
-        # time_df = l
-    else:
-        # Otherwise we have to iterate
-        # TODO: we could do the above time shortcut with all available
-        #       mutually distinct segments, rather than only doing it if
-        #       ALL segments are mutually distinct
-        for cur_df in data_segment_dfs:
-            worm_id = cur_df.columns.levels[0].values[0]
-            # Add the segment to our main DataFrame
-            if worm_id not in df_odict:
-                # if it's not there, INSERT
-                df_odict[worm_id] = cur_df
+        if worm_id not in self._worm_buffers:
+            self._worm_buffers[worm_id] = WormDataBuffer()
+
+        self._worm_buffers[worm_id].add_segment(data_segment)
+
+    def to_odict(self):
+        """
+        Returns
+        --------
+        An ordered dict of DataFrames, one DataFrame per worm id.
+
+        """
+        df_odict = OrderedDict()
+        for worm_id, worm_buffer in self._worm_buffers.items():
+            df_odict[worm_id] = worm_buffer.to_data_frame(worm_id)
+
+        return sort_odict(df_odict)
+
+
+class WormDataBuffer():
+    """
+    The time series of one worm, held column-wise in NumPy buffers that
+    are preallocated and grown geometrically as data segments are added.
+
+    Attributes
+    -------------
+    num_rows: int
+        The number of timeframes added so far (duplicates included)
+    width: int
+        The largest aspect size seen so far; the width of the x and y blocks
+    t, aspect_size: 1-D float arrays
+    blocks: dict of arrays
+        2-D float arrays for the elements with aspect (x, y), 1-D arrays
+        for the elements without aspect (float, or object for head and
+        ventral).  Missing values are NaN.
+    present: dict of 1-D int arrays
+        For each timeframe, how many aspects of the key were given by
+        its data segment (1 or 0 for elements without aspect).  Used to
+        check duplicate timeframes for conflicts.
+
+    """
+    INITIAL_CAPACITY = 16
+
+    def __init__(self):
+        self.num_rows = 0
+        self.capacity = 0
+        self.width = 0
+        self.t = np.empty(0)
+        self.aspect_size = np.empty(0)
+        self.blocks = {}
+        self.present = {}
+
+    def _reserve(self, num_new_rows):
+        """
+        Make sure the buffers have room for num_new_rows more timeframes.
+
+        """
+        required = self.num_rows + num_new_rows
+        if required <= self.capacity:
+            return
+
+        self.capacity = max(2 * self.capacity, required,
+                            self.INITIAL_CAPACITY)
+
+        self.t = _resized(self.t, self.capacity, self.num_rows)
+        self.aspect_size = _resized(self.aspect_size, self.capacity,
+                                    self.num_rows)
+        for key in self.blocks:
+            self.blocks[key] = _resized(self.blocks[key], self.capacity,
+                                        self.num_rows)
+            self.present[key] = _resized(self.present[key], self.capacity,
+                                         self.num_rows)
+
+    def _widen(self, width):
+        """
+        Make the blocks of the elements with aspect at least width wide.
+
+        """
+        if width <= self.width:
+            return
+
+        for key in elements_with_aspect:
+            if key in self.blocks:
+                block = np.full((self.capacity, width), np.nan)
+                block[:, :self.width] = self.blocks[key]
+                self.blocks[key] = block
+
+        self.width = width
+
+    def _block(self, key):
+        """
+        Return the buffer for key, creating it (all missing) if necessary.
+
+        """
+        if key not in self.blocks:
+            if key in elements_with_aspect:
+                shape = (self.capacity, self.width)
             else:
-                # if it is already there, UPDATE
-                df_odict[worm_id] = df_upsert(src=cur_df,
-                                              dest=df_odict[worm_id])
+                shape = (self.capacity,)
+            dtype = object if key in ['head', 'ventral'] else float
+            self.blocks[key] = np.full(shape, np.nan, dtype=dtype)
+            self.present[key] = np.zeros(self.capacity, dtype=int)
+
+        return self.blocks[key]
+
+    def add_segment(self, data_segment):
+        """
+        Copy a data segment, already validated by _validate_data_segment,
+        into the buffers.
+
+        """
+        t = data_segment['t']
+        num_timeframes = len(t)
+        if num_timeframes == 0:
+            return
+
+        aspect_size = data_segment['aspect_size']
+        segment_width = int(aspect_size.max())
+
+        self._reserve(num_timeframes)
+        self._widen(segment_width)
+
+        rows = slice(self.num_rows, self.num_rows + num_timeframes)
+        self.t[rows] = t
+        self.aspect_size[rows] = aspect_size
+
+        for key in elements_with_aspect:
+            if key in data_segment:
+                block = self._block(key)
+                block[rows, :segment_width] = _pad_ragged(
+                    data_segment[key], aspect_size.astype(int),
+                    segment_width)
+                self.present[key][rows] = segment_width
+
+        for key in elements_without_aspect:
+            if key in data_segment:
+                block = self._block(key)
+                block[rows] = _aspectless_array(data_segment[key], key,
+                                                block.dtype)
+                self.present[key][rows] = 1
+
+        self.num_rows += num_timeframes
+
+    def to_data_frame(self, worm_id):
+        """
+        Returns
+        ----------
+        pandas DataFrame
+            The dataframe will have t as index, and multilevel columns
+            with id at the first level and all other keys at second level.
+            Duplicated timeframes are merged, raising an AssertionError if
+            they conflict.  The coordinates are shifted by the offsets,
+            and the offsets dropped, as by convert_origin, and worms with
+            head 'R' are reversed, as by reverse_backwards_worms.
+
+        """
+        n = self.num_rows
+
+        # We want the index (time) to be in order.  A stable sort keeps
+        # duplicated timeframes in the order they were added.
+        order = np.argsort(self.t[:n], kind='mergesort')
+        t = self.t[:n][order]
+        aspect_size = self.aspect_size[:n][order]
+        blocks = {k: v[:n][order] for (k, v) in self.blocks.items()}
+        present = {k: v[:n][order] for (k, v) in self.present.items()}
+
+        is_duplicate = np.zeros(n, dtype=bool)
+        is_duplicate[1:] = t[1:] == t[:-1]
+
+        if is_duplicate.any():
+            _merge_duplicate_timeframes(worm_id, t, is_duplicate,
+                                        aspect_size, blocks, present)
+            keep = ~is_duplicate
+            t = t[keep]
+            aspect_size = aspect_size[keep]
+            blocks = {k: v[keep] for (k, v) in blocks.items()}
+
+        _convert_origin_blocks(blocks)
+        _reverse_backwards_blocks(blocks, aspect_size)
 
-    for worm_id in df_odict:
-        # We want the index (time) to be in order.
-        df_odict[worm_id].sort_index(axis=0, inplace=True)
         # The columns also need to be in order.
-        df_odict[worm_id].sort_index(axis=1, inplace=True)
-
-        # We have to do this because somehow with entire worms who have 'head'
-        # or 'ventral' columns, all their columns (even the numeric ones)
-        # have dtype = object !  We want dtype=float64 (or some float anyway)
-        # (Ignore the FutureWarning here about convert_objects being
-        # deprecated, because to_numeric only acts on Series and I don't know
-        # which ones we need to convert.)
-        with warnings.catch_warnings():
-            warnings.filterwarnings(action="ignore", category=FutureWarning)
-            df_odict[worm_id] = \
-                df_odict[worm_id].convert_objects(convert_numeric=True)
-
-        # If 'head' or 'ventral' is NaN, we must specify '?' since
-        # otherwise, when saving this object, to specify "no value" we would
-        # have to create a new data segment with no 'head' column at all.
-        # But since both 'head' and 'ventral' have this issue, we might need
-        # segments with just 'head', just 'ventral', and both 'head' and
-        # 'ventral', and none.  That's too unwieldy for a rare use case.
-        # So instead we treat nan as '?'.
-
-        # We must replace NaN with None, otherwise the JSON encoder will
-        # save 'NaN' as the string and this will get rejected by our schema
-        # on any subsequent loads
-        # Note we can't use .fillna(None) due to this issue:
-        # https://github.com/pydata/pandas/issues/1972
-        df_keys = set(df_odict[worm_id].columns.get_level_values('key'))
-        for k in ['head', 'ventral']:
-            if k in df_keys:
-                cur_slice = df_odict[worm_id].loc[:, idx[:, k, :]]
-                df_odict[worm_id].loc[:, idx[:, k, :]] = \
-                    cur_slice.fillna(value=np.nan)
+        index = pd.Index(t, name='t')
+        columns = []
+        arrays = []
+        for key in sorted(list(blocks.keys()) + ['aspect_size']):
+            if key == 'aspect_size':
+                columns.append((worm_id, key, 0))
+                arrays.append(aspect_size)
+            elif key in elements_with_aspect:
+                for aspect in range(self.width):
+                    columns.append((worm_id, key, aspect))
+                    arrays.append(blocks[key][:, aspect])
+            else:
+                columns.append((worm_id, key, 0))
+                # As a Series, so pandas doesn't infer a string dtype for
+                # head and ventral
+                arrays.append(pd.Series(blocks[key], index=index,
+                                        dtype=blocks[key].dtype))
 
-        # Make sure aspect_size is a float, since only floats are nullable:
-        if 'aspect_size' in df_keys:
-            df_odict[worm_id].loc[:, idx[:, 'aspect_size', :]] = \
-                df_odict[worm_id].loc[:, idx[:, 'aspect_size', :]] \
-                .astype(float)
+        df = pd.DataFrame(OrderedDict(zip(range(len(arrays)), arrays)),
+                          index=index)
+        df.columns = pd.MultiIndex.from_tuples(
+            columns, names=['id', 'key', 'aspect'])
 
-    return sort_odict(df_odict)
+        return df
 
 
-def __pivot_data_for_staging(data_segment, cur_data_keys, index_range,
-                             core_index=None, queue=None):
+def _convert_origin_blocks(blocks):
     """
-    Transform the WCON data segment into one properly arranged for adding to
-    a pandas DataFrame
+    The equivalent of convert_origin, applied in place to the blocks of a
+    WormDataBuffer, before its DataFrame is built.
 
-    i.e. Pivot the data properly for the dataframe, for a certain range
-    of frames f where i_start <= f < i_end, where
-    i_start = min(index_range) and i_end = max(index_range).
+    Each offset (and centroid) is broadcast across a whole block of
+    coordinates at once.  The offset blocks are then removed.
 
-    Parameters
-    ----------
-    data_segment: list of lists of floats
-        Taken directly from the WCON file being loaded
-    cur_data_keys: list of 1-character strings
-        The keys, e.g. 'x', 'y', that need to be obtained
-    index_range: range object
-        The timeframes across which the transformation is to be applied
-    core_index: int
-        None if this is not a sub-process
-        Otherwise, this is the core that the sub-process should be pinned to
-        (there is a problem with subprocesses using multiple cores when
-        numpy is involved, so we must explicitly pin them to separate cores)
-    queue: multiprocessing.Queue object
-        None if this is not a sub-process
-        Otherwise, this is a sub-process, and we should append our result
-        to queue rather than return a value
-
-    """
-    # DEBUG: This code definitely gets used across multiple cores
-    #        use this to verify multiprocessing
-    # myList = np.random.randint(0, 10, 3333333/4)
-    # finalSum = sum(myList)
-
-    # Set process affinity if we are multiprocessing
-    if core_index:
-        cur_pid = os.getpid()
-        p = psutil.Process(cur_pid)
-        # print("Current pid:" + str(cur_pid))
-        # print("Parent pid:" + str(os.getppid()))
-        # print("PSUTIL CPU affinity:" + str(p.cpu_affinity()))
-        p.cpu_affinity([core_index])
-        # print("PSUTIL CPU affinity:" + str(p.cpu_affinity()))
-
-    # Pivot the data
-    cur_data_slice = np.array(
-        [np.concatenate(
-            [data_segment[k][i] for k in cur_data_keys]
-        ) for i in index_range]
-    )
-
-    # Add to the queue only if we are multiprocessing
-    if queue is None:
-        return cur_data_slice
-    else:
-        # We put a duple into the queue, the first entry
-        # being the correct final order of the data, the
-        # second entry being the data we just calculated
-        queue.put((core_index, cur_data_slice))
+    """
+    for offset, centroid, coord in zip(['ox', 'oy'], ['cx', 'cy'],
+                                       ['x', 'y']):
+        if offset not in blocks:
+            continue
+
+        # Consider offset as 0 if not available in a certain frame
+        ox = blocks.pop(offset)
+        ox[np.isnan(ox)] = 0
 
+        if coord in blocks:
+            blocks[coord] += ox[:, np.newaxis]
+
+        if centroid in blocks:
+            # Shift the centroid by the offset, then make it the origin
+            blocks[centroid] += ox
+            if coord in blocks:
+                blocks[coord] -= blocks[centroid][:, np.newaxis]
+
+
+def _resized(arr, capacity, num_rows):
+    """
+    Return a copy of arr with capacity rows, of which the first num_rows
+    are copied over and the rest are missing (NaN, or 0 for int arrays).
 
-def _stage_dataframe_data(num_timeframes, data_segment, cur_data_keys):
     """
-    Transform the WCON data segment into one properly arranged for adding to
-    a pandas DataFrame.
+    fill = 0 if arr.dtype == int else np.nan
+    new_arr = np.full((capacity,) + arr.shape[1:], fill, dtype=arr.dtype)
+    new_arr[:num_rows] = arr[:num_rows]
 
-    As this is an "embarassingly parallel" problem since each frame can be
-    processed independently, we split the frames across multiple processes
-    if
-    independent
+    return new_arr
 
-    (This version attempts to use multiple process)
 
+def _pad_ragged(rows, aspect_sizes, width):
     """
-    num_cores = multiprocessing.cpu_count()
+    Convert a list of lists of (possibly different) lengths aspect_sizes
+    into a 2-D float array of the given width, padded with NaN.
 
-    # Don't use multiple processes unless we have many frames of data,
-    # and unless we have multiple CPUs to spread the work around
-    if ((not USE_MULTIPROCESSING) or
-            num_timeframes < MIN_FRAMES_FOR_MULTIPROCESSING or num_cores <= 1):
-        return __pivot_data_for_staging(data_segment, cur_data_keys,
-                                        range(num_timeframes))
+    """
+    if len(rows) > 0 and (aspect_sizes == width).all():
+        # Not ragged; NumPy can convert it in one go
+        return np.array(rows, dtype=float).reshape(len(rows), width)
 
-    # Create a Queue to share results
-    q = Queue()
+    padded = np.full((len(rows), width), np.nan)
+    mask = np.arange(width) < aspect_sizes[:, np.newaxis]
+    # The mask is traversed in row-major order, i.e. frame by frame
+    padded[mask] = np.array(list(itertools.chain.from_iterable(rows)),
+                            dtype=float)
 
-    # Create 4 sub-processes to do the work
-    splits = list(range(0, num_timeframes, num_timeframes // num_cores))
-    # If the number of frames is not divisible by the step length,
-    # range will fall short of ranging up to the num_timeframes
-    # so here we overwrite the last endpoint
-    if not num_timeframes % num_cores:
-        # If num_timeframes is divisible by num_cores, add an entry
-        splits.append(num_timeframes)
-    else:
-        # Otherwise, we already have enough entries, so just extend
-        # the final one
-        splits[-1] = num_timeframes
+    return padded
 
-    processes = []
-    for i in range(num_cores):
-        processes.append(Process(target=__pivot_data_for_staging, args=(
-                                 data_segment, cur_data_keys,
-                                 range(splits[i], splits[i + 1]),
-                                 i, q)))
 
-    for i in range(len(processes)):
-        processes[i].start()
+def _aspectless_array(values, key, dtype):
+    """
+    Convert the values of an element without aspect, one per timeframe,
+    to a 1-D array of dtype, with null values as NaN.
 
-    data_pieces = {}
-    # Grab 4 values from the queue, one for each process
-    # They are calculated by subprocesses and hence might
-    # arrive in the queue out of order, so we collect them into
-    # a dictionary keyed with their correct final order.
-    for i in range(len(processes)):
-        # Set block=True to block until we get a result
-        data_piece = q.get(True)
-        # data_piece is a tuple with the first entry providing the order
-        data_pieces[data_piece[0]] = data_piece[1]
+    """
+    try:
+        arr = np.array(values, dtype=dtype)
+    except (TypeError, ValueError):
+        arr = None
+
+    if arr is None or arr.ndim != 1:
+        raise AssertionError("Error: element '%s' has no aspect so it must "
+                             "have exactly one value per timeframe." % key)
 
-    # Now put the pieces together in the correct order
-    cur_data = []
-    for i in range(len(processes)):
-        cur_data.extend(data_pieces[i])
+    if dtype == object:
+        arr[pd.isnull(arr)] = np.nan
 
-    # Combine all the processes' data into one list
-    cur_data = np.array(cur_data)
+    return arr
 
-    for i in range(len(processes)):
-        processes[i].join()
 
-    return cur_data
+def _merge_duplicate_timeframes(worm_id, t, is_duplicate, aspect_size,
+                                blocks, present):
+    """
+    Merge each duplicated timeframe into the first one with the same time,
+    modifying aspect_size, blocks and present in place.
 
+    This is an "update/insert" where conflicts cause an AssertionError to
+    be raised, i.e. for each value:
+    NaN NaN = fine
+    NaN 2   = fine, 2 is kept
+    2   2   = fine
+    2   3   = conflict
+    2   NaN = conflict
 
-def _validate_time_series_data(time_series_data):
     """
-    Validate and standardise all time-series data segments in the
-    data dictionary provided
+    first_rows = np.flatnonzero(~is_duplicate)
+    group_start = first_rows[np.cumsum(~is_duplicate) - 1]
+
+    def upsert(dest, src, t_value):
+        if np.any(pd.notnull(dest) & (dest != src)):
+            raise AssertionError("Data from this segment conflicted with "
+                                 "previously loaded data, for worm %s at "
+                                 "time %s" % (str(worm_id), str(t_value)))
+        merged = np.where(pd.isnull(dest), src, dest)
+        # Unwrap 0-d arrays, so they are not stored as objects themselves
+        return merged[()] if merged.ndim == 0 else merged
+
+    for row in np.flatnonzero(is_duplicate):
+        first = group_start[row]
+
+        aspect_size[first] = upsert(aspect_size[first], aspect_size[row],
+                                    t[row])
+
+        for key in blocks:
+            num_present = present[key][row]
+            if num_present == 0:
+                continue
+            if key in elements_with_aspect:
+                blocks[key][first, :num_present] = upsert(
+                    blocks[key][first, :num_present],
+                    blocks[key][row, :num_present], t[row])
+            else:
+                blocks[key][first] = upsert(blocks[key][first],
+                                            blocks[key][row], t[row])
+            present[key][first] = max(present[key][first], num_present)
+
+
+def parse_data(data, worm_ids=None, t_range=None):
+    """
+    Parse the array of entries conforming to the WCON schema definition
+    for "_data" in the root object.  The canonical example is
+    that of worm "skeleton" (midline) information over time.
+
+    This could be the standard "data" array from the root object, or
+    some custom array that needs to be processed
+
+    Note that all elements are required to have "id", "t", and "x" and "y"
+    entries.
 
     Parameters
     -----------
-    data_series_data: array
-        Dictionary extracted from JSON, but only the entries with
-        a time series.
-        All elements must be lists of dicts, all of which
-        must have 't' entries
+    data: list or dict
+    worm_ids: list of str
+        If not None, parse only the worms with these ids
+    t_range: (float, float)
+        If not None, parse only the timeframes within this (inclusive)
+        range.  Either bound may be None.
+
+    Returns
+    --------
+    An ordered dict of DataFrames, one DataFrame per worm id, with the
+    origin converted as by convert_origin, and backwards worms reversed
+    as by reverse_backwards_worms.
+
+    """
+    # If data is single-valued, wrap it in a list so it will be just
+    # a special case of the array case.
+    if isinstance(data, dict):
+        data = [data]
+
+    builder = TimeSeriesDataBuilder(worm_ids, t_range)
+    for data_segment in data:
+        builder.add_segment(data_segment)
+
+    return builder.to_odict()
+
+
+def _validate_data_segment(data_segment, data_segment_index=0):
+    """
+    Validate and standardise one time-series data segment
+
+    Parameters
+    -----------
+    data_segment: dict
+        An element of the "data" array extracted from JSON, with
+        a time series, i.e. it must have a 't' entry
+    data_segment_index: int
+        The position of the data segment, for error messages
+
+    Returns
+    -----------
+    A new dict: the validated and standardised data segment.  't' and
+    'aspect_size' are 1-D float arrays, the elements with aspect are
+    sequences of one array per timeframe, and the elements without aspect
+    are sequences of one value per timeframe.
 
     """
     canonical_elements = ['id', 't', 'x', 'y', 'cx', 'cy', 'ox', 'oy',
                           'head', 'ventral', 'aspect_size']
 
-    for (data_segment_index, data_segment) in enumerate(time_series_data):
-        # Filter the data_segment to ignore non-canonical elements
-        if six.PY3:
-            data_segment = {k: v for (k, v) in data_segment.items()
-                            if k in canonical_elements}
-        else:
-            data_segment = {k: v for (k, v) in data_segment.iteritems()
-                            if k in canonical_elements}
+    # Filter the data_segment to ignore non-canonical elements
+    data_segment = {k: v for (k, v) in six.iteritems(data_segment)
+                    if k in canonical_elements}
 
-        segment_keys = [k for k in data_segment.keys() if k != 'id']
+    segment_keys = [k for k in data_segment.keys() if k != 'id']
 
-        # If one axis is present, the other must be as well
-        assert(not(('cx' in segment_keys) ^ ('cy' in segment_keys)))
-        assert(not(('ox' in segment_keys) ^ ('oy' in segment_keys)))
+    # If one axis is present, the other must be as well
+    assert(not(('cx' in segment_keys) ^ ('cy' in segment_keys)))
+    assert(not(('ox' in segment_keys) ^ ('oy' in segment_keys)))
 
-        """
-        We require elements to be wrapped in arrays.  They may come in
-        various singleton formats, so we must convert.  The final state
-        must be:
+    # As the schema requires, even if it wasn't checked
+    for subkey in elements_with_aspect:
+        if subkey not in segment_keys:
+            raise AssertionError("Error: data segment %i (id %s) has no "
+                                 "'%s'" % (data_segment_index,
+                                           str(data_segment.get('id')),
+                                           subkey))
 
-        "t": [1.5], "x": [[6, 7, 8]], "ox": [[8.2]]
+    """
+    We require elements to be wrapped in arrays.  They may come in
+    various singleton formats, so we must convert.  The final state
+    must be:
 
-        or for multiple timeframes:
+    "t": [1.5], "x": [[6, 7, 8]], "ox": [8.2]
 
-        "t": [1.5, 1.6], "x": [[6, 7, 8], [6.2, 7.2, 8.2]],
-        "ox": [[8.2], [8.2]]
+    or for multiple timeframes:
 
-        The data might arrive in the following formats:
+    "t": [1.5, 1.6], "x": [[6, 7, 8], [6.2, 7.2, 8.2]],
+    "ox": [8.2, 8.2]
 
-                                   elements with aspect
-                            singleton      array               array of arrays
+    The data might arrive in the following formats:
 
-        TIME singleton  "t":1.5, "x":6  "x":1.5, "x": [6,7,8]    NOT ALLOWED
+                               elements with aspect
+                        singleton      array               array of arrays
 
-        TIME array        NOT ALLOWED   "t":[1.5, 1.8]         "t":[1.5, 1.8]
-                                        "x":[6.3, 6.2]         "x":[[6,7,8],
-                                                                    [8,9,10]]
+    TIME singleton  "t":1.5, "x":6  "x":1.5, "x": [6,7,8]    NOT ALLOWED
 
-                                   elements without aspect
-                            singleton      array               array of arrays
-        TIME singleton  "t":1.5, "ox":6  "x":1.5, "ox": [8]    NOT ALLOWED
+    TIME array        NOT ALLOWED   "t":[1.5, 1.8]         "t":[1.5, 1.8]
+                                    "x":[6.3, 6.2]         "x":[[6,7,8],
+                                                                [8,9,10]]
 
-        TIME array      "t":[1.5,1.8]    "t":[1.5, 1.8]        NOT ALLOWED
-                        "ox":8           "ox":[8, 8.2]
+                               elements without aspect
+                        singleton      array               array of arrays
+    TIME singleton  "t":1.5, "ox":6  "x":1.5, "ox": [8]    NOT ALLOWED
 
-        So in all but one of these cases, we must wrap the data in more
-        brackets.
+    TIME array      "t":[1.5,1.8]    "t":[1.5, 1.8]        NOT ALLOWED
+                    "ox":8           "ox":[8, 8.2]
 
-        """
-        # HANDLE TIME ('t')
-        time_is_singleton = not isinstance(data_segment['t'], list)
-        if time_is_singleton:
-            data_segment['t'] = [data_segment['t']]
-        num_timeframes = len(data_segment['t'])
-
-        # HANDLE ALL OTHER KEYS (besides 'id' and 't')
-        for subkey in elements_with_aspect + elements_without_aspect:
-            if subkey in segment_keys:
-                if not isinstance(data_segment[subkey], list):
-                    # SINGLETON CASE
-                    if time_is_singleton:
-                        data_segment[subkey] = [[data_segment[subkey]]]
-                    else:
-                        if subkey in elements_without_aspect:
-                            # Broadcast aspectless elements to be
-                            # length n = subelement_length if it's
-                            # just being shown once right now
-                            # (e.g. for 'ox', 'oy', etc.)
-                            data_segment[subkey] = [[x] for x in [
-                                data_segment[subkey]] * num_timeframes]
-                        else:
-                            raise Exception(
-                                "Error with element '%s' in data "
+    So in most of these cases, we must wrap the data in more brackets,
+    or broadcast it across all timeframes.
+
+    """
+    # Identify the data segment in error messages without printing the
+    # whole thing, which might be many megabytes
+    segment_name = "%i (id %s)" % (data_segment_index,
+                                   str(data_segment.get('id')))
+
+    # NumPy would turn e.g. "1.5" or true into floats, so check first that
+    # the elements hold only numbers, as the schema requires
+    for subkey in ['t'] + numeric_elements:
+        if subkey in data_segment:
+            _check_numbers(data_segment[subkey], subkey, segment_name)
+
+    # HANDLE TIME ('t')
+    time_is_singleton = not isinstance(data_segment['t'], list)
+    if time_is_singleton:
+        data_segment['t'] = [data_segment['t']]
+    data_segment['t'] = np.array(data_segment['t'], dtype=float)
+    num_timeframes = len(data_segment['t'])
+
+    # HANDLE ALL OTHER KEYS (besides 'id' and 't')
+    for subkey in elements_with_aspect + elements_without_aspect:
+        if subkey not in segment_keys:
+            continue
+
+        value = data_segment[subkey]
+        if not isinstance(value, list):
+            # SINGLETON CASE
+            if time_is_singleton:
+                data_segment[subkey] = [[value]] \
+                    if subkey in elements_with_aspect else [value]
+            elif subkey in elements_without_aspect:
+                # Broadcast aspectless elements across all timeframes
+                # if it's just being shown once right now
+                # (e.g. for 'ox', 'oy', etc.)
+                data_segment[subkey] = [value] * num_timeframes
+            else:
+                raise Exception("Error with element '%s' in data "
                                 "segment %s: time is array but "
                                 "element is singleton." %
-                                (subkey, str(data_segment)))
-                elif not isinstance(data_segment[subkey][0], list):
-                    # ARRAY CASE
-                    if time_is_singleton:
-                        data_segment[subkey] = [data_segment[subkey]]
-                    else:
-                        data_segment[subkey] = [[x] for x in
-                                                data_segment[subkey]]
+                                (subkey, segment_name))
+        elif len(value) == 0 or isinstance(value[0], list):
+            # ARRAY OF ARRAYS CASE
+            if time_is_singleton:
+                raise Exception("Error with element '%s' in data "
+                                "segment %s: time is singleton but "
+                                "element is an array of arrays." %
+                                (subkey, segment_name))
+            elif subkey in elements_without_aspect and len(value) > 0:
+                # We could allow this case but it makes no sense
+                # for the file to have aspectless data
+                # double-wrapped so let's reject it.
+                raise Exception("Error with element '%s' in data "
+                                "segment %s: element is "
+                                "aspectless but "
+                                "element is an array of arrays." %
+                                (subkey, segment_name))
+            # Otherwise, this is the one case where all is good.
+        else:
+            # ARRAY CASE
+            if subkey in elements_with_aspect:
+                if time_is_singleton:
+                    data_segment[subkey] = [value]
                 else:
-                    # ARRAY OF ARRAYS CASE
-                    if time_is_singleton:
-                        raise Exception("Error with element '%s' in data "
-                                        "segment %s: time is singleton but "
-                                        "element is an array of arrays." %
-                                        (subkey, str(data_segment)))
-                    else:
-                        if subkey in elements_without_aspect:
-                            # We could allow this case but it makes no sense
-                            # for the file to have aspectless data
-                            # double-wrapped so let's reject it.
-                            raise Exception("Error with element '%s' in data "
-                                            "segment %s: element is "
-                                            "aspectless but "
-                                            "element is an array of arrays." %
-                                            (subkey, str(data_segment)))
-                        else:
-                            # This is the one case where all is good.
-                            pass
-
-        # Validate that all elements have the same number of timeframes
-        element_timeframes = [len(data_segment[subkey])
-                              for subkey in segment_keys]
-
-        # Now we can assure ourselves that num_timeframes is
-        # well-defined; if not, raise an error.
-        if len(set(element_timeframes)) > 1:
-            raise AssertionError("Error: Elements must have all have "
-                                 "the same number of timeframes.")
-
-        # In each time, the aspect size could change, so we need to keep
-        # track of it since the dataframe will ultimately have columns
-        # for the maximal aspect size and it won't otherwise be possible
-        # to determine what the aspect size is in each timeframe
-
-        # First let's validate that the aspect size is identical
-        # across data elements in each time frame:
-        aspect_size_over_time = []
-        for t in range(num_timeframes):
-            # The x and y arrays for element i of the data segment
-            # must have the same length
-            try:
-                cur_aspect_sizes = [len(data_segment[k][t]) for k in
-                                    elements_with_aspect]
-            except TypeError as err:
-                raise TypeError("In the following data segment, an "
-                                "element with aspect (x, y, etc.) was not "
-                                "double-wrapped in arrays, even "
-                                "though time ('t') was. {0}".format(err))
-
-            if len(set(cur_aspect_sizes)) > 1:
-                raise AssertionError(
-                    "Error: Aspects x and y, etc. must have same "
-                    "length for data segment " + str(data_segment_index) +
-                    " and time index " + str(data_segment['t'][t]))
-            else:
-                aspect_size_over_time.append([cur_aspect_sizes[0]])
+                    # One aspect per timeframe: a column vector
+                    data_segment[subkey] = \
+                        np.array(value, dtype=float).reshape(-1, 1)
+            # Elements without aspect already have one value per timeframe
+
+    # Validate that all elements have the same number of timeframes
+    element_timeframes = [len(data_segment[subkey])
+                          for subkey in segment_keys]
+
+    # Now we can assure ourselves that num_timeframes is
+    # well-defined; if not, raise an error.
+    if len(set(element_timeframes)) > 1:
+        raise AssertionError("Error: Elements must have all have "
+                             "the same number of timeframes.")
+
+    # In each time, the aspect size could change, so we need to keep
+    # track of it since the dataframe will ultimately have columns
+    # for the maximal aspect size and it won't otherwise be possible
+    # to determine what the aspect size is in each timeframe
+
+    # First let's validate that the aspect size is identical
+    # across data elements in each time frame:
+    try:
+        aspect_sizes = [_aspect_lengths(data_segment[k], num_timeframes)
+                        for k in elements_with_aspect]
+    except TypeError as err:
+        raise TypeError("In data segment %s, an "
+                        "element with aspect (x, y, etc.) was not "
+                        "double-wrapped in arrays, even "
+                        "though time ('t') was. {0}".format(err)
+                        % segment_name)
+
+    # The x and y arrays for each timeframe of the data segment
+    # must have the same length
+    mismatched = np.flatnonzero(aspect_sizes[0] != aspect_sizes[1])
+    if len(mismatched) > 0:
+        raise AssertionError(
+            "Error: Aspects x and y, etc. must have same "
+            "length for data segment " + str(data_segment_index) +
+            " and time index " + str(data_segment['t'][mismatched[0]]))
+
+    # We need aspect_size to be float rather than int since it will
+    # be in a DataFrame that may be compared with others and so we
+    # want to force all numeric dtypes to be float so the comparison
+    # won't fail simply because e.g. int 1 isn't equal to float 1
+    # More information about this:
+    # Pandas DataFrames are stored internally as a series of "blocks".
+    # You can see these blocks by looking at time_df._data, for instance.
+    # We want to avoid any of the columns being stored within an IntBlock,
+    # because it will then fail to be .equals() another DataFrame with the
+    # same data but stored within a FloatBlock.
+    # See http://stackoverflow.com/questions/17141828/ and
+    # http://stackoverflow.com/questions/19912611/
+    data_segment['aspect_size'] = aspect_sizes[0].astype(float)
+
+    return data_segment
+
+
+_NUMBER_TYPES = frozenset(six.integer_types + (float, type(None)))
+
+
+def _check_numbers(values, key, segment_name):
+    """
+    Raise an AssertionError unless values, as read from JSON, is a number
+    or null, or a list of them, or a list of such lists.
+
+    """
+    if isinstance(values, np.ndarray):
+        return
+    if not isinstance(values, list):
+        values = [values]
+
+    types = set(map(type, values))
+    if list in types:
+        types.discard(list)
+        types.update(map(type, itertools.chain.from_iterable(
+            v for v in values if isinstance(v, list))))
+
+    if not types <= _NUMBER_TYPES:
+        raise AssertionError(
+            "Error: element '%s' in data segment %s must hold only "
+            "numbers, but holds %s" %
+            (key, segment_name,
+             ', '.join(sorted(t.__name__ for t in types - _NUMBER_TYPES))))
 
-        # We need aspect_size to be float rather than int since it will
-        # be in a DataFrame that may be compared with others and so we
-        # want to force all numeric dtypes to be float so the comparison
-        # won't fail simply because e.g. int 1 isn't equal to float 1
-        # More information about this:
-        # Pandas DataFrames are stored internally as a series of "blocks".
-        # You can see these blocks by looking at time_df._data, for instance.
-        # We want to avoid any of the columns being stored within an IntBlock,
-        # because it will then fail to be .equals() another DataFrame with the
-        # same data but stored within a FloatBlock.
-        # See http://stackoverflow.com/questions/17141828/ and
-        # http://stackoverflow.com/questions/19912611/
-        aspect_size_over_time = np.array(aspect_size_over_time, dtype=float)
 
-        data_segment['aspect_size'] = aspect_size_over_time
+def _select_timeframes(data_segment, keep):
+    """
+    Return data_segment, validated by _validate_data_segment, with only
+    the timeframes where the boolean array keep is True.
+
+    """
+    if np.all(keep):
+        return data_segment
+
+    indices = np.flatnonzero(keep)
+    selected = {}
+    for key, value in six.iteritems(data_segment):
+        if key == 'id':
+            selected[key] = value
+        elif isinstance(value, np.ndarray):
+            selected[key] = value[indices]
+        else:
+            selected[key] = [value[i] for i in indices]
+
+    return selected
+
 
-        # Update the data segment
-        time_series_data[data_segment_index] = data_segment
+def _aspect_lengths(rows, num_timeframes):
+    """
+    The length of each row of an element with aspect, as an int array.
+
+    """
+    if isinstance(rows, np.ndarray):
+        return np.full(num_timeframes, rows.shape[1], dtype=int)
+
+    return np.fromiter((len(r) for r in rows), dtype=int,
+                       count=num_timeframes)
 
 
 """
@@ -851,11 +1213,10 @@ def _data_segment_as_odict(worm_id, df_segment):
         # by our schema on any subsequent loads
         # Note we can't use .fillna(None) due to this issue:
         # https://github.com/pydata/pandas/issues/1972
-        if key in ['head', 'ventral']:
-            cur_segment_slice = \
-                cur_segment_slice.where(pd.notnull(cur_segment_slice),
-                                        None)
+        # and newer versions of pandas turn None back into NaN in .where
         cur_list = list(np.array(cur_segment_slice))
+        if key in ['head', 'ventral']:
+            cur_list = [None if pd.isnull(v) else v for v in cur_list]
         data_segment.append((key, cur_list))
 
     num_spine_points = worm_aspect_size.loc[:, 0].astype(int).tolist()
@@ -966,6 +1327,7 @@ def sort_odict(odict, sort_as_strings=True):
         to_sort = odict.iteritems()
 
     if sort_as_strings:
-        return OrderedDict(sorted(to_sort, key=lambda k: str(k)))
+        # By the keys alone, to not turn the values into strings
+        return OrderedDict(sorted(to_sort, key=lambda item: str(item[0])))
     else:
         return OrderedDict(sorted(to_sort))
@@ -1,10 +1,6 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 """
-Methods
-------------
-reject_duplicates
-
 Classes
 ------------
 WCONWorms
@@ -12,24 +8,38 @@ WCONWorms
 """
 import six
 import warnings
+import itertools
 from collections import OrderedDict
 from six import StringIO
 from os import path
 import os
-import shutil
 import json
-import jsonschema
+import hashlib
+import weakref
 import zipfile
+import multiprocessing
+try:
+    from collections.abc import MutableMapping
+except ImportError:
+    from collections import MutableMapping  # Python 2
 import numpy as np
 import pandas as pd
 idx = pd.IndexSlice
 
-from .wcon_data import parse_data, convert_origin
-from .wcon_data import df_upsert, data_as_array
+from .wcon_data import parse_data, TimeSeriesDataBuilder
+from .wcon_data import df_merge_many, data_as_array
 from .wcon_data import get_sorted_ordered_dict
-from .wcon_data import reverse_backwards_worms, sort_odict
+from .wcon_data import sort_odict
+from .wcon_stream import read_wcon_stream
+from .json_backend import reject_duplicates, loads, iterdumps
+from .wcon_validation import SchemaValidator
+from .wcon_cache import SidecarCache
 from .measurement_unit import MeasurementUnit
 
+# The number of characters encoded and compressed at a time when saving
+# to a zip archive
+ZIP_BLOCK_SIZE = 2 ** 20
+
 
 class WCONWorms():
     """
@@ -56,8 +66,11 @@ class WCONWorms():
     Public-Facing Methods
     -------------
     load_from_file   (JSON_path)                [class method]
+    probe            (JSON_path)                [class method]
     save_to_file     (JSON_path, pretty_print)
+    save             (JSON_stream, pretty_print)
     to_canon                                    [property]
+    merge_many       (worms)                    [class method]
     __add__                                     [use "+"]
     __eq__                                      [use "=="]
 
@@ -107,6 +120,14 @@ class WCONWorms():
 
     basic_keys = ['files', 'units', 'metadata', 'data']
 
+    # The number of rows per worm serialized to estimate the size of
+    # the whole text, when saving chunks of a given size
+    SIZE_SAMPLE_ROWS = 100
+    # The number of times compared at once by data_difference
+    COMPARE_BLOCK_ROWS = 2 ** 16
+    # The span of each block of data given a fingerprint, in seconds
+    FINGERPRINT_BLOCK_SECONDS = 60
+
     @property
     def num_worms(self):
         try:
@@ -159,23 +180,21 @@ class WCONWorms():
 
     @property
     def schema(self):
-        try:
-            return self._schema
-
-        except AttributeError:
-            # Only load _schema if this method gets called.  Once
-            # it's loaded, though, persist it in memory and don't lose it
-            here = path.abspath(path.dirname(__file__))
+        return SchemaValidator.schema()
 
-            with open(path.join(here, "wcon_schema.json"), "r") as f:
-                self._schema = json.loads(f.read())
+    @classmethod
+    def validate_from_schema(cls, wcon_string, level=True):
+        """
+        Validate a WCON string against the WCON schema.
 
-            # Now that the schema has been loaded, we can try again
-            return self._schema
+        Parameters
+        -------------
+        wcon_string: str
+        level: bool or str
+            The validation level; see wcon_validation.SchemaValidator
 
-    @classmethod
-    def validate_from_schema(cls, wcon_string):
-        jsonschema.validate(json.load(StringIO(wcon_string)), cls().schema)
+        """
+        SchemaValidator(level).validate(json.load(StringIO(wcon_string)))
 
     @property
     def canonical_units(self):
@@ -200,11 +219,25 @@ class WCONWorms():
         - 'metadata'
         - 'data'
 
+        """
+        ord_dict = self._canonical_header()
+        ord_dict.update({'data': list(self._iter_canonical_data())})
+
+        return ord_dict
+
+    def _canonical_header(self, files=None):
+        """
+        The 'units' and (if present) 'metadata' of as_ordered_dict, after
+        files, if given, as 'files'.
+
         """
         # Not strictly required by JSON but nice to order the four top-level
         # keys so we use OrderedDict here instead of dict.
         ord_dict = OrderedDict()
 
+        if files is not None:
+            ord_dict.update({'files': files})
+
         # A dictionary of the canonical unit strings for all quantities except
         # aspect_size, which is generated at runtime.
         units_obj = {k: self.units[k].canonical_unit_string
@@ -215,27 +248,25 @@ class WCONWorms():
         units_obj = get_sorted_ordered_dict(units_obj)
         ord_dict.update({'units': units_obj})
 
-        # The only optional object is "metadata" since "files" is not
-        # necessary since we don't currently support saving to more than
-        # one chunk.
+        # The other optional object is "metadata"; "files" is only
+        # needed when saving to more than one chunk.
         if self.metadata:
             # Again, sort the metadata (recursively) so that the same file
             # is produced each time that can stand up to diffing
             metadata_obj = get_sorted_ordered_dict(self.metadata)
             ord_dict.update({'metadata': metadata_obj})
 
-        canonical = self.to_canon
-        if canonical._data == {}:
-            data_arr = []
-        else:
-            src = canonical.data_as_odict
-            data_arr = []
-            for worm_id in src:
-                data_arr.extend(data_as_array(src[worm_id]))
+        return ord_dict
 
-        ord_dict.update({'data': data_arr})
+    def _iter_canonical_data(self):
+        """
+        Yield the elements of the 'data' of as_ordered_dict one at a time,
+        converting only one worm to canonical units at a time.
 
-        return ord_dict
+        """
+        for worm_id in self.worm_ids:
+            for data_segment in data_as_array(self._worm_to_canon(worm_id)):
+                yield data_segment
 
     """
     ================================================================
@@ -275,7 +306,7 @@ class WCONWorms():
         return w1.metadata == w2.metadata
 
     @classmethod
-    def is_data_equal(cls, w1, w2, convert_units=True):
+    def is_data_equal(cls, w1, w2, convert_units=True, rtol=0, atol=0):
         """
         Parameters
         -------------
@@ -285,44 +316,170 @@ class WCONWorms():
             If True, the data will first be converted to a standard form
             so that if one worm uses millimetres and the other metres, the
             data can still be properly compared
+        rtol, atol: float
+            The relative and absolute tolerance (see data_difference)
 
-        TODO:
-            Add a "threshold" parameter so that perfect equality is not
-            the only option
+        """
+        return cls.data_difference(w1, w2, convert_units, rtol, atol) is None
+
+    @classmethod
+    def data_difference(cls, w1, w2, convert_units=True, rtol=0, atol=0):
+        """
+        Find the first place the data of w1 and w2 differ.
+
+        Worms are compared one at a time, and the times of each worm
+        COMPARE_BLOCK_ROWS at a time, stopping at the first difference.
+        Values a and b are equal if abs(a - b) <= atol + rtol * abs(b),
+        or if both are NaN.
+
+        Parameters
+        -------------
+        w1, w2: WCONWorms objects
+        convert_units: bool
+            If True, the data is compared in canonical units.  (Unless w1
+            and w2 already have the same units, in which case it is
+            compared as it is, with atol scaled to match.)
+        rtol, atol: float
+            The relative and absolute tolerance.  atol is in canonical
+            units if convert_units is True.
+
+        Returns
+        -------------
+        str
+            A description of the first difference, or None if the data
+            is equal
 
         """
-        # import pdb; pdb.set_trace()
         if w1.num_worms != w2.num_worms:
-            return False
+            return ("w1 has %i worms but w2 has %i" %
+                    (w1.num_worms, w2.num_worms))
 
-        if convert_units:
-            d1 = w1.to_canon._data
-            d2 = w2.to_canon._data
-        else:
-            d1 = w1._data
-            d2 = w2._data
+        # Converting only changes the result if the units differ, or if
+        # rtol is relative to values with an offset
+        same_units = convert_units and cls.are_units_equal(w1, w2) and \
+            all(mu.offset == 0 for mu in w1.units.values())
 
         for worm_id in w1.worm_ids:
-            try:
-                df1 = d1[worm_id]
-            except KeyError:
-                df1 = None
-            try:
-                df2 = d2[worm_id]
-            except KeyError:
-                df2 = None
+            if worm_id not in w2._data:
+                return "worm %s is only in w1" % str(worm_id)
+
+            col_atol = t_atol = atol
+            if same_units:
+                df1 = w1._data[worm_id]
+                df2 = w2._data[worm_id]
+                # The data is in w1's units, but atol is canonical
+                _, scale, _ = w1._column_conversions(df1)
+                col_atol = atol / scale
+                t_atol = atol / w1.units['t'].scale
+            elif convert_units:
+                df1 = w1._worm_to_canon(worm_id)
+                df2 = w2._worm_to_canon(worm_id)
+            else:
+                df1 = w1._data[worm_id]
+                df2 = w2._data[worm_id]
 
-            if (df1 is None) ^ (df2 is None):
-                # If one is None but the other is not (XOR), data is not equal
-                return False
-            elif df1 is None and df2 is None:
-                # If both None, they are equal
-                continue
+            difference = _frame_difference(df1, df2, rtol, col_atol, t_atol,
+                                           cls.COMPARE_BLOCK_ROWS)
+            if difference is not None:
+                return "worm %s: %s" % (str(worm_id), difference)
 
-            if not pd_equals(df1, df2):
-                return False
+        return None
 
-        return True
+    def fingerprint(self, decimals=None):
+        """
+        A hash of the canonical units, the metadata, and the data in
+        canonical units, which is the same in any process, as a hex
+        string.
+
+        Parameters
+        -------------
+        decimals: int
+            If given, floats are rounded to this many decimal places
+            first, so that data differing only by rounding errors has the
+            same fingerprint.
+
+        """
+        content_hash = hashlib.sha1()
+        units = sorted((k, mu.canonical_unit_string)
+                       for (k, mu) in self.units.items())
+        content_hash.update(json.dumps(
+            [units, self.metadata], sort_keys=True, default=str)
+            .encode('utf-8'))
+        for (worm_id, blocks) in self.block_fingerprints(decimals).items():
+            content_hash.update(json.dumps(
+                [str(worm_id), [h for (_, h) in blocks]]).encode('utf-8'))
+
+        return content_hash.hexdigest()
+
+    def block_fingerprints(self, decimals=None):
+        """
+        The fingerprint of each FINGERPRINT_BLOCK_SECONDS of each worm's
+        data, in canonical units, so that changed blocks can be found
+        without comparing the data.
+
+        The fingerprints are kept, and only worked out again for a worm
+        whose DataFrame has been replaced, or whose units have changed.
+        (So DataFrames should not be changed in place.)
+
+        Parameters
+        -------------
+        decimals: int
+            As for fingerprint
+
+        Returns
+        -------------
+        OrderedDict
+            Keyed by worm id, a list of (t, hex string) for each block
+            with any data, where t is the canonical time the block starts
+
+        """
+        try:
+            known = self._fingerprints
+        except AttributeError:
+            known = self._fingerprints = {}
+        units_key = self._fingerprint_units_key()
+
+        fingerprints = OrderedDict()
+        for worm_id in sorted(self.worm_ids, key=str):
+            df = self._data[worm_id]
+            (known_df, known_units_key, by_decimals) = known.get(
+                worm_id, (_dead_ref, None, None))
+            if known_df() is not df or known_units_key != units_key:
+                by_decimals = {}
+                # Only a weak reference, so a replaced DataFrame can be
+                # freed
+                known[worm_id] = (weakref.ref(df), units_key, by_decimals)
+            if decimals not in by_decimals:
+                by_decimals[decimals] = _block_fingerprints(
+                    self._worm_to_canon(worm_id), decimals,
+                    self.FINGERPRINT_BLOCK_SECONDS)
+            fingerprints[worm_id] = by_decimals[decimals]
+
+        return fingerprints
+
+    def _known_block_fingerprints(self):
+        """
+        The block_fingerprints of the unrounded data if they are all
+        known and up to date, otherwise None.
+
+        """
+        known = getattr(self, '_fingerprints', {})
+        units_key = self._fingerprint_units_key()
+
+        fingerprints = OrderedDict()
+        for worm_id in sorted(self.worm_ids, key=str):
+            (known_df, known_units_key, by_decimals) = known.get(
+                worm_id, (_dead_ref, None, {}))
+            if (known_df() is not self._data[worm_id] or
+                    known_units_key != units_key or None not in by_decimals):
+                return None
+            fingerprints[worm_id] = by_decimals[None]
+
+        return fingerprints
+
+    def _fingerprint_units_key(self):
+        return sorted((k, mu.scale, mu.offset)
+                      for (k, mu) in self.units.items())
 
     def __eq__(self, other):
         """
@@ -334,9 +491,19 @@ class WCONWorms():
 
         Special units are not considered
 
+        If the fingerprints of both objects' data are already known, they
+        are compared instead of the data.
+
         """
-        return (WCONWorms.is_data_equal(self, other) and
-                WCONWorms.is_metadata_equal(self, other))
+        if not WCONWorms.is_metadata_equal(self, other):
+            return False
+
+        fingerprints = self._known_block_fingerprints()
+        other_fingerprints = other._known_block_fingerprints()
+        if fingerprints is not None and other_fingerprints is not None:
+            return fingerprints == other_fingerprints
+
+        return WCONWorms.is_data_equal(self, other)
 
     def __ne__(self, other):
         return not self.__eq__(other)
@@ -348,6 +515,24 @@ class WCONWorms():
         """
         return self.merge(self, other)
 
+    def __iadd__(self, other):
+        """
+        In-place addition operator (overloaded; see update)
+
+        """
+        self.update(other)
+        return self
+
+    def __getstate__(self):
+        """
+        Pickle support, so WCONWorms objects can be passed between
+        processes.  The lazily-evaluated properties are left out.
+
+        """
+        return {k: v for (k, v) in self.__dict__.items()
+                if k not in ['_num_worms', '_worm_ids', '_data_df',
+                             '_fingerprints']}
+
     @property
     def is_canon(self):
         """
@@ -367,54 +552,86 @@ class WCONWorms():
         Return a new WCONWorms object, with the same .metadata, but with
         .units and .data changed so they are in standard form.
 
+        Nothing is copied: if the units are already canonical, the new
+        object shares this one's DataFrames.  Otherwise each worm's data
+        is only converted when it is first asked for, and then kept.  So
+        the DataFrames should not be changed in place.
+
         """
         w = WCONWorms()
         w.metadata = self.metadata
         w.units = self.canonical_units
 
-        # Corner case
-        if self._data == {}:
-            w._data = OrderedDict({})
-            return w
+        if self.is_canon:
+            w._data = self._data.copy()
+        else:
+            w._data = _CanonicalData(self)
 
-        w._data = OrderedDict()
-        for worm_id in self.worm_ids:
-            w._data[worm_id] = self._data[worm_id].copy()
+        return w
 
-        # Go through each "units" key
-        for data_key in self.units:
-            mu = self.units[data_key]
+    def _column_conversions(self, df):
+        """
+        Return whether each column of the DataFrame df holds floats, and
+        the scale and offset converting each to canonical units, as NumPy
+        arrays.  Columns of keys without units (e.g. aspect_size) have
+        scale 1 and offset 0.
 
-            # Don't bother to "convert" units that are already in their
-            # canonical form.
-            if mu.unit_string == mu.canonical_unit_string:
-                continue
+        """
+        keys = df.columns.get_level_values('key')
+        is_float = np.array([dtype.kind == 'f' for dtype in df.dtypes],
+                            dtype=bool)
 
-            tmu = self.units['t']
-            for worm_id in w.worm_ids:
+        scale = np.ones(len(keys))
+        offset = np.zeros(len(keys))
+        for data_key in keys[is_float].unique():
+            if data_key != 't' and data_key in self.units:
+                mu = self.units[data_key]
+                scale[keys == data_key] = mu.scale
+                offset[keys == data_key] = mu.offset
 
-                try:
-                    # Apply across all worm ids and all aspects
-                    mu_slice = \
-                        w._data[worm_id].loc[:, idx[:, data_key, :]].copy()
-
-                    w._data[worm_id].loc[:, idx[:, data_key, :]] = \
-                        mu_slice.applymap(mu.to_canon)
-                except KeyError:
-                    # Just ignore cases where there are "units" entries but no
-                    # corresponding data
-                    pass
-
-                # Special case: change the dataframe index, i.e. the time units
-                if tmu.unit_string != tmu.canonical_unit_string:
-                    # Create a function that can be applied elementwise to the
-                    # index values
-                    t_converter = np.vectorize(tmu.to_canon)
-                    new_index = t_converter(w._data[worm_id].index.values)
-
-                    w._data[worm_id].set_index(new_index, inplace=True)
+        return is_float, scale, offset
 
-        return w
+    def _worm_to_canon(self, worm_id):
+        """
+        Return the DataFrame of worm worm_id, with its data and its time
+        index converted to canonical units.  If no conversion is needed,
+        the DataFrame itself is returned, or a shallow copy of it with
+        a new index.
+
+        All the float columns are converted together, by one NumPy
+        multiply-add with the scale and offset of each column's units.
+
+        """
+        df = self._data[worm_id]
+        is_float, scale, offset = self._column_conversions(df)
+
+        # Special case: change the dataframe index, i.e. the time units
+        tmu = self.units['t']
+        index = pd.Index(tmu.to_canon(df.index.values.astype(float)),
+                         name=df.index.name)
+
+        if ((scale[is_float] == 1) & (offset[is_float] == 0)).all():
+            # Don't bother to "convert" units that are already in their
+            # canonical form.
+            if tmu.scale != 1 or tmu.offset != 0 or \
+                    df.index.dtype != index.dtype:
+                df = df.copy(deep=False)
+                df.index = index
+            return df
+
+        values = df.loc[:, is_float].values * scale[is_float]
+        if (offset != 0).any():
+            values += offset[is_float]
+
+        converted = pd.DataFrame(values, index=index,
+                                 columns=df.columns[is_float], copy=False)
+        if not is_float.all():
+            others = df.loc[:, ~is_float].copy()
+            others.index = index
+            converted = pd.concat([converted, others], axis=1)
+            converted = converted.loc[:, df.columns]
+
+        return converted
 
     @classmethod
     def merge(cls, w1, w2):
@@ -433,39 +650,144 @@ class WCONWorms():
         AssertionError.
 
         """
-        if not cls.is_metadata_equal(w1, w2):
+        return cls.merge_many([w1, w2])
+
+    @classmethod
+    def merge_many(cls, worms):
+        """
+        Merge any number of worm groups, in their standard forms, with
+        the same rules as merge.
+
+        The metadata and units are checked once.  Then rather than merging
+        the groups pairwise, each worm's DataFrames from all the groups
+        are combined with a single concatenation, sorted by time, and the
+        rows of any times in more than one group are checked for clashes
+        all at once (see df_merge_many).
+
+        Parameters
+        -------------
+        worms: list of WCONWorms objects
+            At least one
+
+        """
+        if len(worms) == 0:
+            raise AssertionError("There must be at least one group of "
+                                 "worms to merge.")
+
+        for w in worms[1:]:
+            if not cls.is_metadata_equal(worms[0], w):
+                raise AssertionError("Metadata conflicts between worms to "
+                                     "be merged.")
+
+        canon_worms = [w.to_canon for w in worms]
+
+        units = OrderedDict()
+        for wc in canon_worms:
+            for (data_key, mu) in wc.units.items():
+                if units.setdefault(data_key, mu) != mu:
+                    raise AssertionError(
+                        "Units conflict between worms to be merged: {0} is "
+                        "in {1} and {2}".format(data_key,
+                                                units[data_key].unit_string,
+                                                mu.unit_string))
+
+        dfs = OrderedDict()
+        for wc in canon_worms:
+            for worm_id in wc.worm_ids:
+                dfs.setdefault(worm_id, []).append(wc._data[worm_id])
+
+        merged_data = OrderedDict()
+        for (worm_id, worm_dfs) in dfs.items():
+            if len(worm_dfs) == 1:
+                merged_data[worm_id] = worm_dfs[0]
+                continue
+            try:
+                merged_data[worm_id] = df_merge_many(worm_dfs)
+            except AssertionError as err:
+                raise AssertionError("Data conflicts between worms to "
+                                     "be merged on worm {0}: {1}"
+                                     .format(str(worm_id), err))
+
+        merged_worm = WCONWorms()
+        merged_worm._data = sort_odict(merged_data)
+        merged_worm.metadata = worms[-1].metadata
+        merged_worm.units = units
+
+        return merged_worm
+
+    def update(self, other):
+        """
+        Merge other into this object, in place, with the same rules as
+        merge.
+
+        Only other is converted to canonical units, apart from this
+        object the first time, if it isn't already canonical.  A worm's
+        data that is all later than what this object has is appended
+        without being compared, and only concatenated when it is next
+        asked for, so adding recordings one after another doesn't copy
+        all the data each time.
+
+        Parameters
+        -------------
+        other: WCONWorms object
+
+        """
+        if not self.is_metadata_equal(self, other):
             raise AssertionError("Metadata conflicts between worms to be "
                                  "merged.")
 
-        w1c = w1.to_canon
-        w2c = w2.to_canon
-
-        for worm_id in w2c.worm_ids:
-            if worm_id in w1c.worm_ids:
+        if not self.is_canon:
+            w = self.to_canon
+            self.units = w.units
+            self._data = w._data
+        other = other.to_canon
+
+        units = OrderedDict(self.units)
+        for (data_key, mu) in other.units.items():
+            if units.setdefault(data_key, mu) != mu:
+                raise AssertionError(
+                    "Units conflict between worms to be merged: {0} is "
+                    "in {1} and {2}".format(data_key,
+                                            units[data_key].unit_string,
+                                            mu.unit_string))
+
+        if not isinstance(self._data, _AppendedData):
+            self._data = _AppendedData(OrderedDict(self._data.items()))
+
+        # Work out every change before making any, in case of a clash
+        (new_worm_ids, appended, merged) = ([], [], [])
+        for worm_id in other.worm_ids:
+            df = other._data[worm_id]
+            if worm_id not in self._data:
+                new_worm_ids.append(worm_id)
+            elif len(df) == 0:
+                continue
+            elif _first_time(df) > self._data.last_time(worm_id):
+                appended.append(worm_id)
+            else:
                 try:
-                    # Try to upsert w2c's data into w1c.  If we cannot
-                    # without an error being raised, the data clashes.
-                    w1c._data[worm_id] = df_upsert(w1c._data[worm_id],
-                                                   w2c._data[worm_id])
+                    merged.append((worm_id,
+                                   df_merge_many([self._data[worm_id], df])))
                 except AssertionError as err:
                     raise AssertionError("Data conflicts between worms to "
                                          "be merged on worm {0}: {1}"
                                          .format(str(worm_id), err))
-            else:
-                # The worm isn't in the 1st group, so just add it
-                w1c._data[worm_id] = w2c._data[worm_id]
-
-        # Sort w1c's list of worms
-        w1c._data = sort_odict(w1c._data)
 
-        # Create a fresh WCONWorms object to reset all the lazily-evaluated
-        # properties that may change, such as num_worms, in the merged worm
-        merged_worm = WCONWorms()
-        merged_worm._data = w1c._data
-        merged_worm.metadata = w2c.metadata
-        merged_worm.units = w1c.units
-
-        return merged_worm
+        self.units = units
+        for worm_id in new_worm_ids:
+            self._data[worm_id] = other._data[worm_id]
+        for worm_id in appended:
+            self._data.append(worm_id, other._data[worm_id])
+        for (worm_id, df) in merged:
+            self._data[worm_id] = df
+
+        # Reset the lazily-evaluated properties that may have changed
+        lazy = ['_data_df']
+        if len(new_worm_ids) > 0:
+            self._data.sort()
+            lazy += ['_num_worms', '_worm_ids']
+        for name in lazy:
+            self.__dict__.pop(name, None)
 
     """
     ================================================================
@@ -509,7 +831,9 @@ class WCONWorms():
                 warnings.warn('The file name ' + warning_message)
 
     def save_to_file(self, JSON_path, pretty_print=False,
-                     compress_file=False, num_chunks=1):
+                     compress_file=False, num_chunks=1,
+                     compression_level=None, chunk_bytes=None,
+                     processes=1):
         """
         Save this object to the path specified.  The object
         will be serialized as a WCON JSON text file.
@@ -524,54 +848,309 @@ class WCONWorms():
             readable.  Otherwise, the JSON output will use as few characters
             as possible.
         compress_file: bool
-            If True, saves a compressed version of the WCON JSON text file
+            If True, saves a compressed version of the WCON JSON text file,
+            as the only member of a zip archive.  JSON_path must end in
+            ".zip", and the member is named after it, less the ".zip".
+            If saving to more than one chunk, all the chunks are members
+            of the one archive.
         num_chunks: int
             The number of chunks to break this object into.  If
-            num_chunks > 1 then num_chunks files will be created.
-            Filenames will have "_1", "_2", etc., added
+            num_chunks > 1 then num_chunks files will be created, split
+            by time so they have about the same amount of data each, and
+            linked together by their "files" objects.
+            Filenames will have "_0", "_1", etc., added
             to the end of the filename after the last path separator
             (e.g. "/") and then, before the last "." (if any)
+        compression_level: int
+            If compress_file, the zlib compression level, from 0 (none)
+            to 9 (most, but slowest).  If None, zlib's default is used.
+        chunk_bytes: int
+            If not None, instead of num_chunks, use as many chunks as it
+            takes for each to be about chunk_bytes long (uncompressed).
+        processes: int
+            The number of worker processes to serialize chunks with.
+            If None, use one per CPU.  If 1, serialize them one after
+            another in this process.
 
         """
-        if num_chunks > 1:
-            raise NotImplementedError("Saving a worm to more than one chunk "
-                                      "has not yet been implemented")
-
         self.validate_filename(JSON_path, compress_file)
 
-        with open(JSON_path, 'w') as outfile:
-            json.dump(self.as_ordered_dict, outfile,
-                      indent=4 if pretty_print else None)
+        if num_chunks > 1 or chunk_bytes is not None:
+            self._save_chunks(JSON_path, pretty_print, compress_file,
+                              num_chunks, chunk_bytes, compression_level,
+                              processes)
+        elif compress_file:
+            member_name = path.basename(JSON_path)[:-4]
+            _save_zip_archive(JSON_path,
+                              [(member_name,
+                                self._iter_wcon_text(pretty_print))],
+                              compression_level)
+        else:
+            with open(JSON_path, 'w') as outfile:
+                self.save(outfile, pretty_print)
+
+    def _save_chunks(self, JSON_path, pretty_print=False,
+                     compress_file=False, num_chunks=1, chunk_bytes=None,
+                     compression_level=None, processes=1):
+        """
+        Save this object as a set of chunks (see save_to_file).
+
+        """
+        chunks = self._split_by_time(num_chunks, chunk_bytes, pretty_print)
+
+        plain_path = JSON_path[:-4] if compress_file else JSON_path
+        chunk_paths = [_chunk_path(plain_path, i)
+                       for i in range(len(chunks))]
+        chunk_names = [path.basename(p) for p in chunk_paths]
+
+        args = []
+        for (i, w) in enumerate(chunks):
+            files = OrderedDict([('current', chunk_names[i]),
+                                 ('prev', chunk_names[:i][::-1]),
+                                 ('next', chunk_names[i + 1:])])
+            # Chunks in an archive are returned as text, to be compressed
+            # in this process
+            chunk_path = None if compress_file else chunk_paths[i]
+            args.append((w, chunk_path, files, pretty_print))
+
+        chunk_texts = _map_in_pool(_save_chunk, args, processes)
 
         if compress_file:
-            # Zip the file to a TEMP file, then rename to the original,
-            # overwriting it with the zipped archive.
-            zf = zipfile.ZipFile(JSON_path + '.TEMP',
-                                 'w', zipfile.ZIP_DEFLATED)
-            zf.write(JSON_path)
-            zf.close()
-            os.rename(JSON_path + '.TEMP', JSON_path)
+            _save_zip_archive(JSON_path,
+                              [(chunk_name, [chunk_text])
+                               for (chunk_name, chunk_text)
+                               in zip(chunk_names, chunk_texts)],
+                              compression_level)
+        else:
+            # Wait for all the chunks to be written
+            list(chunk_texts)
+
+    def _split_by_time(self, num_chunks=1, chunk_bytes=None,
+                       pretty_print=False):
+        """
+        Split this object by time into chunks with about the same number
+        of data values each.
+
+        Parameters
+        -----------
+        num_chunks: int
+            The number of chunks.  There may be fewer if there are fewer
+            distinct times.
+        chunk_bytes: int
+            If not None, instead of num_chunks, use as many chunks as it
+            takes for each chunk's text to be about chunk_bytes long.
+        pretty_print: bool
+            Whether chunk_bytes refers to pretty-printed text
+
+        Returns
+        -----------
+        A list of WCONWorms objects, in time order
+
+        """
+        # The number of data values at each time, over all worms
+        times = [df.index.values for df in self._data.values()]
+        counts = [df.notnull().values.sum(axis=1)
+                  for df in self._data.values()]
+        if sum(len(t) for t in times) == 0:
+            return [self]
+
+        unique_times, time_indices = np.unique(np.concatenate(times),
+                                               return_inverse=True)
+        cumulative_counts = np.cumsum(
+            np.bincount(time_indices, weights=np.concatenate(counts)))
+        total_count = cumulative_counts[-1]
+
+        if chunk_bytes is not None:
+            num_chunks = int(np.ceil(
+                self._estimate_text_size(total_count, pretty_print) /
+                float(chunk_bytes)))
+
+        # The index of the first time of each chunk but the first
+        boundaries = np.searchsorted(
+            cumulative_counts,
+            total_count * np.arange(1, num_chunks) / float(num_chunks)) + 1
+        boundaries = np.unique(boundaries[boundaries < len(unique_times)])
+        edges = np.concatenate([[-np.inf], unique_times[boundaries],
+                                [np.inf]])
+
+        chunks = []
+        for (t_min, t_max) in zip(edges[:-1], edges[1:]):
+            w = WCONWorms()
+            w.units = self.units
+            w.metadata = self.metadata
+            w._data = OrderedDict()
+            for (worm_id, df) in self._data.items():
+                rows = (df.index.values >= t_min) & (df.index.values < t_max)
+                if rows.any():
+                    w._data[worm_id] = df[rows]
+            chunks.append(w)
+
+        return chunks
+
+    def _estimate_text_size(self, num_values, pretty_print=False):
+        """
+        Estimate the length of this object's WCON text, if it has
+        num_values data values, from the text of a small sample of them.
+
+        """
+        def text_size(data):
+            # A new object each time, since worm_ids is only worked out
+            # once
+            sample = WCONWorms()
+            sample.units = self.units
+            sample.metadata = self.metadata
+            sample._data = data
+            return len(''.join(sample._iter_wcon_text(pretty_print)))
+
+        header_size = text_size(OrderedDict())
+
+        sample_data = OrderedDict(
+            (worm_id, df.iloc[:self.SIZE_SAMPLE_ROWS])
+            for (worm_id, df) in self._data.items())
+        sample_values = sum(df.notnull().values.sum()
+                            for df in sample_data.values())
+        sample_size = text_size(sample_data)
+
+        return header_size + ((sample_size - header_size) *
+                              num_values / float(max(sample_values, 1)))
+
+    def save(self, JSON_stream, pretty_print=False):
+        """
+        Write this object to a text stream, as canonical WCON text.
+
+        The units and metadata are written first, then the data one
+        worm at a time, so only one worm's data need be converted to
+        canonical units and serialized at any time.  The text is the
+        same as json.dumps(self.as_ordered_dict) would give.
+
+        Parameters
+        -----------
+        JSON_stream: a text stream implementing .write()
+        pretty_print: bool
+            (see save_to_file)
+
+        """
+        for piece in self._iter_wcon_text(pretty_print):
+            JSON_stream.write(piece)
+
+    def _iter_wcon_text(self, pretty_print=False, files=None):
+        """
+        Yield the canonical WCON text of this object, a piece at a time,
+        with files, if given, as its "files" object.
+
+        """
+        root = self._canonical_header(files)
+        root['data'] = self._iter_canonical_data()
+
+        return iterdumps(root, pretty_print)
+
+    @classmethod
+    def probe(cls, JSON_path):
+        """
+        Read the header of a WCON file, and some summary statistics of its
+        data, without loading the data itself.
+
+        The "data" array is scanned with a lightweight tokenizer that
+        decodes only the "id" and "t" of each data segment, skipping over
+        everything else, so no DataFrames are built.  Linked chunks are
+        not followed, and the file is not validated against the schema.
+
+        Parameters
+        -------------
+        JSON_path: str
+            A file path to a WCON file, or a zip archive containing one.
+            For archives with several files, the first file is probed.
+
+        Returns
+        -------------
+        A dict with these entries:
+        'units': dict of MeasurementUnit objects
+        'metadata': dict, or None if 'metadata' is not present
+        'files': dict, or None if 'files' is not present
+        'num_segments': int
+            The number of data segments with both an "id" and a "t"
+        'worm_ids': list of str
+            The distinct worm ids, in the same order as
+            WCONWorms.load_from_file(JSON_path).worm_ids
+        't_range': OrderedDict of (float, float)
+            The minimum and maximum time of each worm, keyed by worm id,
+            in the file's own units of time
+
+        """
+        is_zipped = zipfile.is_zipfile(JSON_path)
+
+        cls.validate_filename(JSON_path, is_zipped)
+
+        t_ranges = {}
+        num_segments = itertools.count()
+
+        def add_segment(data_segment):
+            if (not isinstance(data_segment, dict) or
+                    't' not in data_segment or 'id' not in data_segment):
+                return
+            next(num_segments)
+
+            t = np.array(data_segment['t'], dtype=float, ndmin=1)
+            worm_id = data_segment['id']
+            t_range = ((float(np.nanmin(t)), float(np.nanmax(t)))
+                       if len(t) > 0 else None)
+            if worm_id not in t_ranges or t_ranges[worm_id] is None:
+                t_ranges[worm_id] = t_range
+            elif t_range is not None:
+                t_ranges[worm_id] = (min(t_ranges[worm_id][0], t_range[0]),
+                                     max(t_ranges[worm_id][1], t_range[1]))
+
+        if is_zipped:
+            with zipfile.ZipFile(JSON_path, 'r') as zf:
+                with zf.open(zf.namelist()[0], 'r') as infile:
+                    root = read_wcon_stream(infile, add_segment,
+                                            segment_keys=['id', 't'])
+        else:
+            with open(JSON_path, 'rb') as infile:
+                root = read_wcon_stream(infile, add_segment,
+                                        segment_keys=['id', 't'])
+
+        t_ranges = sort_odict(t_ranges)
+
+        units = OrderedDict()
+        for (key, unit_string) in six.iteritems(root.get('units', {})):
+            units[key] = MeasurementUnit.create(unit_string)
+
+        return {'units': units,
+                'metadata': root.get('metadata'),
+                'files': root.get('files'),
+                'num_segments': next(num_segments),
+                'worm_ids': list(t_ranges.keys()),
+                't_range': t_ranges}
 
     @classmethod
     def load_from_file(cls, JSON_path,
                        load_prev_chunks=True,
                        load_next_chunks=True,
-                       validate_against_schema=True):
+                       validate_against_schema=True,
+                       incremental=False, worm_ids=None, t_range=None,
+                       cache=None, processes=1):
         """
         Factory method returning a merged WCONWorms instance of the file
         located at JSON_path and all related "chunks" as specified in the
         "files" element of the file.
 
-        Uses recursion if there are multiple chunks.
+        The whole set of chunks is resolved up front from the "prev" and
+        "next" lists (see _follow_chunk_links), the chunks are loaded
+        (optionally in parallel), and then they are all merged together
+        at once.
 
         Parameters
         -------------
         JSON_path: str
             A file path to a file that can be opened
-        validate_against_schema: bool
-            If True, validate before trying to load the file, otherwise don't.
-            jsonschema.validate takes 99% of the compute time for large files
-            so use with caution.
+        validate_against_schema: bool or str
+            If True or 'full', validate before trying to load the file.
+            Full validation can take most of the compute time for large
+            files, so 'structural' leaves the shapes of the time series
+            to the data loader, 'sampled' validates only every 100th data
+            segment, and 'header' validates only units, metadata and files.
+            If False, don't validate at all.
         load_prev_chunks: bool
             If a "files" key is present, load the previous chunks and merge
             them with this one.  If not present, return only the current
@@ -580,6 +1159,76 @@ class WCONWorms():
             If a "files" key is present, load the next chunks and merge
             them with this one.  If not present, return only the current
             file's worm.
+        incremental: bool
+            If True, decode the "data" array one data segment at a time
+            rather than reading the whole file into memory first.
+            (see WCONWorms.load)
+        worm_ids: list of str
+            If not None, load only the worms with these ids
+            (see WCONWorms.load)
+        t_range: (float, float)
+            If not None, load only the timeframes within this range
+            (see WCONWorms.load)
+        cache: bool or wcon_cache.SidecarCache
+            If True, or a SidecarCache, look for each file in the cache
+            before parsing it, and add it to the cache after parsing it.
+            True uses a SidecarCache with the default settings.
+        processes: int
+            The number of worker processes to load the other chunks with.
+            If None, use one per CPU.  If 1, load them one after another
+            in this process.
+
+        """
+        if cache is True:
+            cache = SidecarCache()
+
+        load_options = {'validate_against_schema': validate_against_schema,
+                        'incremental': incremental,
+                        'worm_ids': worm_ids,
+                        't_range': t_range,
+                        'cache': cache}
+
+        w_current = cls._load_single_file(JSON_path, **load_options)
+
+        # CASE 1: NO "files" OBJECT, hence no multiple files.  We are done.
+        current_files = getattr(w_current, 'files', None)
+        if current_files is None:
+            return w_current
+        elif (('next' not in current_files) and
+              ('prev' not in current_files)):
+            # CASE 2: "files" object exists but no prev/next, assume nothing is
+            # there
+            return w_current
+
+        # OTHERWISE, CASE 3: MULTIPLE FILES
+        def load_chunks(JSON_paths):
+            return _load_chunks(cls, JSON_paths, load_options, processes)
+
+        chunks = _follow_chunk_links(JSON_path, w_current,
+                                     lambda w: getattr(w, 'files', None),
+                                     load_chunks, load_prev_chunks,
+                                     load_next_chunks)
+
+        if len(chunks) == 1:
+            # No merging took place, but we'll still need to delete the
+            # "files" attribute (i.e. if both "prev" and "next" were null)
+            del(w_current.files)
+            return w_current
+
+        # Merge all the chunks at once, in time order
+        return cls.merge_many([w for (_, w) in chunks])
+
+    @classmethod
+    def _load_single_file(cls, JSON_path, validate_against_schema=True,
+                          incremental=False, worm_ids=None, t_range=None,
+                          cache=None):
+        """
+        Load the file at JSON_path, plain or zipped, without following
+        its links to other chunks.  Its "files" object is kept, as the
+        .files attribute.
+
+        Parameters are as for load_from_file, except that cache, if
+        given, must be a SidecarCache.
 
         """
         print("Loading file: " + JSON_path)
@@ -588,123 +1237,103 @@ class WCONWorms():
 
         cls.validate_filename(JSON_path, is_zipped)
 
-        # Check if the specified file is compressed
+        load_options = {'worm_ids': worm_ids, 't_range': t_range}
+
+        if cache:
+            w_current = cache.get(cls, JSON_path, load_options,
+                                  validate_against_schema)
+            if w_current is not None:
+                return w_current
+
         if is_zipped:
-            zf = zipfile.ZipFile(JSON_path, 'r')
-
-            zf_namelist = zf.namelist()
-            if len(zf_namelist) <= 0:
-                raise Exception("Filename %s is a zip archive, which is fine, "
-                                "but the archive does not contain any files.")
-            elif len(zf_namelist) == 1:
-                # Just one file is in the archive.
-                print("The file is a zip archive with one file.  Attempting "
-                      "to uncompress and then load.")
-                wcon_bytes = zf.read(zf.namelist()[0])
-                wcon_string = wcon_bytes.decode("utf-8")
-                infile = StringIO(wcon_string)
-                w_current = cls.load(infile, validate_against_schema)
-            else:
-                print("The zip archive contains multiple files.  We will "
-                      "extract to a temporary folder and then try to load "
-                      "the first file in the archive, then delete the "
-                      "temporary folder.")
-                # Note: the first file is all we should need since we assume
-                #       the files in the archive are linked together using
-                #       their respective JSON "files" entries
-
-                # Make a temporary archive folder
-                cur_path = os.path.abspath(os.path.dirname(JSON_path))
-                archive_path = os.path.join(cur_path, '_zip_archive')
-                if os.path.exists(archive_path):
-                    raise Exception("Archive path %s already exists!"
-                                    % archive_path)
-                else:
-                    os.makedirs(archive_path)
-
-                # Extract zip archive to temporary folder
-                for name in zf_namelist:
-                    zf.extract(name, archive_path)
-                zf.close()
-
-                # Call load_from_file on the first file
-                first_path = os.path.join(archive_path, zf_namelist[0])
-                w = cls.load_from_file(first_path)
-
-                # Delete the temporary folder
-                shutil.rmtree(archive_path, ignore_errors=True)
-
-                return w
+            # The specified file is compressed
+            with zipfile.ZipFile(JSON_path, 'r') as zf:
+                w_current = cls._load_from_archive(zf, JSON_path,
+                                                   validate_against_schema,
+                                                   incremental, worm_ids,
+                                                   t_range)
         else:
             # The file is not a zip file, so assume it's just plaintext JSON
-            with open(JSON_path, 'r') as infile:
-                w_current = cls.load(infile, validate_against_schema)
+            with open(JSON_path, 'rb' if incremental else 'r') as infile:
+                w_current = cls.load(infile, validate_against_schema,
+                                     incremental=incremental,
+                                     worm_ids=worm_ids, t_range=t_range)
 
-        # CASE 1: NO "files" OBJECT, hence no multiple files.  We are done.
-        w_cur = w_current
-        if w_current.files is None:
-            return w_current
-        elif (('next' not in w_cur.files) and ('prev' not in w.cur.files)):
-            # CASE 2: "files" object exists but no prev/next, assume nothing is
-            # there
-            return w_current
-        else:
-            # The merge operations below will blast away the .files attribute
-            # so we need to save a local copy
-            current_files = w_current.files
-
-        # OTHERWISE, CASE 2: MULTIPLE FILES
-
-        # The schema guarantees that if "files" is present,
-        # "current", will exist.  Also, that "current" is not
-        # null and whose corresponding value is a string at least one
-        # character in length.
-        cur_ext = current_files['current']
-
-        # e.g. cur_filename = 'filename_2.wcon'
-        # cur_ext = '_2', prefix = 'filename', suffix = '.wcon'
-        cur_filename = JSON_path
-        name_offset = cur_filename.find(cur_ext)
-        if name_offset == -1:
-            raise AssertionError(
-                'Mismatch between the filename given in the file "' +
-                cur_ext +
-                '" and the file we loaded from "' +
-                cur_filename +
-                '".')
-        path_string = cur_filename[:name_offset]
-
-        load_chunks = {'prev': load_prev_chunks,
-                       'next': load_next_chunks}
-
-        for direction in ['prev', 'next']:
-            # If we are supposed to load the previous chunks, and one exists,
-            # load it and merge it with the current chunk
-            # Same with the "next" chunks
-            if (load_chunks[direction] and
-                    current_files is not None and
-                    current_files[direction] is not None and
-                    len(current_files[direction]) > 0):
-                cur_load_prev_chunks = (direction == 'prev')
-                cur_load_next_chunks = (direction == 'next')
-
-                new_file_name = path_string + current_files[direction][0]
-
-                w_new = cls.load_from_file(new_file_name,
-                                           cur_load_prev_chunks,
-                                           cur_load_next_chunks,
-                                           validate_against_schema)
-                w_current = w_current + w_new
-
-        # If no merging took place, we'll still need to delete the "files"
-        # attribute if it's present (i.e. if both "prev" and "next" were null):
-        if hasattr(w_current, "files"):
-            del(w_current.files)
+        if cache:
+            cache.put(w_current, JSON_path, load_options,
+                      validate_against_schema)
 
         return w_current
 
     @classmethod
-    def load(cls, JSON_stream, validate_against_schema=True):
+    def _load_from_archive(cls, zf, JSON_path, validate_against_schema=True,
+                           incremental=False, worm_ids=None, t_range=None):
+        """
+        Load the WCON file in the zip archive zf, located at JSON_path.
+
+        Members are streamed straight from the archive into the parser,
+        never written to disk.  If the archive contains several files,
+        the first is loaded, and the "files" links from it are resolved
+        as other members of the archive.  Once all links are followed,
+        an AssertionError is raised if any .wcon members remain unread.
+
+        """
+        zf_namelist = zf.namelist()
+
+        def load_member(name):
+            with zf.open(name, 'r') as infile:
+                return cls.load(infile, validate_against_schema,
+                                incremental=incremental,
+                                worm_ids=worm_ids, t_range=t_range)
+
+        if len(zf_namelist) <= 0:
+            raise Exception("Filename %s is a zip archive, which is fine, "
+                            "but the archive does not contain any files."
+                            % JSON_path)
+        elif len(zf_namelist) == 1:
+            # Just one file is in the archive.
+            print("The file is a zip archive with one file.  Attempting "
+                  "to load it.")
+            return load_member(zf_namelist[0])
+
+        print("The zip archive contains multiple files.  We will load the "
+              "first file in the archive, and the files it links to.")
+        # Note: the first file is all we should need since we assume
+        #       the files in the archive are linked together using
+        #       their respective JSON "files" entries
+        first_name = zf_namelist[0]
+        w_first = load_member(first_name)
+
+        first_files = getattr(w_first, 'files', None)
+        if first_files is None:
+            chunks = [(first_name, w_first)]
+        else:
+            chunks = _follow_chunk_links(
+                first_name, w_first, lambda w: getattr(w, 'files', None),
+                lambda names: [load_member(name) for name in names])
+
+        loaded_names = set(name for (name, _) in chunks)
+        unread_names = [name for name in zf_namelist
+                        if name.endswith('.wcon') and
+                        name not in loaded_names]
+        if len(unread_names) > 0:
+            raise AssertionError("The zip archive %s contains WCON files "
+                                 "not linked to from %s: %s" %
+                                 (JSON_path, first_name,
+                                  str(unread_names)))
+
+        if len(chunks) == 1:
+            # The links have been resolved within the archive, so they
+            # mustn't be followed again outside it
+            if hasattr(w_first, 'files'):
+                del w_first.files
+            return w_first
+
+        return cls.merge_many([w for (_, w) in chunks])
+
+    @classmethod
+    def load(cls, JSON_stream, validate_against_schema=True,
+             incremental=False, worm_ids=None, t_range=None):
         """
         Factory method to create a WCONWorms instance
 
@@ -715,28 +1344,58 @@ class WCONWorms():
 
         Parameters
         -------------
-        JSON_stream: a text stream implementing .read()
-            e.g. an object inheriting from TextIOBase
-        validate_against_schema: bool
-            If True, validate before trying to load the file, otherwise don't.
-            jsonschema.validate takes 99% of the compute time for large files
-            so use with caution.
+        JSON_stream: a text or byte stream implementing .read()
+            e.g. an object inheriting from TextIOBase, or a member of a
+            zip archive opened with ZipFile.open
+        validate_against_schema: bool or str
+            If True or 'full', validate before trying to load the file.
+            Full validation can take most of the compute time for large
+            files, so 'structural' leaves the shapes of the time series
+            to the data loader, 'sampled' validates only every 100th data
+            segment, and 'header' validates only units, metadata and files.
+            If False, don't validate at all.
+        incremental: bool
+            If True, the elements of the "data" array are decoded from
+            JSON_stream one data segment at a time, and each is converted
+            and discarded before the next is read.  Peak memory is then
+            bounded by the largest data segment plus the resulting
+            DataFrames, rather than by the whole JSON object tree.
+            JSON_stream may also be a byte stream in this case, which is
+            decoded as UTF-8.
+        worm_ids: list of str
+            If not None, load only the worms with these ids.  The data
+            segments of other worms are skipped as they are parsed.
+        t_range: (float, float)
+            If not None, load only the timeframes with
+            t_range[0] <= t <= t_range[1], in the file's own units of
+            time.  Either bound may be None, for no bound on that side.
+            Timeframes outside the range are dropped as they are parsed.
 
         """
         w = cls()
 
-        serialized_data = JSON_stream.read()
+        if incremental:
+            root, data = cls._load_incrementally(JSON_stream,
+                                                 validate_against_schema,
+                                                 worm_ids, t_range)
+        else:
+            serialized_data = JSON_stream.read()
+
+            # Load the whole JSON file into a nested dict.  Any duplicate
+            # keys raise an exception
+            root = loads(serialized_data)
 
-        # Load the whole JSON file into a nested dict.  Any duplicate
-        # keys raise an exception since we've hooked in reject_duplicates
-        root = json.loads(serialized_data, object_pairs_hook=reject_duplicates)
+            # ===================================================
+            # BASIC TOP-LEVEL VALIDATION AGAINST THE SCHEMA
 
-        # ===================================================
-        # BASIC TOP-LEVEL VALIDATION AGAINST THE SCHEMA
+            # Validate the raw file against the WCON schema
+            SchemaValidator(validate_against_schema).validate(root)
 
-        # Validate the raw file against the WCON schema
-        if validate_against_schema:
-            jsonschema.validate(root, w.schema)
+            if len(root['data']) > 0:
+                data = parse_data(root['data'], worm_ids, t_range)
+            else:
+                # "data": {}
+                data = OrderedDict({})
 
         # ===================================================
         # HANDLE THE REQUIRED ELEMENTS: 'units', 'data'
@@ -751,19 +1410,13 @@ class WCONWorms():
         # it is a dimensionless quantity
         w.units['aspect_size'] = MeasurementUnit.create('')
 
-        if len(root['data']) > 0:
-            w._data = parse_data(root['data'])
+        w._data = data
 
-            # Shift the coordinates by the amount in the offsets 'ox' and 'oy'
-            for worm_id in w.worm_ids:
-                convert_origin(w._data[worm_id])
-
-                # Any worms with head=='R' should have their
-                # coordinates reversed and head reset to 'L'
-                reverse_backwards_worms(w._data[worm_id])
-        else:
-            # "data": {}
-            w._data = OrderedDict({})
+        # The coordinates have already been shifted by the amount in the
+        # offsets 'ox' and 'oy', and any worms with head=='R' have had
+        # their coordinates reversed and head reset to 'L', as the
+        # DataFrames were built (see convert_origin and
+        # reverse_backwards_worms)
 
         # Raise error if there are any data keys without units
         units_keys = set(w.units.keys())
@@ -808,34 +1461,540 @@ class WCONWorms():
 
         return w
 
+    @classmethod
+    def _load_incrementally(cls, JSON_stream, validate_against_schema=True,
+                            worm_ids=None, t_range=None):
+        """
+        Read the root object of a WCON stream, feeding the data segments
+        to a TimeSeriesDataBuilder as they are decoded.
+
+        Returns
+        -------------
+        (root, data): the top-level entries (with "data" emptied) and
+            the ordered dict of DataFrames built from the data segments
+
+        """
+        validator = SchemaValidator(validate_against_schema)
+        builder = TimeSeriesDataBuilder(worm_ids, t_range)
+        segment_indices = itertools.count()
+
+        def add_segment(data_segment):
+            # Each data segment is validated on its own, since the "data"
+            # array is never held in memory as a whole
+            validator.validate_data_segment(data_segment,
+                                            next(segment_indices))
+            builder.add_segment(data_segment)
+
+        root = read_wcon_stream(JSON_stream, add_segment,
+                                object_pairs_hook=reject_duplicates)
+
+        # The data segments have been validated already, so validate the
+        # rest of the file.  "data" is still checked for being present.
+        validator.validate_header(root)
+
+        return root, builder.to_odict()
+
+
+class _AppendedData(MutableMapping):
+    """
+    The DataFrames of a WCONWorms object updated in place (see update),
+    keyed by worm id.  The pieces appended to a worm are concatenated
+    only when its DataFrame is next asked for.
+
+    """
+
+    def __init__(self, data):
+        self._data = data
+        # The pieces appended to each worm since, in time order
+        self._appended = {}
+
+    def __getitem__(self, worm_id):
+        pieces = self._appended.pop(worm_id, None)
+        if pieces is not None:
+            self._data[worm_id] = df_merge_many([self._data[worm_id]] +
+                                                pieces)
+        return self._data[worm_id]
+
+    def __setitem__(self, worm_id, df):
+        self._appended.pop(worm_id, None)
+        self._data[worm_id] = df
+
+    def __delitem__(self, worm_id):
+        self._appended.pop(worm_id, None)
+        del self._data[worm_id]
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, worm_id):
+        return worm_id in self._data
+
+    def append(self, worm_id, df):
+        """
+        Append df, all of whose times are later, to worm worm_id's data.
+
+        """
+        self._appended.setdefault(worm_id, []).append(df)
+
+    def last_time(self, worm_id):
+        pieces = self._appended.get(worm_id)
+        df = self._data[worm_id] if pieces is None else pieces[-1]
+        return _last_time(df)
+
+    def sort(self):
+        """
+        Put the worms in order, as sort_odict would.
+
+        """
+        self._data = OrderedDict((worm_id, self._data[worm_id])
+                                 for worm_id in sorted(self._data, key=str))
+
+    def copy(self):
+        c = _AppendedData(self._data.copy())
+        c._appended = {worm_id: list(pieces)
+                       for (worm_id, pieces) in self._appended.items()}
+        return c
+
+
+def _first_time(df):
+    return df.index[0] if df.index.is_monotonic_increasing \
+        else df.index.min()
+
+
+def _last_time(df):
+    if len(df) == 0:
+        return float('-inf')
+    return df.index[-1] if df.index.is_monotonic_increasing \
+        else df.index.max()
+
+
+class _CanonicalData(MutableMapping):
+    """
+    The DataFrames of a WCONWorms object, keyed by worm id, each converted
+    to canonical units when it is first asked for (see to_canon).
+
+    """
+
+    def __init__(self, worms):
+        # What worms holds now, so later changes to it aren't seen here
+        self._worms = WCONWorms()
+        self._worms.units = OrderedDict(worms.units)
+        self._worms._data = worms._data.copy()
+        # The conversions done so far, shared with any copies
+        self._converted = {}
+        # None for each worm to be converted, otherwise its DataFrame
+        self._dfs = OrderedDict((worm_id, None) for worm_id in worms.worm_ids)
+
+    def __getitem__(self, worm_id):
+        df = self._dfs[worm_id]
+        if df is None:
+            try:
+                df = self._converted[worm_id]
+            except KeyError:
+                df = self._worms._worm_to_canon(worm_id)
+                self._converted[worm_id] = df
+                # The source DataFrame is no longer needed
+                del self._worms._data[worm_id]
+        return df
+
+    def __setitem__(self, worm_id, df):
+        self._dfs[worm_id] = df
+
+    def __delitem__(self, worm_id):
+        del self._dfs[worm_id]
+
+    def __contains__(self, worm_id):
+        # Without converting the worm, as MutableMapping's would
+        return worm_id in self._dfs
+
+    def __iter__(self):
+        return iter(self._dfs)
+
+    def __len__(self):
+        return len(self._dfs)
+
+    def copy(self):
+        c = _CanonicalData.__new__(_CanonicalData)
+        c._worms = self._worms
+        c._converted = self._converted
+        c._dfs = self._dfs.copy()
+        return c
+
+
+def _save_zip_archive(JSON_path, members, compression_level=None):
+    """
+    Save a zip archive of WCON files, compressing their text as it is
+    written, so that only the archive itself is ever written to disk.
+
+    The archive is written to a TEMP file which is then renamed, so an
+    existing file at JSON_path is only replaced once the archive is
+    complete.
+
+    Parameters
+    -------------
+    JSON_path: str
+        The path of the archive
+    members: list of (str, iterable of str) tuples
+        The name of each member, and the pieces of its text
+    compression_level: int
+        The zlib compression level, or None for the default
+
+    """
+    compression_options = {}
+    if compression_level is not None:
+        compression_options['compresslevel'] = compression_level
+
+    temp_path = JSON_path + '.TEMP'
+    with zipfile.ZipFile(temp_path, 'w', zipfile.ZIP_DEFLATED,
+                         **compression_options) as zf:
+        for (member_name, pieces) in members:
+            if six.PY2:
+                # Python 2 can't open zip members for writing
+                zf.writestr(member_name,
+                            ''.join(pieces).encode('utf-8'))
+                continue
+
+            with zf.open(member_name, 'w', force_zip64=True) as outfile:
+                for piece in pieces:
+                    # Encode long pieces a block at a time, so there is
+                    # never a second full copy of the text in memory
+                    for i in range(0, len(piece), ZIP_BLOCK_SIZE):
+                        outfile.write(
+                            piece[i:i + ZIP_BLOCK_SIZE].encode('utf-8'))
+
+    if os.path.exists(JSON_path):
+        os.remove(JSON_path)
+    os.rename(temp_path, JSON_path)
+
+
+def _follow_chunk_links(JSON_path, current_chunk, get_files, load_chunks,
+                        load_prev_chunks=True, load_next_chunks=True):
+    """
+    Resolve the set of chunks linked to the one at JSON_path through the
+    "files" object, and load them.
+
+    Each of "prev" and "next" should list all the chunks in that
+    direction, nearest first.  In case a file only lists some of them,
+    the chunks it lists are loaded, and then their own lists in the same
+    direction are followed, until no new chunks are found.  Typically
+    this takes just one round.
+
+    Parameters
+    -------------
+    JSON_path: str
+        The path of the current chunk
+    current_chunk: object
+        The current chunk, already loaded
+    get_files: function
+        Returns the "files" object of a loaded chunk, or None
+    load_chunks: function
+        Loads a list of chunk paths, returning a list of loaded chunks
+    load_prev_chunks, load_next_chunks: bool
+        Whether to follow the links in each direction
+
+    Returns
+    ----------
+    A list of (path, chunk) tuples for all the chunks, including the
+    current one, in time order
+
+    """
+    current_files = get_files(current_chunk)
+
+    # The schema guarantees that if "files" is present,
+    # "current", will exist.  Also, that "current" is not
+    # null and whose corresponding value is a string at least one
+    # character in length.
+    cur_ext = current_files['current']
+
+    # e.g. cur_filename = 'filename_2.wcon'
+    # cur_ext = '_2', prefix = 'filename', suffix = '.wcon'
+    cur_filename = JSON_path
+    name_offset = cur_filename.find(cur_ext)
+    if name_offset == -1:
+        raise AssertionError(
+            'Mismatch between the filename given in the file "' +
+            cur_ext +
+            '" and the file we loaded from "' +
+            cur_filename +
+            '".')
+    path_string = cur_filename[:name_offset]
+
+    load_direction = {'prev': load_prev_chunks,
+                      'next': load_next_chunks}
+
+    chunk_names = {'prev': [], 'next': []}
+    chunks = {cur_ext: current_chunk}
+    links = [(direction, current_files) for direction in ['prev', 'next']
+             if load_direction[direction]]
+    while len(links) > 0:
+        new_chunks = []
+        for (direction, files) in links:
+            for chunk_name in (files.get(direction) or []):
+                if chunk_name not in chunks:
+                    chunks[chunk_name] = None
+                    chunk_names[direction].append(chunk_name)
+                    new_chunks.append((direction, chunk_name))
+
+        loaded_chunks = load_chunks([path_string + chunk_name
+                                     for (_, chunk_name) in new_chunks])
+
+        links = []
+        for ((direction, chunk_name), chunk) in zip(new_chunks,
+                                                    loaded_chunks):
+            chunks[chunk_name] = chunk
+            links.append((direction, get_files(chunk) or {}))
+
+    chunk_order = (chunk_names['prev'][::-1] + [cur_ext] +
+                   chunk_names['next'])
+
+    return [(JSON_path if chunk_name == cur_ext else
+             path_string + chunk_name, chunks[chunk_name])
+            for chunk_name in chunk_order]
+
+
+def _load_chunk(args):
+    """
+    Load one chunk, without following its links.  Module-level, so that
+    it can be sent to the worker processes of a multiprocessing.Pool.
+
+    """
+    (cls, JSON_path, load_options) = args
+
+    return cls._load_single_file(JSON_path, **load_options)
+
+
+def _load_chunks(cls, JSON_paths, load_options, processes=1):
+    """
+    Load each of the chunks in JSON_paths, using a pool of processes
+    worker processes (one per CPU if None), or in this process if
+    processes is 1.
+
+    Returns
+    ----------
+    A list of WCONWorms objects, in the order of JSON_paths
+
+    """
+    args = [(cls, JSON_path, load_options) for JSON_path in JSON_paths]
+
+    return list(_map_in_pool(_load_chunk, args, processes))
+
+
+def _save_chunk(args):
+    """
+    Save one chunk, with its "files" object.  If no path is given, return
+    its text instead.  Module-level, so that it can be sent to the worker
+    processes of a multiprocessing.Pool.
+
+    """
+    (w, JSON_path, files, pretty_print) = args
+
+    pieces = w._iter_wcon_text(pretty_print, files)
+    if JSON_path is None:
+        return ''.join(pieces)
+
+    with open(JSON_path, 'w') as outfile:
+        for piece in pieces:
+            outfile.write(piece)
+
+
+def _map_in_pool(function, args, processes=1):
+    """
+    Yield function(a) for each a in args, in order, computed by a pool of
+    processes worker processes (one per CPU if None), or in this process
+    if processes is 1.
+
+    """
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    processes = min(processes, len(args))
+
+    if processes <= 1:
+        for a in args:
+            yield function(a)
+        return
+
+    pool = multiprocessing.Pool(processes)
+    try:
+        for result in pool.imap(function, args):
+            yield result
+    finally:
+        pool.close()
+        pool.join()
+
+
+def _chunk_path(JSON_path, chunk_index):
+    """
+    The path of chunk chunk_index of JSON_path, e.g. 'a/b_2.wcon' for
+    chunk 2 of 'a/b.wcon'.
+
+    """
+    (head, tail) = path.split(JSON_path)
+    (root, ext) = path.splitext(tail)
+
+    return path.join(head, '%s_%i%s' % (root, chunk_index, ext))
+
 
 def pd_equals(df1, df2):
     """
+    Returns whether the DataFrames df1 and df2 are equal, with NaN equal
+    to NaN.
+
     I don't use DataFrame.equals because it returned False for no
     apparent reason with one of the centroid unit tests
 
+    """
+    return _frame_difference(df1, df2) is None
+
+
+def _frame_difference(df1, df2, rtol=0, atol=0, t_atol=0, block_rows=None):
+    """
+    Find the first difference between two DataFrames of a worm's data,
+    comparing the floats with NumPy, block_rows times at a time.
+
+    Parameters
+    -------------
+    df1, df2: DataFrames
+    rtol: float
+        The relative tolerance
+    atol: float or array
+        The absolute tolerance, or that of each column
+    t_atol: float
+        The absolute tolerance of the times
+    block_rows: int
+        The number of times to compare at once (all of them, if None)
+
+    Returns
+    -------------
+    str
+        A description of the first difference, or None if there is none
+
     """
     if not df1.columns.identical(df2.columns):
-        return False
+        return "the columns differ"
+    if len(df1) != len(df2):
+        return "%i times vs %i times" % (len(df1), len(df2))
+
+    is_float = np.array([dtype.kind == 'f' for dtype in df1.dtypes],
+                        dtype=bool)
+    if not np.array_equal(is_float, [dtype.kind == 'f'
+                                     for dtype in df2.dtypes]):
+        return "the column types differ"
+    float_columns = np.flatnonzero(is_float)
+    other_columns = np.flatnonzero(~is_float)
+    atol = np.broadcast_to(atol, is_float.shape)[float_columns]
+
+    t1 = np.asarray(df1.index.values, dtype=float)
+    t2 = np.asarray(df2.index.values, dtype=float)
+    if block_rows is None:
+        block_rows = max(len(df1), 1)
+
+    for start in range(0, len(df1), block_rows):
+        rows = slice(start, start + block_rows)
+
+        same = np.isclose(t1[rows], t2[rows], rtol=rtol, atol=t_atol,
+                          equal_nan=True)
+        if not same.all():
+            i = start + np.argmin(same)
+            return "t=%r vs t=%r" % (float(t1[i]), float(t2[i]))
+
+        for (columns, tolerant) in [(float_columns, True),
+                                    (other_columns, False)]:
+            if len(columns) == 0:
+                continue
+            block1 = df1.iloc[rows, columns].values
+            block2 = df2.iloc[rows, columns].values
+            if tolerant:
+                same = np.isclose(block1.astype(float), block2.astype(float),
+                                  rtol=rtol, atol=atol, equal_nan=True)
+            else:
+                same = ((block1 == block2) |
+                        (pd.isnull(block1) & pd.isnull(block2)))
+            if not same.all():
+                (i, j) = np.unravel_index(np.argmin(same), same.shape)
+                (_, key, aspect) = df1.columns[columns[j]]
+                return ("at t=%r, %s[%s] is %r vs %r" %
+                        (float(t1[start + i]), key, aspect,
+                         _scalar(block1[i, j]), _scalar(block2[i, j])))
 
-    if not df1.index.identical(df2.index):
-        return False
+    return None
 
-    try:
-        pd.util.testing.assert_frame_equal(df1, df2)
-    except AssertionError:
-        return False
 
-    return True
+def _dead_ref():
+    """
+    Stands in for the weak reference of a worm with no known
+    fingerprints.
+
+    """
+    return None
 
 
-def reject_duplicates(ordered_pairs):
-    """Reject duplicate keys."""
-    unique_dict = {}
-    for key, val in ordered_pairs:
-        if key in unique_dict:
-            raise KeyError("Duplicate key: %r" % (key,))
-        else:
-            unique_dict[key] = val
+def _block_fingerprints(df, decimals, block_seconds):
+    """
+    Hash the rows of a worm's DataFrame df in blocks of block_seconds.
 
-    return unique_dict
+    Returns a list of (t, hex string) for each block with any rows, where
+    t is the time the block starts.  Floats are rounded to decimals
+    places, if given, and every NaN and zero hashes the same, so that
+    equal data (see data_difference) has equal fingerprints.
+
+    """
+    if len(df) == 0:
+        return []
+
+    is_float = np.array([dtype.kind == 'f' for dtype in df.dtypes],
+                        dtype=bool)
+    float_columns = np.flatnonzero(is_float)
+    other_columns = np.flatnonzero(~is_float)
+    header = json.dumps([[str(level) for level in column]
+                         for column in df.columns] +
+                        is_float.tolist()).encode('utf-8')
+
+    t = np.asarray(df.index.values, dtype=float)
+    block = np.floor(t / block_seconds)
+    order = np.argsort(block, kind='stable')
+    (block_starts, firsts) = np.unique(block[order], return_index=True)
+    bounds = np.append(firsts, len(order))
+
+    fingerprints = []
+    for (i, block_start) in enumerate(block_starts):
+        rows = order[bounds[i]:bounds[i + 1]]
+        block_hash = hashlib.sha1(header)
+        block_hash.update(_normalized_floats(t[rows], decimals))
+        if len(float_columns) > 0:
+            block_hash.update(_normalized_floats(
+                df.iloc[rows, float_columns].values, decimals))
+        if len(other_columns) > 0:
+            values = df.iloc[rows, other_columns].values
+            block_hash.update(json.dumps(
+                [[None if pd.isnull(v) else v for v in row]
+                 for row in values.tolist()], default=str).encode('utf-8'))
+        fingerprints.append((float(block_start * block_seconds),
+                             block_hash.hexdigest()))
+
+    return fingerprints
+
+
+def _normalized_floats(values, decimals=None):
+    """
+    The bytes of an array of floats, rounded to decimals places if given,
+    with every NaN the same and -0 as 0.
+
+    """
+    values = np.array(values, dtype='<f8')
+    if decimals is not None:
+        values = np.round(values, decimals)
+    values += 0.0
+    values[np.isnan(values)] = np.nan
+
+    return values.tobytes()
+
+
+def _scalar(value):
+    """
+    Convert a NumPy scalar to the Python one, for printing.
+
+    """
+    return value.item() if isinstance(value, np.generic) else value
@@ -0,0 +1,307 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Incremental reading of a WCON root object from a text or byte stream.
+
+The top-level "data" array is by far the largest part of most WCON files,
+so rather than decoding the whole file into one nested structure, the
+elements of "data" are decoded and handed over one at a time.  Only the
+current data segment and a bounded read buffer are held in memory.
+
+Classes
+------------
+StreamBuffer
+
+Methods
+------------
+read_wcon_stream
+
+"""
+import re
+import json
+import codecs
+import six
+from collections import OrderedDict
+
+# Number of characters (or bytes) requested from the stream per read
+CHUNK_SIZE = 2 ** 20
+
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+# Characters that may follow a valid prefix of a number, and the empty
+# string, for the end of the buffer
+NUMBER_CONTINUATION = ['', '.', 'e', 'E', '+', '-'] + list('0123456789')
+
+# The next character that opens or closes an array, object or string
+STRUCTURE = re.compile(r'["\[\]{}]')
+
+# The rest of a string, after its opening quote
+STRING_REMAINDER = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*"')
+
+
+class StreamBuffer():
+    """
+    A sliding window over a stream, from which complete JSON values can be
+    decoded one at a time.
+
+    Streams returning bytes (e.g. files opened in 'rb' mode, or members of
+    a zip archive) are decoded as UTF-8 on the fly.
+
+    """
+
+    def __init__(self, stream, object_pairs_hook=None, chunk_size=None):
+        self.stream = stream
+        self.chunk_size = CHUNK_SIZE if chunk_size is None else chunk_size
+        self.buf = six.text_type('')
+        self.pos = 0
+        self.eof = False
+        self._bytes_decoder = None
+        self._decoder = json.JSONDecoder(object_pairs_hook=object_pairs_hook)
+
+    def read_more(self, min_size=0):
+        """
+        Append at least one more chunk of the stream to the buffer,
+        discarding the part of the buffer that has already been consumed.
+
+        Returns False if the stream was already exhausted.
+
+        """
+        if self.eof:
+            return False
+
+        if self.pos > 0:
+            self.buf = self.buf[self.pos:]
+            self.pos = 0
+
+        chunk = self.stream.read(max(self.chunk_size, min_size))
+
+        if isinstance(chunk, six.binary_type):
+            if self._bytes_decoder is None:
+                self._bytes_decoder = \
+                    codecs.getincrementaldecoder('utf-8')()
+            chunk = self._bytes_decoder.decode(chunk, final=(not chunk))
+
+        if len(chunk) == 0:
+            self.eof = True
+            return False
+
+        self.buf += chunk
+        return True
+
+    def skip_whitespace(self):
+        while True:
+            self.pos = WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf) or not self.read_more():
+                return
+
+    def peek(self):
+        """
+        Return the next non-whitespace character without consuming it,
+        or '' if the stream is exhausted.
+
+        """
+        self.skip_whitespace()
+        return self.buf[self.pos:self.pos + 1]
+
+    def next_char(self):
+        c = self.peek()
+        self.pos += len(c)
+        return c
+
+    def expect(self, expected):
+        c = self.next_char()
+        if c != expected:
+            raise ValueError("Expecting '%s' but found '%s' in JSON stream"
+                             % (expected, c))
+
+    def decode_value(self):
+        """
+        Decode the next complete JSON value, reading from the stream until
+        the value is known not to continue past the end of the buffer.
+
+        """
+        self.skip_whitespace()
+
+        while True:
+            remaining = len(self.buf) - self.pos
+            try:
+                value, end = self._decoder.raw_decode(self.buf, self.pos)
+            except ValueError:
+                # The value may simply be truncated by the end of the
+                # buffer.  Grow the buffer geometrically so that a large
+                # value is not re-scanned too many times.
+                if self.read_more(remaining):
+                    continue
+                raise
+
+            # A number ending at, or just before, the end of the buffer
+            # might continue in the next chunk (e.g. "1" of "1.8")
+            if (self.buf[end:end + 1] in NUMBER_CONTINUATION and
+                    self.read_more(remaining)):
+                continue
+
+            self.pos = end
+            return value
+
+    def skip_value(self):
+        """
+        Consume the next complete JSON value without decoding it.
+
+        Arrays and objects are skipped by matching their brackets, so the
+        numbers inside them are never converted, and no Python objects
+        are created for them.
+
+        """
+        if self.peek() not in ['[', '{']:
+            # Numbers, strings and literals are small, so just decode them
+            self.decode_value()
+            return
+
+        depth = 0
+        while True:
+            match = STRUCTURE.search(self.buf, self.pos)
+            if match is None:
+                self.pos = len(self.buf)
+                if not self.read_more():
+                    raise ValueError("Unterminated array or object in JSON "
+                                     "stream")
+                continue
+
+            if match.group() == '"':
+                string_end = STRING_REMAINDER.match(self.buf, match.end())
+                if string_end is None:
+                    # The string continues past the end of the buffer
+                    self.pos = match.start()
+                    if not self.read_more(len(self.buf) - self.pos):
+                        raise ValueError("Unterminated string in JSON "
+                                         "stream")
+                    continue
+                self.pos = string_end.end()
+            else:
+                self.pos = match.end()
+                depth += 1 if match.group() in '[{' else -1
+                if depth == 0:
+                    return
+
+    def decode_object_keys(self, keys):
+        """
+        Decode the next JSON value, which should be an object, but only
+        its entries for the given keys; the other values are skipped.
+
+        A value that is not an object is decoded in full.
+
+        """
+        if self.peek() != '{':
+            return self.decode_value()
+        self.next_char()
+
+        obj = {}
+        if self.peek() == '}':
+            self.next_char()
+            return obj
+
+        while True:
+            key = self.decode_value()
+            if not isinstance(key, six.string_types):
+                raise ValueError("Expecting property name enclosed in "
+                                 "double quotes in JSON stream")
+            self.expect(':')
+
+            if key in keys:
+                if key in obj:
+                    raise KeyError("Duplicate key: %r" % (key,))
+                obj[key] = self.decode_value()
+            else:
+                self.skip_value()
+
+            c = self.next_char()
+            if c == '}':
+                return obj
+            elif c != ',':
+                raise ValueError("Expecting ',' delimiter in JSON object")
+
+    def assert_exhausted(self):
+        if self.peek() != '':
+            raise ValueError("Extra data after the end of the WCON object")
+
+
+def read_wcon_stream(stream, segment_callback, object_pairs_hook=None,
+                     chunk_size=None, segment_keys=None):
+    """
+    Read a WCON root object from stream, passing each element of the
+    top-level "data" array to segment_callback as soon as it is decoded.
+
+    Parameters
+    -------------
+    stream: a text or byte stream implementing .read(size)
+    segment_callback: function
+        Called with each data segment (a dict) in file order.
+    object_pairs_hook: function
+        Passed through to the JSON decoder, e.g. to reject duplicate keys.
+        Duplicate keys in the root object itself raise a KeyError.
+    chunk_size: int
+        The number of characters to read from the stream at a time.
+    segment_keys: list of str
+        If not None, only these keys of each data segment are decoded and
+        passed to segment_callback.  The values of all the other keys are
+        skipped over without being decoded.
+
+    Returns
+    -------------
+    An OrderedDict of all the top-level entries.  Since its segments have
+    already been passed to segment_callback, "data" is given as an empty
+    list.
+
+    """
+    sb = StreamBuffer(stream, object_pairs_hook, chunk_size)
+    root = OrderedDict()
+
+    if segment_keys is None:
+        decode_segment = sb.decode_value
+    else:
+        def decode_segment():
+            return sb.decode_object_keys(segment_keys)
+
+    sb.expect('{')
+    if sb.peek() == '}':
+        sb.next_char()
+    else:
+        while True:
+            key = sb.decode_value()
+            if not isinstance(key, six.string_types):
+                raise ValueError("Expecting property name enclosed in "
+                                 "double quotes in JSON stream")
+            if key in root:
+                raise KeyError("Duplicate key: %r" % (key,))
+            sb.expect(':')
+
+            if key == 'data' and sb.peek() == '[':
+                sb.next_char()
+                if sb.peek() == ']':
+                    sb.next_char()
+                else:
+                    while True:
+                        segment_callback(decode_segment())
+                        c = sb.next_char()
+                        if c == ']':
+                            break
+                        elif c != ',':
+                            raise ValueError("Expecting ',' delimiter in "
+                                             "the data array")
+                root[key] = []
+            elif key == 'data':
+                # A single data segment need not be wrapped in an array
+                segment_callback(decode_segment())
+                root[key] = []
+            else:
+                root[key] = sb.decode_value()
+
+            c = sb.next_char()
+            if c == '}':
+                break
+            elif c != ',':
+                raise ValueError("Expecting ',' delimiter in the root object")
+
+    sb.assert_exhausted()
+
+    return root
@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Validation of WCON objects against the WCON schema, at a selectable level
+of thoroughness.
+
+The schema is read once per process, and each validator built from it is
+compiled once and then shared by every subsequent load.
+
+Classes
+------------
+SchemaValidator
+
+"""
+import copy
+import json
+import six
+from os import path
+import jsonschema
+
+from .wcon_data import numeric_elements
+
+# Validate every SAMPLE_INTERVAL-th data segment at the 'sampled' level
+SAMPLE_INTERVAL = 100
+
+# Elements whose shapes and item types are checked by the data loader
+# itself (see wcon_data._validate_data_segment), so the 'structural'
+# level needn't check them with jsonschema as well.  (The enums of head
+# and ventral are still checked with jsonschema.)
+LOADER_CHECKED_ELEMENTS = ['t'] + numeric_elements
+
+
+class SchemaValidator():
+    """
+    Validates WCON root objects and their data segments.
+
+    Validation levels
+    -------------
+    True or 'full': the entire object, exactly as jsonschema.validate would.
+    'structural': the header (units, metadata, files), plus the keys, ids,
+        head and ventral values and any custom features of every data
+        segment.  The numeric time series elements are left to the data
+        loader, which checks their shapes and that they hold only numbers
+        anyway while building the DataFrames.
+    'sampled': the header, plus every SAMPLE_INTERVAL-th data segment
+        validated in full.
+    'header': only the header, and that "data" is an object or array.
+    False: nothing is validated.
+
+    Usage
+    -------------
+    validator = SchemaValidator(level)
+    validator.validate_header(root)
+    for i, data_segment in enumerate(data):
+        validator.validate_data_segment(data_segment, i)
+
+    """
+    LEVELS = [True, False, 'full', 'structural', 'sampled', 'header']
+
+    # Compiled validators, shared across all instances
+    _validators = {}
+
+    def __init__(self, level=True):
+        if level not in self.LEVELS:
+            raise ValueError("Unrecognized validation level %s; it must be "
+                             "one of %s" % (repr(level), str(self.LEVELS)))
+        if not isinstance(level, six.string_types):
+            level = 'full' if level else False
+        self.level = level
+
+    @classmethod
+    def schema(cls):
+        """
+        The WCON schema, as a dict.  It is read from wcon_schema.json the
+        first time it is requested, then kept in memory.
+
+        """
+        try:
+            return cls._schema
+
+        except AttributeError:
+            here = path.abspath(path.dirname(__file__))
+
+            with open(path.join(here, "wcon_schema.json"), "r") as f:
+                cls._schema = json.loads(f.read())
+
+            return cls._schema
+
+    @classmethod
+    def compiled(cls, name):
+        """
+        Return the compiled validator called name, one of:
+
+        'root': the whole schema
+        'header': the whole schema except for the contents of "data"
+        'data_record': the schema for a single data segment
+        'structural_record': 'data_record' without the elements
+            the data loader checks itself
+
+        """
+        try:
+            return cls._validators[name]
+
+        except KeyError:
+            schema = copy.deepcopy(cls.schema())
+
+            if name == 'header':
+                schema['properties']['data'] = {'type': ['object', 'array']}
+            elif name in ['data_record', 'structural_record']:
+                definitions = schema['definitions']
+                if name == 'structural_record':
+                    record_properties = \
+                        definitions['data_record']['properties']
+                    for key in LOADER_CHECKED_ELEMENTS:
+                        if key in record_properties:
+                            record_properties[key] = {}
+                schema = {'$ref': '#/definitions/data_record',
+                          'definitions': definitions}
+            elif name != 'root':
+                raise KeyError("No validator named %s" % name)
+
+            validator_cls = jsonschema.validators.validator_for(cls.schema())
+            validator_cls.check_schema(schema)
+            cls._validators[name] = validator_cls(schema)
+
+            return cls._validators[name]
+
+    @classmethod
+    def _raise_best_error(cls, name, instance):
+        # Raise the same error jsonschema.validate would have raised
+        error = jsonschema.exceptions.best_match(
+            cls.compiled(name).iter_errors(instance))
+        if error is not None:
+            raise error
+
+    def validate(self, root):
+        """
+        Validate a complete WCON root object.
+
+        """
+        if self.level is False:
+            return
+        elif self.level == 'full':
+            self._raise_best_error('root', root)
+            return
+
+        self.validate_header(root)
+
+        data = root['data']
+        if isinstance(data, dict):
+            data = [data]
+        for i, data_segment in enumerate(data):
+            self.validate_data_segment(data_segment, i)
+
+    def validate_header(self, root):
+        """
+        Validate everything but the contents of "data" in a WCON root
+        object.  Since "data" is not inspected, it may have been emptied
+        already, as in incremental loading.
+
+        """
+        if self.level is not False:
+            self._raise_best_error('header', root)
+
+    def validate_data_segment(self, data_segment, data_segment_index=0):
+        """
+        Validate one element of the "data" array of a WCON root object.
+
+        """
+        if self.level == 'full':
+            self._raise_best_error('data_record', data_segment)
+        elif self.level == 'structural':
+            self._raise_best_error('structural_record', data_segment)
+        elif self.level == 'sampled':
+            if data_segment_index % SAMPLE_INTERVAL == 0:
+                self._raise_best_error('data_record', data_segment)
@@ -0,0 +1,348 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Write WCON as the data arrives, e.g. from a tracker recording in real time,
+rather than holding a whole recording in a WCONWorms object to save at
+the end.
+
+Classes
+------------
+WCONWriter
+
+"""
+import os
+import six
+from collections import OrderedDict
+
+from .wcon_parser import WCONWorms, _chunk_path
+from .wcon_data import get_sorted_ordered_dict
+from .json_backend import dumps, _item_separator, _newline, _encode
+from .measurement_unit import MeasurementUnit
+
+
+class WCONWriter():
+    """
+    Appends frames of worm data to a WCON file as they arrive.
+
+    Frames are buffered per worm, and written out as a data segment once
+    frames_per_segment of them have arrived.  After each write, the file
+    is closed off so that it is valid WCON, and then that closing text is
+    written over in place by the next write.  So between writes the file
+    holds all the frames written so far, but if the process dies during
+    a write, the file is left without its closing text (the data written
+    before it are intact).  Call checkpoint() to write the buffered
+    frames too, and to make sure everything written so far is on disk.
+
+    If max_chunk_bytes or max_chunk_duration is given, the data is
+    written to a series of chunks instead, named with "_0", "_1", etc.
+    added before the extension, and linked by their "files" objects.
+
+    Data is written in the units it is given in, so a frame's values must
+    be in the units passed to the writer.
+
+    Usage
+    -------------
+    with WCONWriter('recording.wcon', {'t': 's', 'x': 'mm', 'y': 'mm'},
+                    max_chunk_duration=3600) as writer:
+        for (t, x, y) in tracker:
+            writer.add_frame('1', t, x=x, y=y)
+
+    """
+    DEFAULT_FRAMES_PER_SEGMENT = 100
+
+    def __init__(self, JSON_path, units, metadata=None, pretty_print=False,
+                 frames_per_segment=None, max_chunk_bytes=None,
+                 max_chunk_duration=None):
+        """
+        Parameters
+        -------------
+        JSON_path: str
+            The path to write to.  A warning is raised if the path
+            does not end in ".WCON"
+        units: dict
+            The unit string of each key the frames will have, e.g.
+            {'t': 's', 'x': 'mm', 'y': 'mm'}.  Must include 't'; "head"
+            and "ventral" don't require units.
+        metadata: dict
+            The "metadata" object, if any
+        pretty_print: bool
+            If True, adds newlines and spaces to make the file more human-
+            readable.
+        frames_per_segment: int
+            The number of frames of a worm to buffer before writing them
+            as a data segment.
+        max_chunk_bytes: int
+            If given, start a new chunk once a chunk is this long.
+        max_chunk_duration: float
+            If given, start a new chunk rather than have a chunk span
+            this much time or more, in the units of 't'.
+
+        """
+        WCONWorms.validate_filename(JSON_path, False)
+
+        if 't' not in units:
+            raise AssertionError("The units must include 't'")
+        # Check the units are valid before anything is written
+        for unit_string in units.values():
+            MeasurementUnit.create(unit_string)
+
+        self.JSON_path = JSON_path
+        self.units = get_sorted_ordered_dict(dict(units))
+        self.metadata = metadata
+        self.pretty_print = pretty_print
+        self.frames_per_segment = self.DEFAULT_FRAMES_PER_SEGMENT \
+            if frames_per_segment is None else frames_per_segment
+        self.max_chunk_bytes = max_chunk_bytes
+        self.max_chunk_duration = max_chunk_duration
+
+        self.is_chunked = (max_chunk_bytes is not None or
+                           max_chunk_duration is not None)
+        # The paths of the chunks, including the one being written
+        self.paths = []
+        self.closed = False
+
+        # The frames not yet written, as a list of (t, values) per worm
+        self._buffers = OrderedDict()
+
+        self._open_chunk()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def add_frame(self, worm_id, t, **values):
+        """
+        Add one frame of a worm's data.
+
+        Parameters
+        -------------
+        worm_id: str or number
+        t: float
+        values:
+            The value of each key at time t, e.g. x=[1.1, 1.2],
+            y=[2.1, 2.2] or head='L'.
+
+        """
+        self.add_frames(worm_id, [t], **{k: [v] for (k, v) in values.items()})
+
+    def add_frames(self, worm_id, t, **values):
+        """
+        Add a batch of frames of a worm's data.
+
+        Parameters
+        -------------
+        worm_id: str or number
+        t: list of float
+        values:
+            A list for each key, of its value at each time in t
+
+        """
+        if self.closed:
+            raise AssertionError("Can't add frames to a closed WCONWriter")
+
+        t = _as_list(t)
+        values = {k: _as_list(v) for (k, v) in values.items()}
+        for (key, key_values) in values.items():
+            # "head" and "ventral" don't require units.
+            if (key not in self.units and not key.startswith('@') and
+                    key not in ['head', 'ventral']):
+                raise AssertionError("No units were given for %s" % key)
+            if len(key_values) != len(t):
+                raise AssertionError("Worm %s has %i values of %s for %i "
+                                     "times" % (str(worm_id), len(key_values),
+                                                key, len(t)))
+
+        for (i, t_i) in enumerate(t):
+            t_range = (t_i, t_i) if self._t_range is None else \
+                (min(t_i, self._t_range[0]), max(t_i, self._t_range[1]))
+            if (self.max_chunk_duration is not None and
+                    t_range[1] - t_range[0] >= self.max_chunk_duration):
+                # The frames so far belong in the chunk being finished
+                self.flush()
+                self._roll_over()
+                t_range = (t_i, t_i)
+            self._t_range = t_range
+
+            # (Writing a segment empties the worm's buffer)
+            buffer = self._buffers.setdefault(worm_id, [])
+            buffer.append((t_i, OrderedDict((k, values[k][i])
+                                            for k in sorted(values))))
+
+            if len(buffer) >= self.frames_per_segment:
+                self._write_segments([worm_id])
+
+    def flush(self):
+        """
+        Write all the buffered frames.
+
+        """
+        self._write_segments(list(self._buffers.keys()))
+
+    def checkpoint(self):
+        """
+        Write all the buffered frames, and make sure the file is on disk,
+        so that when this returns it is valid WCON holding all the frames
+        added so far.  A crash during a later write can still leave the
+        file without its closing text.
+
+        """
+        self.flush()
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        """
+        Write all the buffered frames and close the file.
+
+        """
+        if self.closed:
+            return
+
+        self.flush()
+        self._file.close()
+        self.closed = True
+
+    def _open_chunk(self):
+        """
+        Start writing a new file, or the next chunk, with the header.
+
+        """
+        if self.is_chunked:
+            chunk_path = _chunk_path(self.JSON_path, len(self.paths))
+        else:
+            chunk_path = self.JSON_path
+        self.paths.append(chunk_path)
+
+        header = OrderedDict([('units', self.units)])
+        if self.metadata:
+            header['metadata'] = get_sorted_ordered_dict(self.metadata)
+
+        text = '{'
+        for (key, value) in list(header.items()) + [('data', None)]:
+            if key != 'units':
+                text += _item_separator(self.pretty_print)
+            text += _newline(1, self.pretty_print) + dumps(key) + ': '
+            if value is not None:
+                text += _encode(value, 1, self.pretty_print)
+
+        self._file = open(chunk_path, 'wb')
+        self._num_segments = 0
+        self._t_range = None
+        self._write(text)
+        self._data_end = self._file.tell()
+        self._write_tail()
+
+    def _roll_over(self):
+        """
+        Close the current chunk, linking it to the next one, and start
+        writing the next.
+
+        """
+        next_path = _chunk_path(self.JSON_path, len(self.paths))
+        self._write_tail(next_path)
+        self._file.close()
+        self._open_chunk()
+
+    def _write_segments(self, worm_ids):
+        """
+        Write the buffered frames of worm_ids as data segments, one for
+        each run of frames with the same keys.  If the current chunk is
+        already too long, they start the next chunk instead, so a chunk
+        is only ever started with data to put in it.
+
+        """
+        segments = []
+        for worm_id in worm_ids:
+            buffer = self._buffers.pop(worm_id, [])
+            runs = []
+            for (t, values) in buffer:
+                if len(runs) == 0 or list(runs[-1][0][1].keys()) != \
+                        list(values.keys()):
+                    runs.append([])
+                runs[-1].append((t, values))
+
+            for run in runs:
+                segment = OrderedDict([('id', worm_id),
+                                       ('t', [t for (t, _) in run])])
+                for key in run[0][1].keys():
+                    segment[key] = [values[key] for (_, values) in run]
+                segments.append(segment)
+
+        if len(segments) == 0:
+            return
+
+        if (self.max_chunk_bytes is not None and self._num_segments > 0 and
+                self._data_end >= self.max_chunk_bytes):
+            self._roll_over()
+            # These frames, and those still buffered, go in the new chunk
+            t = [t_i for segment in segments for t_i in segment['t']] + \
+                [t_i for buffer in self._buffers.values()
+                 for (t_i, _) in buffer]
+            self._t_range = (min(t), max(t))
+
+        self._file.seek(self._data_end)
+        for segment in segments:
+            if self._num_segments == 0:
+                text = '['
+            else:
+                text = _item_separator(self.pretty_print)
+            text += _newline(2, self.pretty_print)
+            self._write(text + _encode(segment, 2, self.pretty_print))
+            self._num_segments += 1
+        self._data_end = self._file.tell()
+
+        self._write_tail()
+
+    def _write_tail(self, next_path=None):
+        """
+        Close the "data" array and the file's object, after the data
+        written so far, so that the file is valid WCON.  The next write
+        starts where the data ended, writing over this.
+
+        Parameters
+        -------------
+        next_path: str
+            The path of the next chunk, if this chunk is finished
+
+        """
+        self._file.seek(self._data_end)
+
+        if self._num_segments == 0:
+            text = '[]'
+        else:
+            text = _newline(1, self.pretty_print) + ']'
+
+        if self.is_chunked:
+            names = [os.path.basename(p) for p in self.paths]
+            files = OrderedDict([
+                ('current', names[-1]),
+                ('prev', names[:-1][::-1]),
+                ('next', [] if next_path is None else
+                 [os.path.basename(next_path)])])
+            text += (_item_separator(self.pretty_print) +
+                     _newline(1, self.pretty_print) + dumps('files') + ': ' +
+                     _encode(files, 1, self.pretty_print))
+
+        self._write(text + _newline(0, self.pretty_print) + '}')
+        self._file.truncate()
+        self._file.flush()
+
+    def _write(self, text):
+        self._file.write(text.encode('utf-8'))
+
+
+def _as_list(values):
+    """
+    Convert NumPy arrays and scalars to lists and numbers, for encoding.
+
+    """
+    if hasattr(values, 'tolist'):
+        return values.tolist()
+    if isinstance(values, six.string_types):
+        return values
+    try:
+        return [_as_list(v) for v in values]
+    except TypeError:
+        return values